@@ -0,0 +1,103 @@
+"""Memory held by the providers configurations of many tenants.
+
+Compares the configurations as plain dicts, as returned by a handler reading
+them from JSON, with the same configurations compiled into provider specs.
+Example:
+
+    python benchmarks/memory.py --tenants 40000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=40000)
+    return parser.parse_args(argv)
+
+
+def load_configs(count: int) -> list[dict]:
+    """Build the configurations of the tenants, decoded from JSON like a handler would."""
+    return [
+        json.loads(
+            json.dumps(
+                {
+                    "microsoft_tenant": {
+                        "CLIENT_ID": f"client-{index}",
+                        "CLIENT_SECRET": f"secret-{index}",
+                        "TENANT_ID": f"tenant-{index}",
+                        "AUTHORITY": "https://login.microsoftonline.com",
+                        "EMAIL_RESOLUTION": "id_token_then_graph",
+                    },
+                    "oidc": {
+                        "client_id": f"client-{index}",
+                        "client_secret": f"secret-{index}",
+                        "issuer": "https://idp.example.com",
+                    },
+                }
+            )
+        )
+        for index in range(count)
+    ]
+
+
+def measure(build) -> tuple[int, object]:
+    """Measure the memory allocated by a function and still held by its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    settings.configure(INSTALLED_APPS=["nexus_auth"], NEXUS_AUTH={})
+    django.setup()
+
+    from nexus_auth.providers.factory import providers
+    from nexus_auth.specs import compile_providers_config
+
+    # Import the builders and build a provider of each type before measuring,
+    # so that the one-off import cost is not counted against the specs
+    for spec in compile_providers_config(load_configs(1)[0]).values():
+        providers.get_from_spec(spec)
+
+    dict_size, _ = measure(lambda: load_configs(args.tenants))
+    spec_size, _ = measure(
+        lambda: [
+            compile_providers_config(config) for config in load_configs(args.tenants)
+        ]
+    )
+    print(
+        json.dumps(
+            {
+                "tenants": args.tenants,
+                "dicts_bytes": dict_size,
+                "specs_bytes": spec_size,
+                "bytes_per_tenant": {
+                    "dicts": round(dict_size / args.tenants),
+                    "specs": round(spec_size / args.tenants),
+                },
+                "reduction": round(1 - spec_size / dict_size, 3),
+            },
+            indent=2,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
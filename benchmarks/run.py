@@ -0,0 +1,237 @@
+"""Benchmark of the exchange and providers endpoints against a local stub IdP.
+
+The views are driven in-process through the Django test client, at a set
+concurrency, while the IdP requests go over HTTP to a stub listening on
+localhost. Example:
+
+    python benchmarks/run.py --provider microsoft_tenant --concurrency 8 \\
+        --requests 1000 --latency token=0.02 --latency graph=0.05
+
+Save a run with ``--output baseline.json`` and compare later runs against it
+with ``--baseline baseline.json``: the script exits with status 1 when the p95
+latency or the throughput of a scenario regressed by more than
+``--max-regression``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+SCENARIOS = ("exchange", "providers")
+PROVIDERS = ("oidc", "microsoft_tenant")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append")
+    parser.add_argument("--provider", choices=PROVIDERS, default="oidc")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Use AsyncOAuthExchangeView",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--requests", type=int, default=500, help="Measured requests per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=20, help="Unmeasured requests per scenario"
+    )
+    parser.add_argument(
+        "--users", type=int, default=100, help="Number of users logging in"
+    )
+    parser.add_argument(
+        "--latency", action="append", default=[], metavar="ENDPOINT=SECONDS"
+    )
+    parser.add_argument(
+        "--jitter", action="append", default=[], metavar="ENDPOINT=SECONDS"
+    )
+    parser.add_argument(
+        "--error-rate", action="append", default=[], metavar="ENDPOINT=RATE"
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare the results with this JSON file")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+def configure_django(database: str, use_async: bool) -> None:
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY="benchmark-secret-key-that-is-long-enough-for-hs256",
+        ALLOWED_HOSTS=["testserver"],
+        INSTALLED_APPS=[
+            "django.contrib.contenttypes",
+            "django.contrib.auth",
+            "rest_framework",
+            "nexus_auth",
+        ],
+        MIDDLEWARE=[],
+        ROOT_URLCONF="nexus_auth.async_urls" if use_async else "nexus_auth.urls",
+        DATABASES={
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": database,
+                "OPTIONS": {"timeout": 30},
+            }
+        },
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        },
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        USE_TZ=True,
+        NEXUS_AUTH={},
+    )
+    django.setup()
+
+
+def create_users(count: int) -> list[str]:
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    User = get_user_model()
+    emails = [f"user{index}@example.com" for index in range(count)]
+    User.objects.bulk_create(
+        [
+            User(username=f"user{index}", email=email)
+            for index, email in enumerate(emails)
+        ]
+    )
+    return emails
+
+
+def run_scenario(send, total: int, concurrency: int):
+    from django.db import connections
+    from django.test import Client
+
+    from nexus_auth.testing.stats import LatencyRecorder
+
+    recorder = LatencyRecorder()
+    local = threading.local()
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def worker() -> None:
+        local.client = Client()
+        while True:
+            with counter_lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            start = time.perf_counter()
+            try:
+                status = send(local.client, index)
+            except Exception as e:
+                recorder.record(time.perf_counter() - start, type(e).__name__)
+                continue
+            error = None if status < 400 else str(status)
+            recorder.record(time.perf_counter() - start, error)
+        connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for scenario, result in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        p95, previous_p95 = result["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if previous_p95 and p95 > previous_p95 * (1 + max_regression):
+            regressions.append(f"{scenario}: p95 {previous_p95}ms -> {p95}ms")
+        rps, previous_rps = result["throughput_rps"], previous["throughput_rps"]
+        if previous_rps and rps < previous_rps * (1 - max_regression):
+            regressions.append(f"{scenario}: throughput {previous_rps}/s -> {rps}/s")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    scenarios = args.scenario or list(SCENARIOS)
+    database = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+    database.close()
+    configure_django(database.name, args.use_async)
+
+    from django.test.utils import override_settings
+
+    from nexus_auth.testing.stub_idp import StubIdP, build_profiles
+
+    try:
+        profiles = build_profiles(args.latency, args.jitter, args.error_rate)
+    except ValueError as e:
+        raise SystemExit(str(e)) from None
+
+    try:
+        with StubIdP(profiles=profiles) as idp:
+            provider_config = (
+                idp.oidc_config() if args.provider == "oidc" else idp.microsoft_config()
+            )
+            emails = create_users(args.users)
+
+            def exchange(client, index):
+                return client.post(
+                    f"/oauth/{args.provider}/exchange",
+                    {
+                        "code": emails[index % len(emails)],
+                        "code_verifier": "verifier",
+                        "redirect_uri": "http://localhost/callback",
+                    },
+                ).status_code
+
+            def providers(client, index):
+                return client.get("/oauth/providers").status_code
+
+            senders = {"exchange": exchange, "providers": providers}
+            results = {}
+            with override_settings(
+                NEXUS_AUTH={"CONFIG": {args.provider: provider_config}}
+            ):
+                for scenario in scenarios:
+                    run_scenario(senders[scenario], args.warmup, args.concurrency)
+                    results[scenario] = run_scenario(
+                        senders[scenario], args.requests, args.concurrency
+                    )
+                    results[scenario]["idp_requests"] = dict(idp.requests)
+                    idp.requests.clear()
+    finally:
+        os.unlink(database.name)
+
+    for scenario, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{scenario:<10} {result['requests']} requests, {result['errors']} errors, "
+            f"{result['throughput_rps']}/s, p50 {latency['p50']}ms, "
+            f"p95 {latency['p95']}ms, p99 {latency['p99']}ms"
+        )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+from django import forms
+from django.contrib import admin
+
+from nexus_auth.models import ProviderConfiguration
+from nexus_auth.settings import nexus_settings
+
+
+class ProviderConfigurationForm(forms.ModelForm):
+    class Meta:
+        model = ProviderConfiguration
+        fields = "__all__"
+        widgets = {
+            # Never written into the page, the stored secret is kept when left blank
+            "client_secret": forms.PasswordInput(render_value=False),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            client_secret = self.fields["client_secret"]
+            client_secret.required = False
+            client_secret.help_text = "Leave blank to keep the current secret."
+
+    def clean_client_secret(self) -> str:
+        client_secret = self.cleaned_data.get("client_secret")
+        if not client_secret and self.instance.pk is not None:
+            return self.instance.client_secret
+        return client_secret
+
+
+class ProviderConfigurationAdmin(admin.ModelAdmin):
+    form = ProviderConfigurationForm
+    list_display = ("tenant", "provider_type", "client_id", "enabled", "updated_at")
+    list_filter = ("provider_type", "enabled")
+    search_fields = ("tenant", "client_id")
+    ordering = ("tenant", "provider_type")
+    readonly_fields = ("created_at", "updated_at")
+
+    def get_readonly_fields(self, request, obj=None):
+        # Moving a configuration to another tenant would leave the cached
+        # configuration of the previous one in place until it expires
+        if obj is not None:
+            return (*self.readonly_fields, "tenant", "provider_type")
+        return self.readonly_fields
+
+
+if nexus_settings.get_provider_configurations_settings()["ADMIN"]:
+    admin.site.register(ProviderConfiguration, ProviderConfigurationAdmin)
@@ -5,3 +5,42 @@ class NexusAuthConfig(AppConfig):
     name = "nexus_auth"
     verbose_name = "django-nexus-auth"
     default_auto_field = "django.db.models.AutoField"
+
+    def ready(self):
+        from nexus_auth.settings import nexus_settings
+
+        # Builders are imported on first use unless the project opts in to
+        # paying the import cost at startup
+        if nexus_settings.get_eager_provider_builders():
+            from nexus_auth.providers.factory import providers
+
+            providers.warm_up()
+
+            if nexus_settings.snapshot.uses_default_handler:
+                from nexus_auth.exceptions import NoActiveProviderError
+                from nexus_auth.utils import load_providers_config
+
+                # Compile and validate the CONFIG setting before serving requests
+                try:
+                    load_providers_config()
+                except NoActiveProviderError:
+                    pass
+
+        # Connects the receivers invalidating the cached provider configurations
+        # when they are changed, e.g. in the admin
+        from nexus_auth import handlers  # noqa: F401
+
+        if nexus_settings.get_last_login_settings()["WRITE_BEHIND"]:
+            from nexus_auth import last_login
+
+            # Replaces the receiver connected by django.contrib.auth, which
+            # must therefore be listed before nexus_auth in INSTALLED_APPS
+            last_login.install()
+
+        if nexus_settings.get_warmup_settings()["ON_STARTUP"]:
+            from nexus_auth import warmup
+
+            # On the first request rather than here, so that management
+            # commands do not warm up, and in the background, so that the
+            # first logins only wait for the caches the warm-up fills
+            warmup.install()
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from nexus_auth.views import AsyncOAuthExchangeView, OAuthProvidersView
+
+__all__ = ["urlpatterns"]
+
+urlpatterns = [
+    path("oauth/providers", OAuthProvidersView.as_view(), name="oauth-provider"),
+    path(
+        "oauth/<str:provider_type>/exchange",
+        AsyncOAuthExchangeView.as_view(),
+        name="oauth-exchange",
+    ),
+]
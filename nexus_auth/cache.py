@@ -0,0 +1,165 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from django.core.cache import BaseCache, caches
+
+from nexus_auth.metrics import record_cache_lookup
+from nexus_auth.settings import nexus_settings
+
+KEY_PREFIX = "nexus_auth"
+
+PROVIDERS_RESPONSE_NAMESPACE = "providers"
+
+PROVIDER_CONFIGURATIONS_NAMESPACE = "provider_configurations"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process cache with a bounded size and per-entry expiry.
+
+    The least recently used entry is evicted once ``max_entries`` is reached.
+    """
+
+    def __init__(
+        self, max_entries: int, ttl: float | None = None, name: str | None = None
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Default time to live of an entry in seconds, ``None`` to never expire
+            name: Name under which the lookups are counted in the metrics, ``None`` to not count them
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+        self._entries: OrderedDict[Any, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get an entry and mark it as recently used.
+
+        Args:
+            key: Key of the entry
+            default: Value returned if the entry is missing or expired
+
+        Returns:
+            Any: Cached value or ``default``
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is not None and expires_at <= time.monotonic():
+                    del self._entries[key]
+                    entry = _MISSING
+                else:
+                    self._entries.move_to_end(key)
+        if self.name is not None:
+            record_cache_lookup(self.name, hit=entry is not _MISSING)
+        return default if entry is _MISSING else value
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        """Add or replace an entry, evicting the least recently used ones if needed.
+
+        Args:
+            key: Key of the entry
+            value: Value to cache
+            ttl: Time to live in seconds, defaults to the cache TTL
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        """Remove an entry if present.
+
+        Args:
+            key: Key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def get_shared_cache() -> BaseCache:
+    """Get the Django cache shared by all workers, as set in NEXUS_AUTH.CACHE_ALIAS.
+
+    Returns:
+        BaseCache: Django cache
+    """
+    return caches[nexus_settings.get_cache_alias()]
+
+
+def make_key(namespace: str, *parts: str) -> str:
+    """Build a shared cache key that is safe for every cache backend.
+
+    Args:
+        namespace: Namespace of the cached data
+        *parts: Values identifying the entry, hashed into the key
+
+    Returns:
+        str: Cache key
+    """
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{namespace}:{digest}"
+
+
+def fingerprint(*values: Any) -> str:
+    """Compute a stable hash of JSON serializable values, e.g. a provider configuration.
+
+    Dictionaries are hashed independently of their key order.
+
+    Args:
+        *values: Values to hash
+
+    Returns:
+        str: Hex digest
+    """
+    payload = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_providers_response_key(tenant_key: str) -> str:
+    """Get the shared cache key of the providers endpoint response of a tenant.
+
+    Keys are namespaced by the settings version, so a settings change is
+    served immediately.
+
+    Args:
+        tenant_key: Key of the tenant, as returned by ``NexusAuthSettings.get_tenant_key``
+
+    Returns:
+        str: Cache key
+    """
+    return make_key(
+        PROVIDERS_RESPONSE_NAMESPACE, nexus_settings.snapshot.version, tenant_key
+    )
+
+
+def get_provider_configurations_key(tenant: str) -> str:
+    """Get the shared cache key of the provider configurations of a tenant read from the database.
+
+    Args:
+        tenant: Tenant of the ``ProviderConfiguration`` rows
+
+    Returns:
+        str: Cache key
+    """
+    return make_key(PROVIDER_CONFIGURATIONS_NAMESPACE, tenant)
@@ -87,3 +87,42 @@ class EmailExtractionError(NexusAuthBaseException):
     status_code = status.HTTP_400_BAD_REQUEST
     default_detail = "Error when extracting email from the identity provider."
     default_code = "email_extraction_error"
+
+
+class DiscoveryDocumentError(NexusAuthBaseException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Error when retrieving the OpenID Connect discovery document."
+    default_code = "discovery_document_error"
+
+
+class InvalidIDTokenError(NexusAuthBaseException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "The ID token received from the identity provider is invalid."
+    default_code = "invalid_id_token"
+
+
+class JWKSFetchError(NexusAuthBaseException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Error when retrieving the signing keys of the identity provider."
+    default_code = "jwks_fetch_error"
+
+
+class ExchangeInProgressError(NexusAuthBaseException):
+    """Raised when a duplicate exchange of a code is still running at the IdP."""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "An exchange of this authorization code is already in progress."
+    default_code = "exchange_in_progress"
+
+
+class IdentityProviderUnavailableError(NexusAuthBaseException):
+    """Raised without contacting the IdP while its circuit breaker is open."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The identity provider is temporarily unavailable."
+    default_code = "identity_provider_unavailable"
+
+    def __init__(self, detail=None, code=None, wait: int | None = None) -> None:
+        super().__init__(detail, code)
+        # Sent as the Retry-After header by DRF's exception handler
+        self.wait = wait
@@ -0,0 +1,384 @@
+import weakref
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any
+
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.module_loading import import_string
+
+from nexus_auth.cache import (
+    LRUCache,
+    get_provider_configurations_key,
+    get_providers_response_key,
+    get_shared_cache,
+)
+from nexus_auth.metrics import record_cache_lookup
+from nexus_auth.providers.singleflight import flights
+from nexus_auth.settings import nexus_settings
+from nexus_auth.specs import ProviderSpecs, compile_providers_config
+
+if TYPE_CHECKING:
+    from nexus_auth.models import ProviderConfiguration
+
+_MISSING = object()
+
+_handlers: "weakref.WeakSet[CachedProvidersHandler]" = weakref.WeakSet()
+
+
+class CachedProvidersHandler:
+    """Providers configuration handler that caches the configuration of each tenant.
+
+    Wraps a handler, e.g. one reading the configuration from the database, so
+    that it is only called once per tenant and TTL in each process:
+
+        providers_handler = CachedProvidersHandler(
+            "path.to.your_handler_function",
+            tenant_key_func=lambda request: request.headers.get("X-Tenant"),
+            ttl=300,
+        )
+
+    and set NEXUS_AUTH.PROVIDERS_HANDLER to ``"path.to.providers_handler"``.
+    Requests whose tenant cannot be identified are passed to the wrapped
+    handler without caching.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., dict[str, dict[str, str]] | None] | str,
+        tenant_key_func: Callable[[Any], Any] | str | None = None,
+        ttl: float | None = 300,
+        max_entries: int = 1024,
+    ) -> None:
+        """Initialize the handler.
+
+        Args:
+            handler: Handler to wrap, or its dotted path
+            tenant_key_func: Function returning the key of the tenant of a request, or its
+                dotted path. Defaults to NEXUS_AUTH.TENANT_KEY_FUNC.
+            ttl: Time to live of a configuration in seconds, ``None`` to never expire
+            max_entries: Maximum number of tenants kept in memory
+        """
+        self._handler = handler
+        self._tenant_key_func = tenant_key_func
+        self.cache = LRUCache(
+            max_entries=max_entries, ttl=ttl, name="providers_handler"
+        )
+        _handlers.add(self)
+
+    @property
+    def handler(self) -> Callable[..., dict[str, dict[str, str]] | None]:
+        if isinstance(self._handler, str):
+            self._handler = import_string(self._handler)
+        return self._handler
+
+    def get_tenant_key(self, request: Any) -> str | None:
+        """Get the key of the tenant of a request.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            Optional[str]: Tenant key, or ``None`` if the tenant cannot be identified.
+        """
+        if self._tenant_key_func is None:
+            return nexus_settings.get_tenant_key(request)
+        if isinstance(self._tenant_key_func, str):
+            self._tenant_key_func = import_string(self._tenant_key_func)
+        tenant_key = self._tenant_key_func(request)
+        return None if tenant_key is None else str(tenant_key)
+
+    def __call__(
+        self, request: Any = None, **kwargs
+    ) -> dict[str, dict[str, str]] | None:
+        """Get the providers configuration of the tenant of a request.
+
+        Args:
+            request: HTTP request
+            **kwargs: Additional keyword arguments passed to the wrapped handler
+
+        Returns:
+            Optional[Mapping[str, Mapping[str, str]]]: Provider configuration,
+            compiled into :class:`~nexus_auth.specs.ProviderSpec` objects when cached
+        """
+        tenant_key = self.get_tenant_key(request) if request is not None else None
+        if tenant_key is None:
+            return self.handler(request=request, **kwargs)
+        return self.get_tenant_config(
+            tenant_key, lambda: self.handler(request=request, **kwargs)
+        )
+
+    def get_tenant_config(
+        self, tenant_key: str, load: Callable[[], dict[str, dict[str, str]] | None]
+    ) -> ProviderSpecs | None:
+        """Get the cached configuration of a tenant, loading it on a miss.
+
+        Args:
+            tenant_key: Key of the tenant
+            load: Function returning the configuration of the tenant
+
+        Returns:
+            Optional[Mapping[str, ProviderSpec]]: Compiled provider configuration
+        """
+        config = self.cache.get(tenant_key, _MISSING)
+        if config is _MISSING:
+            config = load()
+            # Keep the compiled configuration, lighter than the handler's dicts
+            if config:
+                config = compile_providers_config(config)
+            self.cache.set(tenant_key, config)
+        return config
+
+    def invalidate(self, tenant_key: Any) -> None:
+        """Drop the configuration of a tenant, e.g. after it was changed.
+
+        The cached providers response of the tenant is dropped as well. Other
+        processes keep their copy of the configuration until it expires.
+
+        Args:
+            tenant_key: Key of the tenant
+        """
+        tenant_key = str(tenant_key)
+        self.cache.delete(tenant_key)
+        get_shared_cache().delete(get_providers_response_key(tenant_key))
+
+    def clear(self) -> None:
+        """Drop the configuration of all tenants."""
+        self.cache.clear()
+
+
+class DatabaseProvidersHandler(CachedProvidersHandler):
+    """Providers configuration handler reading the ``ProviderConfiguration`` model.
+
+    Set NEXUS_AUTH.PROVIDERS_HANDLER to
+    ``"nexus_auth.handlers.database_providers_handler"`` and TENANT_KEY_FUNC
+    to the function returning the tenant of a request. Requests whose tenant
+    cannot be identified get the configurations of the ``""`` tenant.
+
+    The enabled configurations of a tenant are read in a single query, and
+    cached in the shared Django cache for PROVIDER_CONFIGURATIONS.CACHE_TTL
+    seconds and in each process for LOCAL_TTL seconds. Saving or deleting a
+    configuration drops the copy of its tenant in the shared cache and in the
+    current process, other processes read it again after LOCAL_TTL seconds.
+
+    Client secrets are never written to the shared cache. It holds the other
+    fields and the version of each configuration, and each process keeps the
+    secrets it read from the database by version, so that a process reads the
+    secrets of a tenant from the database once, and again after a change.
+
+    Unlike :class:`CachedProvidersHandler`, it does not wrap a handler: the
+    configurations are loaded by :meth:`load`.
+    """
+
+    def __init__(self, tenant_key_func: Callable[[Any], Any] | str | None = None):
+        """Initialize the handler.
+
+        Args:
+            tenant_key_func: Function returning the key of the tenant of a request, or its
+                dotted path. Defaults to NEXUS_AUTH.TENANT_KEY_FUNC.
+        """
+        self._handler = None
+        self._tenant_key_func = tenant_key_func
+        self._build_caches()
+        _handlers.add(self)
+
+    def _build_caches(self) -> None:
+        cache_settings = nexus_settings.get_provider_configurations_settings()
+        self.cache = LRUCache(
+            max_entries=cache_settings["MAX_ENTRIES"],
+            ttl=cache_settings["LOCAL_TTL"],
+            name="providers_handler",
+        )
+        # Secrets by tenant, provider type and version, which a change replaces
+        self.secrets = LRUCache(max_entries=cache_settings["MAX_ENTRIES"])
+
+    def __call__(self, request: Any = None, **kwargs) -> ProviderSpecs:
+        """Get the providers configuration of the tenant of a request.
+
+        Args:
+            request: HTTP request
+            **kwargs: Ignored
+
+        Returns:
+            Mapping[str, ProviderSpec]: Provider configuration, empty if the
+            tenant has no enabled configuration
+        """
+        tenant_key = self.get_tenant_key(request) if request is not None else None
+        return self.get_config(tenant_key or "")
+
+    def load(self, tenant: str) -> dict[str, dict[str, Any]]:
+        """Read the configurations of a tenant from the caches, or the database on a miss.
+
+        The configurations in the shared cache are only used if this process
+        holds their secrets. Concurrent misses of the same tenant in this
+        process share a single query.
+
+        Args:
+            tenant: Tenant of the configurations
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Provider configuration, empty if the
+            tenant has no enabled configuration
+        """
+        key = get_provider_configurations_key(tenant)
+        entries = get_shared_cache().get(key)
+        config = None if entries is None else self._add_secrets(tenant, entries)
+        record_cache_lookup("provider_configurations", hit=config is not None)
+        if config is None:
+            config, _ = flights.do(key, lambda: self.query(tenant))
+        return config
+
+    def query(self, tenant: str) -> dict[str, dict[str, Any]]:
+        """Read the enabled configurations of a tenant from the database, and cache them.
+
+        Args:
+            tenant: Tenant of the configurations
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Provider configuration
+        """
+        from nexus_auth.models import ProviderConfiguration
+
+        configs = self._cache_configurations(
+            ProviderConfiguration.objects.filter(tenant=tenant, enabled=True),
+            tenants=[tenant],
+        )
+        return configs[tenant]
+
+    def preload(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """Read the enabled configurations of all tenants in a single query.
+
+        They are stored in the shared cache, so that no worker queries them
+        again for CACHE_TTL seconds, except for the secrets of the tenants it
+        did not read yet.
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: Provider configuration of
+            each tenant with an enabled configuration
+        """
+        from nexus_auth.models import ProviderConfiguration
+
+        return self._cache_configurations(
+            ProviderConfiguration.objects.filter(enabled=True).iterator()
+        )
+
+    def _cache_configurations(
+        self,
+        configurations: Iterable["ProviderConfiguration"],
+        tenants: Iterable[str] = (),
+    ) -> dict[str, dict[str, dict[str, Any]]]:
+        """Store configurations in the shared cache without their secrets, kept in process.
+
+        Args:
+            configurations: ``ProviderConfiguration`` objects
+            tenants: Tenants cached even if they have no configuration
+
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: Provider configuration of each tenant
+        """
+        configs: dict[str, dict[str, dict[str, Any]]] = {
+            tenant: {} for tenant in tenants
+        }
+        entries: dict[str, dict[str, tuple[str, dict[str, Any]]]] = {
+            tenant: {} for tenant in tenants
+        }
+        for configuration in configurations:
+            tenant, provider_type = configuration.tenant, configuration.provider_type
+            configs.setdefault(tenant, {})[provider_type] = configuration.get_config()
+            entries.setdefault(tenant, {})[provider_type] = (
+                configuration.version,
+                configuration.get_public_config(),
+            )
+            self.secrets.set(
+                (tenant, provider_type, configuration.version),
+                configuration.client_secret,
+            )
+
+        cache_settings = nexus_settings.get_provider_configurations_settings()
+        get_shared_cache().set_many(
+            {
+                get_provider_configurations_key(tenant): tenant_entries
+                for tenant, tenant_entries in entries.items()
+            },
+            cache_settings["CACHE_TTL"],
+        )
+        return configs
+
+    def _add_secrets(
+        self, tenant: str, entries: dict[str, tuple[str, dict[str, Any]]]
+    ) -> dict[str, dict[str, Any]] | None:
+        """Add the secrets kept in process to the configurations of the shared cache.
+
+        Returns:
+            Optional[Dict[str, Dict[str, Any]]]: Provider configuration, or
+            ``None`` if this process does not hold one of the secrets
+        """
+        config = {}
+        for provider_type, (version, public_config) in entries.items():
+            client_secret = self.secrets.get((tenant, provider_type, version))
+            if client_secret is None:
+                return None
+            config[provider_type] = {**public_config, "client_secret": client_secret}
+        return config
+
+    def get_config(self, tenant: str) -> ProviderSpecs:
+        """Get the providers configuration of a tenant.
+
+        Args:
+            tenant: Tenant of the configurations
+
+        Returns:
+            Mapping[str, ProviderSpec]: Provider configuration, empty if the
+            tenant has no enabled configuration
+
+        Raises:
+            ImproperlyConfigured: If a configuration is missing a required option
+        """
+        return self.get_tenant_config(tenant, lambda: self.load(tenant)) or {}
+
+    def clear(self) -> None:
+        """Drop the configuration and the secrets of all tenants in this process."""
+        # Rebuilt to pick up a change of the PROVIDER_CONFIGURATIONS setting
+        self._build_caches()
+
+
+database_providers_handler = DatabaseProvidersHandler()
+
+
+def invalidate_provider_configurations(tenant: str) -> None:
+    """Drop the cached configurations of a tenant read from the database.
+
+    Drops them from the shared cache, and from the handlers of this process
+    along with the cached providers response of the tenant.
+
+    Args:
+        tenant: Tenant of the configurations
+    """
+    get_shared_cache().delete(get_provider_configurations_key(tenant))
+    for handler in list(_handlers):
+        handler.invalidate(tenant)
+
+
+def _invalidate_provider_configuration(*, instance: Any, **kwargs) -> None:
+    # After the commit, so that a concurrent read cannot cache the old rows again
+    transaction.on_commit(
+        lambda: invalidate_provider_configurations(instance.tenant),
+        using=kwargs.get("using"),
+    )
+
+
+post_save.connect(
+    _invalidate_provider_configuration, sender="nexus_auth.ProviderConfiguration"
+)
+post_delete.connect(
+    _invalidate_provider_configuration, sender="nexus_auth.ProviderConfiguration"
+)
+
+
+def _clear_handlers(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        for handler in list(_handlers):
+            handler.clear()
+
+
+setting_changed.connect(_clear_handlers)
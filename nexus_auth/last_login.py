@@ -0,0 +1,345 @@
+import atexit
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from nexus_auth.cache import get_shared_cache, make_key
+from nexus_auth.settings import nexus_settings
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_UID = "nexus_auth.last_login.record_login"
+
+BACKEND_MEMORY = "memory"
+BACKEND_CACHE = "cache"
+
+# Number of intervals a buffered login is kept in the shared cache
+_CACHE_RETENTION_INTERVALS = 10
+
+
+def write_last_logins(logins: dict[Any, datetime]) -> None:
+    """Save the last login of several users in a single UPDATE.
+
+    A timestamp only replaces a more recent one if it is newer, so that
+    flushes are idempotent and may run in any order.
+
+    Args:
+        logins: Last login timestamps by user primary key
+    """
+    if not logins:
+        return
+    User = get_user_model()
+    whens = [
+        When(
+            pk=pk,
+            then=Greatest(
+                Coalesce(F("last_login"), Value(timestamp)),
+                Value(timestamp),
+                output_field=DateTimeField(),
+            ),
+        )
+        for pk, timestamp in logins.items()
+    ]
+    User._default_manager.filter(pk__in=list(logins)).update(
+        last_login=Case(*whens, default=F("last_login"), output_field=DateTimeField())
+    )
+
+
+class LastLoginBuffer(ABC):
+    """Buffer of last login timestamps, flushed to the database in batches.
+
+    Logins are flushed by a background thread every ``flush_interval``
+    seconds, once ``flush_size`` logins are buffered, and when the process
+    exits.
+    """
+
+    def __init__(self, flush_interval: float, flush_size: int) -> None:
+        """Initialize the buffer.
+
+        Args:
+            flush_interval: Maximum delay in seconds before a login is saved
+            flush_size: Number of buffered logins that triggers a flush
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+
+    @abstractmethod
+    def add(self, user_pk: Any, timestamp: datetime) -> None:
+        """Buffer the login of a user.
+
+        Args:
+            user_pk: Primary key of the user
+            timestamp: Login time
+        """
+
+    @abstractmethod
+    def flush(self, final: bool = False) -> None:
+        """Save the buffered logins.
+
+        Args:
+            final: Whether the process is exiting
+        """
+
+    def start(self) -> None:
+        """Start the flushing thread, if not started yet."""
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="nexus-auth-last-login", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flushing thread and save the buffered logins."""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval + 1)
+        self._safe_flush(final=True)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._stopped.is_set():
+                self._safe_flush()
+
+    def _safe_flush(self, final: bool = False) -> None:
+        try:
+            self.flush(final=final)
+        except Exception:
+            # Losing a last login update must not take the worker down
+            logger.exception("Failed to save the last logins")
+
+
+class MemoryLastLoginBuffer(LastLoginBuffer):
+    """Buffer keeping the logins in process. Logins buffered by a crashed process are lost."""
+
+    def __init__(self, flush_interval: float, flush_size: int) -> None:
+        super().__init__(flush_interval, flush_size)
+        self._logins: dict[Any, datetime] = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_pk: Any, timestamp: datetime) -> None:
+        with self._lock:
+            previous = self._logins.get(user_pk)
+            if previous is None or previous < timestamp:
+                self._logins[user_pk] = timestamp
+            size = len(self._logins)
+        if size >= self.flush_size:
+            self._wakeup.set()
+        self.start()
+
+    def flush(self, final: bool = False) -> None:
+        with self._lock:
+            logins, self._logins = self._logins, {}
+        write_last_logins(logins)
+
+    def __len__(self) -> int:
+        return len(self._logins)
+
+
+class CacheLastLoginBuffer(LastLoginBuffer):
+    """Buffer keeping the logins in the shared Django cache, for multi-node setups.
+
+    Logins are appended to a log per interval. Every ``flush_size`` logins are
+    flushed by the worker that appended the last one, and the whole log by
+    any worker once the interval is over, skipping the slices already
+    flushed. Logins left by stopped or crashed workers are flushed by the
+    others, or by the next worker to start.
+    """
+
+    namespace = "last_login"
+
+    def __init__(self, flush_interval: float, flush_size: int) -> None:
+        super().__init__(flush_interval, flush_size)
+        self._full_slices: list[tuple[int, int]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def retention(self) -> int:
+        return max(int(self.flush_interval * _CACHE_RETENTION_INTERVALS), 60)
+
+    def add(self, user_pk: Any, timestamp: datetime) -> None:
+        cache = get_shared_cache()
+        bucket = self._current_bucket()
+        counter_key = self._counter_key(bucket)
+        cache.add(counter_key, 0, self.retention)
+        try:
+            index = cache.incr(counter_key)
+        except ValueError:
+            # The counter expired in between
+            cache.add(counter_key, 0, self.retention)
+            index = cache.incr(counter_key)
+        cache.set(self._entry_key(bucket, index), (user_pk, timestamp), self.retention)
+        if index % self.flush_size == 0:
+            with self._lock:
+                self._full_slices.append((bucket, index - self.flush_size + 1))
+            self._wakeup.set()
+        self.start()
+
+    def flush(self, final: bool = False) -> None:
+        cache = get_shared_cache()
+        with self._lock:
+            full_slices, self._full_slices = self._full_slices, []
+        for bucket, start in full_slices:
+            self._flush_slice(bucket, start, start + self.flush_size - 1)
+
+        current_bucket = self._current_bucket()
+        last_bucket = current_bucket if final else current_bucket - 1
+        first_bucket = current_bucket - _CACHE_RETENTION_INTERVALS
+        buckets = range(first_bucket, last_bucket + 1)
+        counts = cache.get_many([self._counter_key(bucket) for bucket in buckets])
+        for bucket in buckets:
+            count = counts.get(self._counter_key(bucket))
+            if not count:
+                continue
+            # Only one worker flushes the rest of a log
+            claim_key = make_key(f"{self.namespace}_claim", str(bucket), str(count))
+            if cache.add(claim_key, True, self.retention):
+                self._flush_log(bucket, count)
+
+    def _flush_log(self, bucket: int, count: int) -> None:
+        """Flush the logins of a log, except the full slices already flushed.
+
+        The full slices of a worker that stopped before flushing them are
+        flushed here. Flushing a login twice is harmless, see
+        :func:`write_last_logins`.
+        """
+        cache = get_shared_cache()
+        starts = range(1, count + 1, self.flush_size)
+        flushed = cache.get_many([self._flushed_key(bucket, start) for start in starts])
+        for start in starts:
+            if self._flushed_key(bucket, start) not in flushed:
+                end = min(start + self.flush_size - 1, count)
+                self._flush_range(bucket, start, end)
+
+    def _flush_slice(self, bucket: int, start: int, end: int) -> None:
+        self._flush_range(bucket, start, end)
+        cache = get_shared_cache()
+        cache.set(self._flushed_key(bucket, start), True, self.retention)
+
+    def _flush_range(self, bucket: int, start: int, end: int) -> None:
+        cache = get_shared_cache()
+        keys = [self._entry_key(bucket, index) for index in range(start, end + 1)]
+        logins: dict[Any, datetime] = {}
+        for user_pk, timestamp in cache.get_many(keys).values():
+            if user_pk not in logins or logins[user_pk] < timestamp:
+                logins[user_pk] = timestamp
+        write_last_logins(logins)
+
+    def _current_bucket(self) -> int:
+        return int(time.time() // self.flush_interval)
+
+    def _counter_key(self, bucket: int) -> str:
+        return make_key(f"{self.namespace}_count", str(bucket))
+
+    def _entry_key(self, bucket: int, index: int) -> str:
+        return make_key(self.namespace, str(bucket), str(index))
+
+    def _flushed_key(self, bucket: int, start: int) -> str:
+        return make_key(f"{self.namespace}_flushed", str(bucket), str(start))
+
+
+BACKENDS = {
+    BACKEND_MEMORY: MemoryLastLoginBuffer,
+    BACKEND_CACHE: CacheLastLoginBuffer,
+}
+
+_buffer: LastLoginBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> LastLoginBuffer:
+    """Get the buffer configured in the LAST_LOGIN setting.
+
+    Returns:
+        LastLoginBuffer: Last login buffer
+
+    Raises:
+        ImproperlyConfigured: If the backend is unknown
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                last_login_settings = nexus_settings.get_last_login_settings()
+                backend = last_login_settings["BACKEND"]
+                if backend not in BACKENDS:
+                    raise ImproperlyConfigured(
+                        f"Unknown LAST_LOGIN backend '{backend}'. "
+                        f"Expected one of: {', '.join(BACKENDS)}."
+                    )
+                _buffer = BACKENDS[backend](
+                    flush_interval=last_login_settings["FLUSH_INTERVAL"],
+                    flush_size=last_login_settings["FLUSH_SIZE"],
+                )
+    return _buffer
+
+
+def record_login(sender: Any, user: Any, **kwargs) -> None:
+    """Receiver of user_logged_in buffering the login instead of saving it."""
+    user.last_login = timezone.now()
+    get_buffer().add(user.pk, user.last_login)
+
+
+def flush() -> None:
+    """Save the buffered logins of this process."""
+    if _buffer is not None:
+        _buffer.flush()
+
+
+def install(receivers: Iterable[str] = ("update_last_login",)) -> None:
+    """Replace Django's last login receivers with the write-behind one.
+
+    Args:
+        receivers: Dispatch UIDs of the user_logged_in receivers to disconnect
+    """
+    for dispatch_uid in receivers:
+        user_logged_in.disconnect(dispatch_uid=dispatch_uid)
+    user_logged_in.connect(record_login, dispatch_uid=DISPATCH_UID)
+
+
+def uninstall() -> None:
+    """Restore Django's last login receiver and save the buffered logins."""
+    from django.contrib.auth.models import update_last_login
+
+    user_logged_in.disconnect(dispatch_uid=DISPATCH_UID)
+    user_logged_in.connect(update_last_login, dispatch_uid="update_last_login")
+    _reset_buffer()
+
+
+def _reset_buffer(**kwargs) -> None:
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, None
+    if buffer is not None:
+        buffer.stop()
+
+
+def _on_setting_changed(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        _reset_buffer()
+
+
+setting_changed.connect(_on_setting_changed)
+atexit.register(_reset_buffer)
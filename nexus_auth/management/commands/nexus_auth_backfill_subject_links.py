@@ -0,0 +1,146 @@
+import csv
+import sys
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower
+
+from nexus_auth.models import ProviderSubjectLink
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Link existing users to their subject at an IdP, so that their next login "
+        "does not resolve them by email. Subjects are read from a CSV file with "
+        "email,subject[,tenant] rows (e.g. an export of the IdP directory), or "
+        "from a field of the user model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "provider_type", help="Provider type of the links, e.g. microsoft_tenant"
+        )
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            "--file", help="CSV file with email,subject[,tenant] rows, '-' for stdin"
+        )
+        source.add_argument(
+            "--subject-field", help="User field holding the subject of each user"
+        )
+        parser.add_argument(
+            "--tenant",
+            default="",
+            help="Tenant of the links, unless set by the rows of the file",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the links without creating them",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive integer.")
+
+        if options["file"]:
+            links = self.iter_file_links(options)
+        else:
+            links = self.iter_user_links(options)
+
+        created = 0
+        for chunk in chunked(links, options["chunk_size"]):
+            if not options["dry_run"]:
+                ProviderSubjectLink.objects.bulk_create(chunk, ignore_conflicts=True)
+            created += len(chunk)
+
+        verb = "Would link" if options["dry_run"] else "Linked"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {created} users (existing links are left unchanged)."
+            )
+        )
+
+    def iter_file_links(self, options) -> Iterator[ProviderSubjectLink]:
+        """Stream the rows of the file and match them to users, one chunk at a time."""
+        User = get_user_model()
+        email_field = User.get_email_field_name()
+        path = options["file"]
+        try:
+            file = sys.stdin if path == "-" else open(path, newline="")
+        except OSError as e:
+            raise CommandError(f"Cannot read {path}: {e}") from e
+
+        unmatched = 0
+        try:
+            rows = (row for row in csv.reader(file) if row and row[0] != "email")
+            for chunk in chunked(rows, options["chunk_size"]):
+                subjects = {}
+                for row in chunk:
+                    if len(row) < 2 or not row[1].strip():
+                        raise CommandError(f"Invalid row: {row!r}")
+                    tenant = row[2].strip() if len(row) > 2 else options["tenant"]
+                    subjects[row[0].strip().lower()] = (row[1].strip(), tenant)
+
+                users = (
+                    User._default_manager.alias(
+                        nexus_auth_email_lower=Lower(email_field)
+                    )
+                    .filter(nexus_auth_email_lower__in=subjects)
+                    .values_list("pk", email_field)
+                )
+                matched = set()
+                for pk, email in users:
+                    email = email.lower()
+                    if email in matched:
+                        continue
+                    matched.add(email)
+                    subject, tenant = subjects[email]
+                    yield ProviderSubjectLink(
+                        provider_type=options["provider_type"],
+                        tenant=tenant,
+                        subject=subject,
+                        user_id=pk,
+                    )
+                unmatched += len(subjects) - len(matched)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        if unmatched:
+            self.stdout.write(
+                self.style.WARNING(f"{unmatched} emails did not match any user.")
+            )
+
+    def iter_user_links(self, options) -> Iterator[ProviderSubjectLink]:
+        """Stream the users whose subject field is set."""
+        User = get_user_model()
+        field = options["subject_field"]
+        try:
+            User._meta.get_field(field)
+        except FieldDoesNotExist as e:
+            raise CommandError(f"{User.__name__} has no field '{field}'.") from e
+
+        users = (
+            User._default_manager.exclude(**{f"{field}__isnull": True})
+            .exclude(**{field: ""})
+            .values_list("pk", field)
+            .iterator(chunk_size=options["chunk_size"])
+        )
+        for pk, subject in users:
+            yield ProviderSubjectLink(
+                provider_type=options["provider_type"],
+                tenant=options["tenant"],
+                subject=str(subject),
+                user_id=pk,
+            )
@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from nexus_auth.settings import nexus_settings
+from nexus_auth.testing.stats import LatencyRecorder
+from nexus_auth.testing.stub_idp import StubIdP, build_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent code exchanges to a running deployment and report the "
+        "latency histogram and the errors as JSON. The deployment must serve the "
+        "synthetic tenants of nexus_auth.testing.load from the bundled stub IdP, "
+        "which this command can start."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url", nargs="?", help="Base URL of the deployment, e.g. http://app:8000/"
+        )
+        parser.add_argument(
+            "--provider", default="oidc", help="Provider type to log in with"
+        )
+        parser.add_argument(
+            "--exchange-path",
+            default="oauth/{provider_type}/exchange",
+            help="Path of the exchange endpoint, relative to the URL",
+        )
+        parser.add_argument("--concurrency", type=int, default=16)
+        limit = parser.add_mutually_exclusive_group()
+        limit.add_argument("--requests", type=int, default=1000)
+        limit.add_argument(
+            "--duration", type=float, help="Seconds to send requests for"
+        )
+        parser.add_argument("--tenants", type=int, default=10)
+        parser.add_argument("--tenant-prefix", default="loadtest-")
+        parser.add_argument(
+            "--tenant-header",
+            help="Header selecting the tenant, defaults to LOADTEST.TENANT_HEADER",
+        )
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--email-pattern",
+            default="loadtest-{index}@example.com",
+            help="Email of the users logging in, formatted with their index",
+        )
+        parser.add_argument(
+            "--create-users",
+            action="store_true",
+            help="Create the missing users in the database of these settings",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+        stub = parser.add_argument_group("stub IdP")
+        stub.add_argument(
+            "--stub-port", type=int, help="Start the stub IdP on this port"
+        )
+        stub.add_argument("--stub-host", default="127.0.0.1")
+        stub.add_argument(
+            "--stub-url",
+            help="URL of the stub IdP as seen by the deployment, "
+            "defaults to LOADTEST.STUB_URL, then to the listening address",
+        )
+        stub.add_argument(
+            "--stub-only",
+            action="store_true",
+            help="Only serve the stub IdP, until interrupted",
+        )
+        stub.add_argument(
+            "--latency", action="append", default=[], metavar="ENDPOINT=SECONDS"
+        )
+        stub.add_argument(
+            "--jitter", action="append", default=[], metavar="ENDPOINT=SECONDS"
+        )
+        stub.add_argument(
+            "--error-rate", action="append", default=[], metavar="ENDPOINT=RATE"
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["tenants"] < 1 or options["users"] < 1:
+            raise CommandError(
+                "--concurrency, --tenants and --users must be positive integers."
+            )
+        if not options["url"] and not options["stub_only"]:
+            raise CommandError("The URL of the deployment is required.")
+        if options["stub_only"] and options["stub_port"] is None:
+            raise CommandError("--stub-only requires --stub-port.")
+
+        emails = [
+            options["email_pattern"].format(index=index)
+            for index in range(options["users"])
+        ]
+        if options["create_users"]:
+            self.create_users(emails)
+
+        stub = None
+        if options["stub_port"] is not None:
+            try:
+                profiles = build_profiles(
+                    options["latency"], options["jitter"], options["error_rate"]
+                )
+            except ValueError as e:
+                raise CommandError(str(e)) from e
+            stub = StubIdP(
+                host=options["stub_host"],
+                port=options["stub_port"],
+                profiles=profiles,
+                public_url=options["stub_url"]
+                or nexus_settings.get_loadtest_settings()["STUB_URL"],
+            ).start()
+            self.stderr.write(f"Stub IdP listening on {stub.base_url}")
+
+        try:
+            if options["stub_only"]:
+                self.serve_forever()
+                return
+            report = self.run(emails, options)
+            if stub is not None:
+                report["idp_requests"] = dict(stub.requests)
+        finally:
+            if stub is not None:
+                stub.stop()
+
+        latency = report["latency_ms"]
+        self.stderr.write(
+            f"{report['requests']} requests, {report['errors']} errors, "
+            f"{report['throughput_rps']}/s, p50 {latency['p50']}ms, "
+            f"p95 {latency['p95']}ms, p99 {latency['p99']}ms"
+        )
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload)
+        else:
+            self.stdout.write(payload)
+
+    def run(self, emails: list[str], options) -> dict:
+        """Send the exchanges from a pool of threads and summarize them."""
+        url = urljoin(
+            options["url"].rstrip("/") + "/",
+            options["exchange_path"].format(provider_type=options["provider"]),
+        )
+        tenant_header = (
+            options["tenant_header"]
+            or nexus_settings.get_loadtest_settings()["TENANT_HEADER"]
+        )
+        tenants = [
+            f"{options['tenant_prefix']}{index}" for index in range(options["tenants"])
+        ]
+        recorder = LatencyRecorder()
+        local = threading.local()
+        lock = threading.Lock()
+        sent = 0
+        deadline = (
+            time.monotonic() + options["duration"] if options["duration"] else None
+        )
+
+        def next_index() -> int | None:
+            nonlocal sent
+            with lock:
+                if deadline is None and sent >= options["requests"]:
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                sent += 1
+                return sent - 1
+
+        def worker() -> None:
+            local.session = requests.Session()
+            while (index := next_index()) is not None:
+                start = time.perf_counter()
+                try:
+                    response = local.session.post(
+                        url,
+                        json={
+                            "code": emails[index % len(emails)],
+                            "code_verifier": "loadtest-verifier",
+                            "redirect_uri": "http://localhost/callback",
+                        },
+                        headers={tenant_header: tenants[index % len(tenants)]},
+                        timeout=options["timeout"],
+                    )
+                except requests.exceptions.RequestException as e:
+                    recorder.record(time.perf_counter() - start, type(e).__name__)
+                    continue
+                recorder.record(time.perf_counter() - start, self.get_error(response))
+            local.session.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            for future in [
+                executor.submit(worker) for _ in range(options["concurrency"])
+            ]:
+                future.result()
+
+        report = {
+            "url": url,
+            "provider": options["provider"],
+            "concurrency": options["concurrency"],
+            "tenants": options["tenants"],
+            "users": len(emails),
+        }
+        report.update(recorder.summary(time.perf_counter() - start))
+        report["histogram_ms"] = recorder.histogram()
+        return report
+
+    def get_error(self, response: requests.Response) -> str | None:
+        """Describe the error of a response, e.g. ``404 <detail>``."""
+        if response.status_code < 400:
+            return None
+        try:
+            detail = response.json().get("detail")
+        except (ValueError, AttributeError):
+            detail = None
+        return (
+            f"{response.status_code} {detail}" if detail else str(response.status_code)
+        )
+
+    def create_users(self, emails: list[str]) -> None:
+        User = get_user_model()
+        email_field = User.get_email_field_name()
+        users = [
+            User(**{User.USERNAME_FIELD: email, email_field: email}) for email in emails
+        ]
+        for user in users:
+            user.set_unusable_password()
+        User._default_manager.bulk_create(users, ignore_conflicts=True)
+        self.stderr.write(f"Created the missing users among {len(users)}.")
+
+    def serve_forever(self) -> None:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
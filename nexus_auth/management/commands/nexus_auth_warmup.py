@@ -0,0 +1,84 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nexus_auth.settings import nexus_settings
+from nexus_auth.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the providers of every configured tenant and fill the shared "
+        "caches their logins use: provider configurations, discovery documents "
+        "and signing keys. Reports the warm-up time and the failures of each "
+        "tenant as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tenant",
+            action="append",
+            dest="tenants",
+            metavar="TENANT",
+            help="Only warm up this tenant, may be repeated",
+        )
+        parser.add_argument(
+            "--max-workers",
+            type=int,
+            help="Tenants warmed up concurrently, defaults to WARMUP.MAX_WORKERS",
+        )
+        parser.add_argument(
+            "--no-preconnect",
+            action="store_false",
+            dest="preconnect",
+            default=None,
+            help="Do not open connections to the IdPs",
+        )
+        parser.add_argument(
+            "--fail-on-error",
+            action="store_true",
+            help="Exit with an error status if a provider failed to warm up",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options["max_workers"] is not None and options["max_workers"] < 1:
+            raise CommandError("--max-workers must be a positive integer.")
+
+        start = time.perf_counter()
+        results = warm_up(
+            tenants=options["tenants"],
+            max_workers=options["max_workers"],
+            preconnect=options["preconnect"],
+        )
+        duration = time.perf_counter() - start
+
+        failures = [result for result in results if not result.ok]
+        report = {
+            "tenants": len(results),
+            "providers": sum(
+                len(result.providers) + len(result.errors) for result in results
+            ),
+            "failures": len(failures),
+            "duration_ms": round(duration * 1000, 2),
+            "max_workers": options["max_workers"]
+            or nexus_settings.get_warmup_settings()["MAX_WORKERS"],
+            "results": [result.as_dict() for result in results],
+        }
+        self.stderr.write(
+            f"Warmed up {report['tenants']} tenants in {report['duration_ms']}ms, "
+            f"{report['failures']} failed"
+        )
+        for result in failures:
+            self.stderr.write(f"  {result.tenant}: {result.errors}")
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload)
+        else:
+            self.stdout.write(payload)
+
+        if failures and options["fail_on_error"]:
+            raise CommandError(f"{len(failures)} tenants failed to warm up.")
@@ -0,0 +1,467 @@
+import bisect
+import math
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from typing import Any
+
+from nexus_auth.settings import nexus_settings
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Label value of the series past NEXUS_AUTH.METRICS.MAX_SERIES
+OVERFLOW_LABEL = "other"
+
+OUTCOME_SUCCESS = "success"
+OUTCOME_ERROR = "error"
+
+SCOPE_PROCESS = "process"
+SCOPE_SHARED = "shared"
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+
+# Latency buckets in seconds, from a cached lookup to a slow IdP
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _ShardOwner:
+    """Kept by the thread of a shard, whose values are folded once the thread is gone."""
+
+    __slots__ = ("__weakref__",)
+
+
+class Metric(ABC):
+    """Base class of the metrics, with values sharded per thread.
+
+    Each thread updates its own shard without locking, and the shards are
+    summed when the metric is collected. The lock is only taken the first
+    time a thread updates the metric or a series is seen. When a thread
+    ends, its shard is folded into a base shard, so that short-lived
+    threads do not add to the memory of the metric.
+
+    The number of series is bounded by ``max_series``: past it, the values
+    of new label combinations are added to a single series with every label
+    set to ``other``, so that e.g. a large number of tenants cannot exhaust
+    the memory of the process.
+    """
+
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        max_series: int | None = None,
+    ) -> None:
+        """Initialize the metric.
+
+        Args:
+            name: Name of the metric
+            documentation: Help text of the metric
+            labelnames: Names of the labels
+            max_series: Maximum number of series, defaults to NEXUS_AUTH.METRICS.MAX_SERIES
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: set[tuple[str, ...]] = set()
+        # Values of the threads that are gone
+        self._base: dict[tuple[str, ...], Any] = {}
+        # Shard of each live thread, by id
+        self._shards: dict[int, dict[tuple[str, ...], Any]] = {}
+        self._local = threading.local()
+        # Reentrant, as a shard may be folded by the garbage collector at any time
+        self._lock = threading.RLock()
+
+    def reset(self) -> None:
+        """Drop all the series of the metric."""
+        with self._lock:
+            self._base.clear()
+            for shard in self._shards.values():
+                shard.clear()
+            self._series.clear()
+
+    def _get_shard(self) -> dict[tuple[str, ...], Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            # The thread-local owner is dropped when the thread ends
+            owner = _ShardOwner()
+            weakref.finalize(owner, self._fold_shard, shard)
+            with self._lock:
+                self._shards[id(shard)] = shard
+            self._local.owner = owner
+            self._local.shard = shard
+        return shard
+
+    def _fold_shard(self, shard: dict[tuple[str, ...], Any]) -> None:
+        with self._lock:
+            if self._shards.pop(id(shard), None) is not None:
+                self._merge(self._base, shard)
+
+    def _merge(
+        self, into: dict[tuple[str, ...], Any], shard: dict[tuple[str, ...], Any]
+    ) -> None:
+        """Add the values of a shard to another one.
+
+        Args:
+            into: Shard updated in place
+            shard: Shard whose values are added
+        """
+        for series, value in shard.items():
+            into[series] = into.get(series, 0) + value
+
+    def _get_series(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        series = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if series in self._series:
+            return series
+        max_series = (
+            self.max_series or nexus_settings.get_metrics_settings()["MAX_SERIES"]
+        )
+        with self._lock:
+            if series not in self._series:
+                if len(self._series) >= max_series:
+                    return (OVERFLOW_LABEL,) * len(self.labelnames)
+                self._series.add(series)
+        return series
+
+    def _get_shards(self) -> list[dict[tuple[str, ...], Any]]:
+        with self._lock:
+            # Copying a dict is atomic, unlike iterating over it
+            return [self._base.copy()] + [
+                shard.copy() for shard in self._shards.values()
+            ]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """Render the metric in the Prometheus text exposition format.
+
+        Returns:
+            List[str]: Lines of the metric
+        """
+
+
+class Counter(Metric):
+    """Monotonic counter, e.g. of exchanges or cache lookups."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Increment the counter of a series.
+
+        Args:
+            amount: Value to add
+            **labels: Label values of the series
+        """
+        shard = self._get_shard()
+        series = self._get_series(labels)
+        shard[series] = shard.get(series, 0) + amount
+
+    def collect(self) -> dict[tuple[str, ...], float]:
+        """Get the value of every series.
+
+        Returns:
+            Dict[Tuple[str, ...], float]: Values by label values
+        """
+        values: dict[tuple[str, ...], float] = {}
+        for shard in self._get_shards():
+            for series, value in shard.items():
+                values[series] = values.get(series, 0) + value
+        return values
+
+    def get(self, **labels: Any) -> float:
+        """Get the value of a series.
+
+        Args:
+            **labels: Label values of the series
+
+        Returns:
+            float: Value of the series, 0 if it was never incremented
+        """
+        series = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self.collect().get(series, 0)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, series)} {_format_value(value)}"
+            for series, value in sorted(self.collect().items())
+        ]
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. request durations in seconds."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        max_series: int | None = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Initialize the histogram.
+
+        Args:
+            name: Name of the metric
+            documentation: Help text of the metric
+            labelnames: Names of the labels
+            max_series: Maximum number of series, defaults to NEXUS_AUTH.METRICS.MAX_SERIES
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Add a value to the distribution of a series.
+
+        Args:
+            value: Observed value
+            **labels: Label values of the series
+        """
+        shard = self._get_shard()
+        series = self._get_series(labels)
+        # Count per bucket, then the +Inf bucket and the sum of the values
+        counts = shard.get(series)
+        if counts is None:
+            counts = shard[series] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge(
+        self,
+        into: dict[tuple[str, ...], list[float]],
+        shard: dict[tuple[str, ...], list[float]],
+    ) -> None:
+        for series, counts in shard.items():
+            total = into.get(series)
+            # Replaced rather than updated, the lists of a collected copy are shared
+            into[series] = (
+                list(counts)
+                if total is None
+                else [a + b for a, b in zip(total, counts, strict=True)]
+            )
+
+    def collect(self) -> dict[tuple[str, ...], list[float]]:
+        """Get the distribution of every series.
+
+        Returns:
+            Dict[Tuple[str, ...], List[float]]: Count per bucket, then of the
+            +Inf bucket, then the sum of the values, by label values
+        """
+        values: dict[tuple[str, ...], list[float]] = {}
+        for shard in self._get_shards():
+            for series, counts in shard.items():
+                total = values.setdefault(series, [0] * len(counts))
+                for index, count in enumerate(list(counts)):
+                    total[index] += count
+        return values
+
+    def render(self) -> list[str]:
+        lines = []
+        bucket_labelnames = (*self.labelnames, "le")
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for series, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts[:-1], strict=True):
+                cumulative += count
+                labels = _format_labels(bucket_labelnames, (*series, bound))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, series)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registry of the metrics exposed by a process."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs
+    ) -> Counter:
+        """Get a counter, registering it if needed.
+
+        Args:
+            name: Name of the metric, ending with ``_total``
+            documentation: Help text of the metric
+            labelnames: Names of the labels
+            **kwargs: Keyword arguments passed to :class:`Counter`
+
+        Returns:
+            Counter: Registered counter
+        """
+        return self._register(Counter, name, documentation, labelnames, **kwargs)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs
+    ) -> Histogram:
+        """Get a histogram, registering it if needed.
+
+        Args:
+            name: Name of the metric
+            documentation: Help text of the metric
+            labelnames: Names of the labels
+            **kwargs: Keyword arguments passed to :class:`Histogram`
+
+        Returns:
+            Histogram: Registered histogram
+        """
+        return self._register(Histogram, name, documentation, labelnames, **kwargs)
+
+    def get(self, name: str) -> Metric | None:
+        """Get a registered metric.
+
+        Args:
+            name: Name of the metric
+
+        Returns:
+            Optional[Metric]: Metric, ``None`` if not registered
+        """
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        """Drop the series of every metric."""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics page
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric_class, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(
+                    f"Metric '{name}' is already registered as a {metric.type}."
+                )
+            return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n")
+
+
+def _escape_label_value(value: str) -> str:
+    return _escape(value).replace('"', r"\"")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str]) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label_value(value)}"'
+        for name, value in zip(labelnames, values, strict=True)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+registry = MetricsRegistry()
+
+exchanges = registry.counter(
+    "nexus_auth_exchanges_total",
+    "Code exchanges by provider, tenant and outcome.",
+    ("provider", "tenant", "outcome"),
+)
+exchange_duration = registry.histogram(
+    "nexus_auth_exchange_duration_seconds",
+    "Duration of the code exchanges.",
+    ("provider", "outcome"),
+)
+idp_request_duration = registry.histogram(
+    "nexus_auth_idp_request_duration_seconds",
+    "Duration of the requests sent to the IdPs, by endpoint.",
+    ("endpoint", "method", "status"),
+)
+coalesced_requests = registry.counter(
+    "nexus_auth_coalesced_requests_total",
+    "IdP requests answered by an identical request in flight, by endpoint and scope.",
+    ("endpoint", "scope"),
+)
+cache_requests = registry.counter(
+    "nexus_auth_cache_requests_total",
+    "Cache lookups by cache and result.",
+    ("cache", "result"),
+)
+throttled_requests = registry.counter(
+    "nexus_auth_throttled_requests_total",
+    "Requests rejected by the rate limits, by view and limit.",
+    ("view", "limit"),
+)
+email_resolutions = registry.counter(
+    "nexus_auth_email_resolutions_total",
+    "Microsoft Entra email resolutions by strategy and source.",
+    ("strategy", "source"),
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache lookup.
+
+    Args:
+        cache: Name of the cache
+        hit: Whether the entry was found
+    """
+    cache_requests.inc(cache=cache, result=CACHE_HIT if hit else CACHE_MISS)
+
+
+@contextmanager
+def record_exchange(request: Any, provider_type: str) -> Iterator[None]:
+    """Count the exchange run in the block and observe its duration.
+
+    The outcome of a failed exchange is the ``default_code`` of the raised
+    exception, e.g. ``no_associated_user``.
+
+    Args:
+        request: HTTP request of the exchange
+        provider_type: Type of the provider
+    """
+    start = time.perf_counter()
+    outcome = OUTCOME_SUCCESS
+    try:
+        yield
+    except Exception as e:
+        outcome = getattr(e, "default_code", OUTCOME_ERROR)
+        raise
+    finally:
+        exchange_duration.observe(
+            time.perf_counter() - start, provider=provider_type, outcome=outcome
+        )
+        exchanges.inc(
+            provider=provider_type,
+            tenant=nexus_settings.get_tenant_key(request) or "",
+            outcome=outcome,
+        )
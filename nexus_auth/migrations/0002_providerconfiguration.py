@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("nexus_auth", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProviderConfiguration",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tenant", models.CharField(blank=True, default="", max_length=255)),
+                ("provider_type", models.CharField(max_length=64)),
+                ("client_id", models.CharField(max_length=255)),
+                ("client_secret", models.CharField(max_length=255)),
+                ("options", models.JSONField(blank=True, default=dict)),
+                ("enabled", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="providerconfiguration",
+            constraint=models.UniqueConstraint(
+                fields=("tenant", "provider_type"),
+                name="nexus_auth_unique_tenant_provider",
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+from typing import Any
+
+from django.conf import settings
+from django.db import models
+
+
+class ProviderSubjectLink(models.Model):
+    """Link between the identity of a user at an IdP and a Django user.
+
+    Filled on the first login of a user, so that later logins resolve the
+    user by subject instead of email address.
+    """
+
+    provider_type = models.CharField(max_length=64)
+    tenant = models.CharField(max_length=255, blank=True, default="")
+    subject = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="nexus_auth_subject_links",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["provider_type", "tenant", "subject"],
+                name="nexus_auth_unique_provider_subject",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.provider_type}:{self.tenant}:{self.subject}"
+
+
+class ProviderConfiguration(models.Model):
+    """OAuth application of a tenant at an IdP.
+
+    Read by :class:`~nexus_auth.handlers.DatabaseProvidersHandler`, so that
+    tenants can be added without a deploy. Options besides the client
+    credentials, e.g. ``tenant_id`` or ``issuer``, are stored in ``options``.
+    """
+
+    tenant = models.CharField(max_length=255, blank=True, default="")
+    provider_type = models.CharField(max_length=64)
+    client_id = models.CharField(max_length=255)
+    client_secret = models.CharField(max_length=255)
+    options = models.JSONField(default=dict, blank=True)
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also the index of the query reading the configuration of a tenant
+            models.UniqueConstraint(
+                fields=["tenant", "provider_type"],
+                name="nexus_auth_unique_tenant_provider",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.tenant}:{self.provider_type}"
+
+    @property
+    def version(self) -> str:
+        """Version of the configuration, changed by each save."""
+        return self.updated_at.isoformat()
+
+    def get_config(self) -> dict[str, Any]:
+        """Get the configuration of the provider, as passed to its builder.
+
+        Returns:
+            Dict[str, Any]: Provider configuration
+        """
+        return {**self.get_public_config(), "client_secret": self.client_secret}
+
+    def get_public_config(self) -> dict[str, Any]:
+        """Get the configuration of the provider without its client secret.
+
+        Returns:
+            Dict[str, Any]: Provider configuration, safe to store in a shared cache
+        """
+        return {**self.options, "client_id": self.client_id}
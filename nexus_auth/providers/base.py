@@ -1,14 +1,39 @@
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any
 from urllib.parse import urlencode
 
 import jwt
 import requests
 
+from nexus_auth.cache import LRUCache
 from nexus_auth.exceptions import (
     IDTokenExchangeError,
+    InvalidIDTokenError,
     InvalidTokenResponseError,
     MissingIDTokenError,
 )
+from nexus_auth.providers import http
+from nexus_auth.providers.http import httpx
+from nexus_auth.providers.jwks import jwks_cache
+from nexus_auth.settings import nexus_settings
+from nexus_auth.specs import ProviderSpec
+from nexus_auth.timing import PHASE_ID_TOKEN, PHASE_TOKEN, timed
+
+
+@dataclass
+class ProviderIdentity:
+    """Identity of a user at an IdP, as returned by the token exchange."""
+
+    # Stable identifier of the user at the IdP, e.g. the sub claim
+    subject: str | None
+    # Scope in which the subject is unique, e.g. the directory of the user
+    tenant: str = ""
+    # Email address, if it could be read without another request to the IdP
+    email: str | None = None
+    # Access token, kept for providers that resolve the email through an API
+    access_token: str | None = field(default=None, repr=False)
 
 
 class OAuth2IdentityProvider(ABC):
@@ -20,6 +45,9 @@ class OAuth2IdentityProvider(ABC):
 
     provider_type: str = ""
 
+    # ID token claim holding the stable identifier of the user
+    SUBJECT_CLAIM = "sub"
+
     def __init__(
         self,
         client_id: str,
@@ -55,6 +83,25 @@ class OAuth2IdentityProvider(ABC):
         """
         pass
 
+    def get_jwks_url(self) -> str | None:
+        """Get the URL of the JSON Web Key Set used to sign the ID tokens.
+
+        Providers that return ``None`` skip the signature verification of
+        their ID tokens.
+
+        Returns:
+            Optional[str]: JWKS URL
+        """
+        return None
+
+    def get_issuer(self) -> str | Sequence[str] | None:
+        """Get the expected ``iss`` claim of the ID tokens.
+
+        Returns:
+            Optional[Union[str, Sequence[str]]]: Issuer identifier(s), or ``None`` to skip the check
+        """
+        return None
+
     def build_auth_url(self) -> str:
         """Build the authorization URL for the IdP.
 
@@ -69,6 +116,76 @@ class OAuth2IdentityProvider(ABC):
 
         return f"{self.get_authorization_url()}?{urlencode(query_params)}"
 
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """Send a POST request to the IdP through the shared connection pool.
+
+        Args:
+            url: URL to send the request to
+            **kwargs: Keyword arguments passed to ``requests.Session.post``
+
+        Returns:
+            requests.Response: Response from the IdP
+        """
+        return http.request("post", url, **kwargs)
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """Send a GET request to the IdP through the shared connection pool.
+
+        Args:
+            url: URL to send the request to
+            **kwargs: Keyword arguments passed to ``requests.Session.get``
+
+        Returns:
+            requests.Response: Response from the IdP
+        """
+        return http.request("get", url, **kwargs)
+
+    async def _apost(self, url: str, **kwargs) -> "httpx.Response":
+        """Send a POST request to the IdP through the shared async client.
+
+        Args:
+            url: URL to send the request to
+            **kwargs: Keyword arguments passed to ``httpx.AsyncClient.post``
+
+        Returns:
+            httpx.Response: Response from the IdP
+        """
+        return await http.arequest("post", url, **kwargs)
+
+    async def _aget(self, url: str, **kwargs) -> "httpx.Response":
+        """Send a GET request to the IdP through the shared async client.
+
+        Args:
+            url: URL to send the request to
+            **kwargs: Keyword arguments passed to ``httpx.AsyncClient.get``
+
+        Returns:
+            httpx.Response: Response from the IdP
+        """
+        return await http.arequest("get", url, **kwargs)
+
+    def get_token_request_data(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> dict[str, str]:
+        """Build the form data sent to the token endpoint.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            Dict[str, str]: Token request form data
+        """
+        return {
+            "grant_type": "authorization_code",
+            "code": authorization_code,
+            "redirect_uri": redirect_uri,
+            "client_id": self.client_id,
+            "code_verifier": code_verifier,
+            "client_secret": self.client_secret,
+        }
+
     def fetch_id_token(
         self, authorization_code: str, code_verifier: str, redirect_uri: str
     ) -> str:
@@ -90,21 +207,16 @@ class OAuth2IdentityProvider(ABC):
             InvalidTokenResponseError: If the token response from the IdP is invalid
         """
         token_url = self.get_token_url()
-        data = {
-            "grant_type": "authorization_code",
-            "code": authorization_code,
-            "redirect_uri": redirect_uri,
-            "client_id": self.client_id,
-            "code_verifier": code_verifier,
-            "client_secret": self.client_secret,
-        }
+        data = self.get_token_request_data(
+            authorization_code, code_verifier, redirect_uri
+        )
         try:
-            response = requests.post(
-                token_url,
-                data=data,
-                timeout=10,
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
+            with timed(PHASE_TOKEN):
+                response = self._post(
+                    token_url,
+                    data=data,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                )
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             raise IDTokenExchangeError() from e
@@ -119,6 +231,152 @@ class OAuth2IdentityProvider(ABC):
 
         return token_data["id_token"]
 
+    async def afetch_id_token(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> str:
+        """Async version of :meth:`fetch_id_token`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            str: ID token
+
+        Raises:
+            IDTokenExchangeError: If the token exchange requests fails
+            MissingIDTokenError: If the token response is missing the ID token
+            InvalidTokenResponseError: If the token response from the IdP is invalid
+        """
+        token_url = self.get_token_url()
+        data = self.get_token_request_data(
+            authorization_code, code_verifier, redirect_uri
+        )
+        # Raise ImproperlyConfigured early if httpx is missing
+        http.get_async_client()
+        try:
+            with timed(PHASE_TOKEN):
+                response = await self._apost(
+                    token_url,
+                    data=data,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise IDTokenExchangeError() from e
+
+        try:
+            token_data = response.json()
+        except ValueError as e:
+            raise InvalidTokenResponseError() from e
+
+        if "id_token" not in token_data:
+            raise MissingIDTokenError()
+
+        return token_data["id_token"]
+
+    def decode_id_token(self, id_token: str) -> dict[str, Any]:
+        """Verify the ID token against the IdP signing keys and return its claims.
+
+        The signature, issuer, audience and expiry are checked locally. The
+        signing keys are cached, so no request is sent to the IdP unless the
+        token is signed with an unknown key.
+
+        Args:
+            id_token: ID token from the IdP
+
+        Returns:
+            Dict[str, Any]: Claims of the ID token
+
+        Raises:
+            InvalidIDTokenError: If the ID token cannot be verified
+            JWKSFetchError: If the signing keys cannot be retrieved
+        """
+        with timed(PHASE_ID_TOKEN):
+            jwks_url = self.get_jwks_url()
+            if not self._should_verify_id_token(jwks_url):
+                return self._decode_unverified_id_token(id_token)
+            signing_key = jwks_cache.get_signing_key(
+                jwks_url, self._get_id_token_kid(id_token)
+            )
+            return self._decode_verified_id_token(id_token, signing_key)
+
+    async def adecode_id_token(self, id_token: str) -> dict[str, Any]:
+        """Async version of :meth:`decode_id_token`.
+
+        Args:
+            id_token: ID token from the IdP
+
+        Returns:
+            Dict[str, Any]: Claims of the ID token
+
+        Raises:
+            InvalidIDTokenError: If the ID token cannot be verified
+            JWKSFetchError: If the signing keys cannot be retrieved
+        """
+        with timed(PHASE_ID_TOKEN):
+            jwks_url = self.get_jwks_url()
+            if not self._should_verify_id_token(jwks_url):
+                return self._decode_unverified_id_token(id_token)
+            signing_key = await jwks_cache.aget_signing_key(
+                jwks_url, self._get_id_token_kid(id_token)
+            )
+            return self._decode_verified_id_token(id_token, signing_key)
+
+    def warm_up(self) -> list[str]:
+        """Fill the caches used by an exchange, e.g. after a deploy.
+
+        Loads the discovery document and the signing keys of the issuer, if
+        the provider uses them.
+
+        Returns:
+            List[str]: URLs of the endpoints called by an exchange, whose
+            connections can be opened ahead of time
+
+        Raises:
+            DiscoveryDocumentError: If the discovery document cannot be retrieved
+            JWKSFetchError: If the signing keys cannot be retrieved
+        """
+        token_url = self.get_token_url()
+        jwks_url = self.get_jwks_url()
+        if self._should_verify_id_token(jwks_url):
+            jwks_cache.warm_up(jwks_url)
+        return [token_url]
+
+    def _should_verify_id_token(self, jwks_url: str | None) -> bool:
+        verification_settings = nexus_settings.get_id_token_verification_settings()
+        return bool(jwks_url) and verification_settings["ENABLED"]
+
+    def _get_id_token_kid(self, id_token: str) -> str | None:
+        try:
+            return jwt.get_unverified_header(id_token).get("kid")
+        except jwt.PyJWTError as e:
+            raise InvalidIDTokenError() from e
+
+    def _decode_unverified_id_token(self, id_token: str) -> dict[str, Any]:
+        try:
+            return jwt.decode(id_token, options={"verify_signature": False})
+        except jwt.PyJWTError as e:
+            raise InvalidIDTokenError() from e
+
+    def _decode_verified_id_token(
+        self, id_token: str, signing_key: jwt.PyJWK
+    ) -> dict[str, Any]:
+        verification_settings = nexus_settings.get_id_token_verification_settings()
+        try:
+            return jwt.decode(
+                id_token,
+                key=signing_key.key,
+                algorithms=verification_settings["ALGORITHMS"],
+                audience=self.client_id,
+                issuer=self.get_issuer(),
+                leeway=verification_settings["LEEWAY"],
+                options={"require": ["exp", "iat", "aud", "iss"]},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidIDTokenError() from e
+
     def extract_email_from_id_token(self, id_token: str) -> str | None:
         """Extract the user's email address from the ID token.
 
@@ -128,7 +386,19 @@ class OAuth2IdentityProvider(ABC):
         Returns:
             Optional[str]: User's email address
         """
-        decoded_id_token = jwt.decode(id_token, options={"verify_signature": False})
+        decoded_id_token = self.decode_id_token(id_token)
+        return decoded_id_token.get("email", None)
+
+    async def aextract_email_from_id_token(self, id_token: str) -> str | None:
+        """Async version of :meth:`extract_email_from_id_token`.
+
+        Args:
+            id_token: ID token from the IdP
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        decoded_id_token = await self.adecode_id_token(id_token)
         return decoded_id_token.get("email", None)
 
     def exchange_code_for_email(
@@ -151,13 +421,186 @@ class OAuth2IdentityProvider(ABC):
         )
         return self.extract_email_from_id_token(id_token)
 
+    async def aexchange_code_for_email(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> str | None:
+        """Async version of :meth:`exchange_code_for_email`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        id_token = await self.afetch_id_token(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        return await self.aextract_email_from_id_token(id_token)
+
+    def get_identity_tenant(self, claims: dict[str, Any]) -> str:
+        """Get the scope in which the subject of an ID token is unique.
+
+        Args:
+            claims: Claims of the ID token
+
+        Returns:
+            str: Tenant of the identity, empty if subjects are unique across the IdP
+        """
+        return ""
+
+    def build_identity(self, claims: dict[str, Any], **kwargs) -> ProviderIdentity:
+        """Build the identity of the user from the claims of the ID token.
+
+        Args:
+            claims: Claims of the ID token
+            **kwargs: Additional fields of the identity
+
+        Returns:
+            ProviderIdentity: Identity of the user
+        """
+        kwargs.setdefault("email", claims.get("email"))
+        return ProviderIdentity(
+            subject=claims.get(self.SUBJECT_CLAIM),
+            tenant=self.get_identity_tenant(claims),
+            **kwargs,
+        )
+
+    def exchange_code_for_identity(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> ProviderIdentity:
+        """Exchange authorization code for the identity of the user.
+
+        Unlike :meth:`exchange_code_for_email`, no request is sent to resolve
+        the email, so that users already linked to their subject are
+        authenticated without it. See :meth:`resolve_identity_email`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            ProviderIdentity: Identity of the user
+        """
+        id_token = self.fetch_id_token(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        return self.build_identity(self.decode_id_token(id_token))
+
+    async def aexchange_code_for_identity(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> ProviderIdentity:
+        """Async version of :meth:`exchange_code_for_identity`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            ProviderIdentity: Identity of the user
+        """
+        id_token = await self.afetch_id_token(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        return self.build_identity(await self.adecode_id_token(id_token))
+
+    def resolve_identity_email(self, identity: ProviderIdentity) -> str | None:
+        """Get the email address of an identity, requesting it from the IdP if needed.
+
+        Args:
+            identity: Identity returned by :meth:`exchange_code_for_identity`
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        return identity.email
+
+    async def aresolve_identity_email(self, identity: ProviderIdentity) -> str | None:
+        """Async version of :meth:`resolve_identity_email`.
+
+        Args:
+            identity: Identity returned by :meth:`aexchange_code_for_identity`
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        return identity.email
+
 
 class ProviderBuilder(ABC):
-    """Base class for provider builders."""
+    """Base class for provider builders.
+
+    Built providers are cached in a bounded LRU keyed by the provider type and
+    compiled configuration, so a tenant whose configuration changes
+    gets a new instance while unchanged tenants reuse theirs.
+    """
+
+    # Options that must be set in the configuration of the provider
+    required_options: tuple[str, ...] = ("client_id", "client_secret")
 
     def __init__(self, **kwargs):
-        self._instance = None
+        self._instances: LRUCache | None = None
 
     @abstractmethod
     def __call__(self, **kwargs):
         pass
+
+    @property
+    def instances(self) -> LRUCache:
+        # Custom builders may not call super().__init__()
+        if getattr(self, "_instances", None) is None:
+            cache_settings = nexus_settings.get_provider_cache_settings()
+            self._instances = LRUCache(
+                max_entries=cache_settings["MAX_ENTRIES"], name="providers"
+            )
+        return self._instances
+
+    def get_or_create(self, provider_type: str, **kwargs) -> OAuth2IdentityProvider:
+        """Get the cached provider for this configuration, building it on a miss.
+
+        Args:
+            provider_type: Type of the provider
+            **kwargs: Provider configuration
+
+        Returns:
+            OAuth2IdentityProvider: Provider instance
+        """
+        return self.get_or_create_from_spec(ProviderSpec.compile(provider_type, kwargs))
+
+    def get_or_create_from_spec(self, spec: ProviderSpec) -> OAuth2IdentityProvider:
+        """Get the cached provider for a compiled configuration, building it on a miss.
+
+        Args:
+            spec: Compiled provider configuration
+
+        Returns:
+            OAuth2IdentityProvider: Provider instance
+        """
+        key = spec.key
+        instance = self.instances.get(key)
+        if instance is None:
+            instance = self(**spec)
+            self.instances.set(key, instance)
+        return instance
+
+    def invalidate(self, provider_type: str, **kwargs) -> None:
+        """Drop the cached provider built for this configuration.
+
+        Args:
+            provider_type: Type of the provider
+            **kwargs: Provider configuration
+        """
+        self.instances.delete(ProviderSpec.compile(provider_type, kwargs).key)
+
+    def clear(self) -> None:
+        """Drop all cached providers."""
+        self._instances = None
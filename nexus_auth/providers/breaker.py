@@ -0,0 +1,156 @@
+import math
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from nexus_auth.cache import get_shared_cache, make_key
+from nexus_auth.exceptions import IdentityProviderUnavailableError
+from nexus_auth.settings import nexus_settings
+
+
+class CircuitBreaker:
+    """Circuit breaker of an IdP host, with its state shared by all workers.
+
+    The breaker opens when the failure rate or the rate of slow calls of the
+    current window reaches its threshold. Calls then fail fast until
+    ``OPEN_DURATION`` has elapsed, after which a single call probes the
+    endpoint: the breaker closes if it succeeds and opens again otherwise.
+    """
+
+    namespace = "circuit"
+
+    def __init__(self, endpoint: str) -> None:
+        """Initialize the breaker.
+
+        Args:
+            endpoint: Endpoint guarded by the breaker, e.g. ``https://host``
+        """
+        self.endpoint = endpoint
+
+    @property
+    def settings(self) -> dict[str, Any]:
+        return nexus_settings.get_circuit_breaker_settings()
+
+    def before_call(self) -> bool:
+        """Check whether the endpoint may be called.
+
+        Returns:
+            bool: Whether the call is the probe of a half-open breaker
+
+        Raises:
+            IdentityProviderUnavailableError: If the breaker is open
+        """
+        cache = get_shared_cache()
+        opened_at = cache.get(self._key("state"))
+        if opened_at is None:
+            return False
+        remaining = opened_at + self.settings["OPEN_DURATION"] - time.time()
+        if remaining > 0:
+            raise IdentityProviderUnavailableError(wait=math.ceil(remaining))
+        # Half-open: a single worker probes the endpoint
+        if cache.add(self._key("probe"), True, self._probe_timeout):
+            return True
+        raise IdentityProviderUnavailableError(wait=self._probe_timeout)
+
+    def record(self, failed: bool, duration: float, probe: bool = False) -> None:
+        """Record the outcome of a call.
+
+        Args:
+            failed: Whether the call failed, e.g. with a connection error or a 5xx response
+            duration: Duration of the call in seconds
+            probe: Whether the call was the probe of a half-open breaker
+        """
+        cache = get_shared_cache()
+        slow = duration >= self.settings["SLOW_CALL_DURATION"]
+        if probe:
+            if failed or slow:
+                cache.set(self._key("state"), time.time(), self._state_timeout)
+            else:
+                cache.delete(self._key("state"))
+            cache.delete(self._key("probe"))
+            return
+
+        window = str(int(time.time() // self.settings["WINDOW"]))
+        calls = self._incr(self._key("calls", window))
+        if not (failed or slow):
+            return
+
+        failures = self._incr(self._key("failures", window)) if failed else None
+        slow_calls = self._incr(self._key("slow", window)) if slow else None
+        if calls < self.settings["MIN_CALLS"]:
+            return
+        if failures is None:
+            failures = cache.get(self._key("failures", window), 0)
+        if slow_calls is None:
+            slow_calls = cache.get(self._key("slow", window), 0)
+        if (
+            failures / calls >= self.settings["FAILURE_RATE"]
+            or slow_calls / calls >= self.settings["SLOW_CALL_RATE"]
+        ):
+            # Do not extend the open period if another worker opened it already
+            cache.add(self._key("state"), time.time(), self._state_timeout)
+
+    def reset(self) -> None:
+        """Close the breaker."""
+        get_shared_cache().delete_many([self._key("state"), self._key("probe")])
+
+    @property
+    def is_open(self) -> bool:
+        return get_shared_cache().get(self._key("state")) is not None
+
+    @property
+    def _probe_timeout(self) -> int:
+        http_settings = nexus_settings.get_http_settings()
+        return math.ceil(
+            http_settings["CONNECT_TIMEOUT"] + http_settings["READ_TIMEOUT"]
+        )
+
+    @property
+    def _state_timeout(self) -> int:
+        # Keep the state until a probe can run, even if no call comes for a while
+        return math.ceil(self.settings["OPEN_DURATION"] * 10)
+
+    def _key(self, *parts: str) -> str:
+        return make_key(f"{self.namespace}_{parts[0]}", self.endpoint, *parts[1:])
+
+    def _incr(self, key: str) -> int:
+        cache = get_shared_cache()
+        timeout = math.ceil(self.settings["WINDOW"] * 2)
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The counter expired in between
+            cache.add(key, 1, timeout)
+            return 1
+
+
+def get_endpoint(url: str) -> str:
+    """Get the endpoint of a URL, i.e. its origin.
+
+    The path is left out as it often holds the tenant, e.g. in the URLs of
+    Microsoft Entra, so that all the tenants of an IdP share a breaker and
+    the metrics have one series per IdP host rather than per tenant.
+
+    Args:
+        url: URL of the request
+
+    Returns:
+        str: Endpoint, e.g. ``https://host``
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_breaker(url: str) -> CircuitBreaker | None:
+    """Get the circuit breaker of the IdP host of a URL.
+
+    Args:
+        url: URL of the request
+
+    Returns:
+        Optional[CircuitBreaker]: Breaker, or ``None`` if NEXUS_AUTH.CIRCUIT_BREAKER is disabled
+    """
+    if not nexus_settings.get_circuit_breaker_settings()["ENABLED"]:
+        return None
+    return CircuitBreaker(get_endpoint(url))
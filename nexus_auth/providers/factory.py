@@ -1,8 +1,15 @@
+import threading
+from typing import TYPE_CHECKING
+
+from django.core.signals import setting_changed
 from django.utils.module_loading import import_string
 
-from nexus_auth.providers.base import OAuth2IdentityProvider
 from nexus_auth.settings import nexus_settings
 
+if TYPE_CHECKING:
+    from nexus_auth.providers.base import OAuth2IdentityProvider
+    from nexus_auth.specs import ProviderSpec
+
 
 class ObjectFactory:
     """Factory for creating objects."""
@@ -37,9 +44,19 @@ class ObjectFactory:
 
 
 class IdentityProviderFactory(ObjectFactory):
-    """Factory for identity providers."""
+    """Factory for identity providers.
+
+    Builders listed in the PROVIDER_BUILDERS setting are imported on the first
+    request for their provider type, so that processes which never authenticate
+    anyone do not import the providers and their HTTP/JWT dependencies.
+    """
 
-    def get(self, provider_type: str, **kwargs) -> OAuth2IdentityProvider | None:
+    def __init__(self):
+        super().__init__()
+        self._lazy_keys = set()
+        self._lock = threading.Lock()
+
+    def get(self, provider_type: str, **kwargs) -> "OAuth2IdentityProvider | None":
         """Get an identity provider instance.
 
         Args:
@@ -49,12 +66,69 @@ class IdentityProviderFactory(ObjectFactory):
         Returns:
             Optional[OAuth2IdentityProvider]: The identity provider instance.
         """
+        builder = self.get_builder(provider_type)
+        # Builders extending ProviderBuilder cache the providers they build
+        if hasattr(builder, "get_or_create"):
+            return builder.get_or_create(provider_type, **kwargs)
         return self.create(provider_type, **kwargs)
 
+    def get_from_spec(self, spec: "ProviderSpec") -> "OAuth2IdentityProvider | None":
+        """Get an identity provider instance for a compiled configuration.
+
+        Args:
+            spec: Compiled provider configuration.
+
+        Returns:
+            Optional[OAuth2IdentityProvider]: The identity provider instance.
+        """
+        builder = self.get_builder(spec.provider_type)
+        if hasattr(builder, "get_or_create_from_spec"):
+            return builder.get_or_create_from_spec(spec)
+        return self.get(spec.provider_type, **spec)
+
+    def get_builder(self, provider_type: str):
+        """Get the builder of a provider type, importing it from PROVIDER_BUILDERS if needed.
+
+        Args:
+            provider_type: The type of provider.
+
+        Returns:
+            The builder, or ``None`` if no builder is registered for the provider type.
+        """
+        builder = self._builders.get(provider_type)
+        if builder is None:
+            builder_path = nexus_settings.get_provider_builders().get(provider_type)
+            if builder_path:
+                with self._lock:
+                    builder = self._builders.get(provider_type)
+                    if builder is None:
+                        builder = import_string(builder_path)()
+                        self.register_builder(provider_type, builder)
+                        self._lazy_keys.add(provider_type)
+        return builder
+
+    def warm_up(self) -> None:
+        """Import all the builders of the PROVIDER_BUILDERS setting."""
+        for provider_type in nexus_settings.get_provider_builders():
+            self.get_builder(provider_type)
+
+    def clear(self) -> None:
+        """Drop the builders loaded from the settings and the providers cached by the others."""
+        with self._lock:
+            for provider_type in self._lazy_keys:
+                self._builders.pop(provider_type, None)
+            self._lazy_keys.clear()
+            for builder in self._builders.values():
+                if hasattr(builder, "clear"):
+                    builder.clear()
+
 
-# Load the provider builders specified in the PROVIDER_BUILDERS setting
 providers = IdentityProviderFactory()
-builder_config = nexus_settings.get_provider_builders()
-for provider_type, builder_path in builder_config.items():
-    builder = import_string(builder_path)
-    providers.register_builder(provider_type, builder())
+
+
+def _clear_providers(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        providers.clear()
+
+
+setting_changed.connect(_clear_providers)
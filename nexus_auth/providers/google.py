@@ -10,6 +10,12 @@ class GoogleOAuth2Provider(OAuth2IdentityProvider):
     def get_token_url(self):
         return "https://www.googleapis.com/oauth2/v4/token"
 
+    def get_jwks_url(self):
+        return "https://www.googleapis.com/oauth2/v3/certs"
+
+    def get_issuer(self):
+        return ["https://accounts.google.com", "accounts.google.com"]
+
 
 class GoogleOAuth2ProviderBuilder(ProviderBuilder):
     def __call__(self, client_id, client_secret, **_ignored):
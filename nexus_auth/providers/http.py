@@ -0,0 +1,478 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from nexus_auth.cache import fingerprint
+from nexus_auth.metrics import (
+    SCOPE_PROCESS,
+    SCOPE_SHARED,
+    coalesced_requests,
+    idp_request_duration,
+)
+from nexus_auth.providers.breaker import CircuitBreaker, get_breaker, get_endpoint
+from nexus_auth.providers.policy import ExchangePolicy, get_current_policy
+from nexus_auth.providers.singleflight import SharedFlight, SharedFlightError, flights
+from nexus_auth.settings import nexus_settings
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+# Methods whose requests are coalesced across workers with SINGLE_FLIGHT.SHARED.
+# The responses of the others, e.g. of a token request, hold the tokens of a
+# user and must not be stored in the shared cache, and their requests cannot
+# safely be sent again if the worker sending them fails.
+SHARED_FLIGHT_METHODS = frozenset({"GET", "HEAD"})
+
+# Headers describing the raw body, which no longer apply to a stored response
+_ENCODING_HEADERS = frozenset(
+    {"content-encoding", "content-length", "transfer-encoding"}
+)
+
+
+def _build_session() -> requests.Session:
+    """Build a session with a keep-alive connection pool for every IdP host.
+
+    Returns:
+        requests.Session: Session configured from the NEXUS_AUTH.HTTP setting
+    """
+    http_settings = nexus_settings.get_http_settings()
+    # Only retry failures to establish a connection: nothing has been sent to
+    # the IdP at that point, so this is safe for the non-idempotent token POST.
+    retries = Retry(
+        total=http_settings["MAX_RETRIES"],
+        connect=http_settings["MAX_RETRIES"],
+        read=0,
+        redirect=0,
+        status=0,
+        other=0,
+        backoff_factor=http_settings["BACKOFF_FACTOR"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=http_settings["POOL_CONNECTIONS"],
+        pool_maxsize=http_settings["POOL_MAXSIZE"],
+        pool_block=http_settings["POOL_BLOCK"],
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Get the session shared by all identity providers of this process.
+
+    The underlying urllib3 pool manager keeps one connection pool per host, so
+    connections to each IdP are reused across requests and provider instances.
+
+    Returns:
+        requests.Session: Shared session
+    """
+    global _session
+    session = _session
+    if session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+            session = _session
+    return session
+
+
+def get_timeout() -> tuple[float, float]:
+    """Get the (connect, read) timeout to use for IdP requests.
+
+    Returns:
+        Tuple[float, float]: Connect and read timeouts in seconds
+    """
+    http_settings = nexus_settings.get_http_settings()
+    return (http_settings["CONNECT_TIMEOUT"], http_settings["READ_TIMEOUT"])
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """Get the async client shared by all identity providers on the running event loop.
+
+    Returns:
+        httpx.AsyncClient: Shared async client
+
+    Raises:
+        ImproperlyConfigured: If httpx is not installed
+    """
+    if httpx is None:
+        raise ImproperlyConfigured(
+            "httpx is required for the async exchange. Install it with "
+            "`pip install django-nexus-auth[async]`."
+        )
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_settings = nexus_settings.get_http_settings()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=(
+                    http_settings["POOL_CONNECTIONS"] * http_settings["POOL_MAXSIZE"]
+                    if http_settings["POOL_BLOCK"]
+                    else None
+                ),
+                max_keepalive_connections=http_settings["POOL_MAXSIZE"],
+            ),
+            timeout=httpx.Timeout(
+                http_settings["READ_TIMEOUT"],
+                connect=http_settings["CONNECT_TIMEOUT"],
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=http_settings["MAX_RETRIES"]),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request to an IdP through the shared session.
+
+    Within an exchange, the request is bounded by the deadline of the exchange
+    and retried according to its policy, see :func:`policy.exchange_policy`.
+
+    With SINGLE_FLIGHT.ENABLED, identical requests sent concurrently share the
+    response of the first one. With SINGLE_FLIGHT.SHARED, ``GET`` and ``HEAD``
+    requests are also shared with the other workers.
+
+    Args:
+        method: HTTP method
+        url: URL to send the request to
+        **kwargs: Keyword arguments passed to ``requests.Session.request``
+
+    Returns:
+        requests.Response: Response from the IdP
+
+    Raises:
+        requests.exceptions.Timeout: If the deadline of the exchange is exceeded
+        IdentityProviderUnavailableError: If the circuit breaker of the endpoint is open
+    """
+    kwargs.setdefault("timeout", get_timeout())
+    flight_settings = nexus_settings.get_single_flight_settings()
+    if not flight_settings["ENABLED"]:
+        return _request(method, url, **kwargs)
+
+    def run() -> requests.Response:
+        response = _request(method, url, **kwargs)
+        # Read the body before the response is shared with other threads
+        response.content  # noqa: B018
+        return response
+
+    key = get_flight_key(method, url, kwargs)
+    timeout = _get_flight_timeout(flight_settings)
+
+    def run_shared() -> requests.Response:
+        response, shared = _get_shared_flight(flight_settings).do(
+            key, run, _dump_response, _load_response, timeout
+        )
+        if shared:
+            coalesced_requests.inc(endpoint=get_endpoint(url), scope=SCOPE_SHARED)
+        return response
+
+    try:
+        response, shared = flights.do(
+            key, run_shared if _is_shared(method, flight_settings) else run, timeout
+        )
+    except TimeoutError as e:
+        raise requests.exceptions.Timeout("Coalesced request still in flight") from e
+    except SharedFlightError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    if shared:
+        coalesced_requests.inc(endpoint=get_endpoint(url), scope=SCOPE_PROCESS)
+    return response
+
+
+def _is_shared(method: str, flight_settings) -> bool:
+    return flight_settings["SHARED"] and method.upper() in SHARED_FLIGHT_METHODS
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    exchange_policy = get_current_policy()
+    attempt = 0
+    while True:
+        response = _send(method, url, exchange_policy, **kwargs)
+        delay = (
+            exchange_policy.get_retry_delay(
+                method, response.status_code, response.headers, attempt
+            )
+            if exchange_policy
+            else None
+        )
+        if delay is None:
+            return response
+        response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def _send(
+    method: str, url: str, exchange_policy: ExchangePolicy | None, **kwargs
+) -> requests.Response:
+    if exchange_policy is not None:
+        remaining = exchange_policy.remaining()
+        if remaining is not None and remaining <= 0:
+            raise requests.exceptions.Timeout("Exchange deadline exceeded")
+        kwargs["timeout"] = exchange_policy.cap_timeout(kwargs["timeout"])
+    send = getattr(get_session(), method.lower())
+    breaker = get_breaker(url)
+    probe = breaker.before_call() if breaker is not None else False
+    start = time.monotonic()
+    try:
+        response = send(url, **kwargs)
+    except requests.exceptions.RequestException:
+        _record_call(method, url, None, time.monotonic() - start, breaker, probe)
+        raise
+    _record_call(
+        method, url, response.status_code, time.monotonic() - start, breaker, probe
+    )
+    return response
+
+
+async def arequest(method: str, url: str, **kwargs) -> "httpx.Response":
+    """Async version of :func:`request`, sent through the shared async client.
+
+    Args:
+        method: HTTP method
+        url: URL to send the request to
+        **kwargs: Keyword arguments passed to ``httpx.AsyncClient.request``
+
+    Returns:
+        httpx.Response: Response from the IdP
+
+    Raises:
+        httpx.TimeoutException: If the deadline of the exchange is exceeded
+        IdentityProviderUnavailableError: If the circuit breaker of the endpoint is open
+    """
+    flight_settings = nexus_settings.get_single_flight_settings()
+    if not flight_settings["ENABLED"]:
+        return await _arequest(method, url, **kwargs)
+
+    key = get_flight_key(method, url, kwargs)
+    timeout = _get_flight_timeout(flight_settings)
+
+    async def run() -> "httpx.Response":
+        return await _arequest(method, url, **kwargs)
+
+    async def run_shared() -> "httpx.Response":
+        response, shared = await _get_shared_flight(flight_settings).ado(
+            key, run, _adump_response, _aload_response, timeout
+        )
+        if shared:
+            coalesced_requests.inc(endpoint=get_endpoint(url), scope=SCOPE_SHARED)
+        return response
+
+    try:
+        response, shared = await flights.ado(
+            key, run_shared if _is_shared(method, flight_settings) else run, timeout
+        )
+    except TimeoutError as e:
+        raise httpx.TimeoutException("Coalesced request still in flight") from e
+    except SharedFlightError as e:
+        raise httpx.ConnectError(str(e)) from e
+    if shared:
+        coalesced_requests.inc(endpoint=get_endpoint(url), scope=SCOPE_PROCESS)
+    return response
+
+
+async def _arequest(method: str, url: str, **kwargs) -> "httpx.Response":
+    exchange_policy = get_current_policy()
+    attempt = 0
+    while True:
+        response = await _asend(method, url, exchange_policy, **kwargs)
+        delay = (
+            exchange_policy.get_retry_delay(
+                method, response.status_code, response.headers, attempt
+            )
+            if exchange_policy
+            else None
+        )
+        if delay is None:
+            return response
+        await response.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def _asend(
+    method: str, url: str, exchange_policy: ExchangePolicy | None, **kwargs
+) -> "httpx.Response":
+    client = get_async_client()
+    if exchange_policy is not None and exchange_policy.remaining() is not None:
+        remaining = exchange_policy.remaining()
+        if remaining <= 0:
+            raise httpx.TimeoutException("Exchange deadline exceeded")
+        http_settings = nexus_settings.get_http_settings()
+        kwargs.setdefault(
+            "timeout",
+            httpx.Timeout(
+                min(http_settings["READ_TIMEOUT"], remaining),
+                connect=min(http_settings["CONNECT_TIMEOUT"], remaining),
+            ),
+        )
+    send = getattr(client, method.lower())
+    breaker = get_breaker(url)
+    probe = breaker.before_call() if breaker is not None else False
+    start = time.monotonic()
+    try:
+        response = await send(url, **kwargs)
+    except httpx.HTTPError:
+        _record_call(method, url, None, time.monotonic() - start, breaker, probe)
+        raise
+    _record_call(
+        method, url, response.status_code, time.monotonic() - start, breaker, probe
+    )
+    return response
+
+
+def get_flight_key(method: str, url: str, kwargs: dict) -> str:
+    """Get the key under which identical requests are coalesced.
+
+    Args:
+        method: HTTP method
+        url: URL of the request
+        kwargs: Keyword arguments of the request
+
+    Returns:
+        str: Fingerprint of the method, URL, query, body and headers
+    """
+    return fingerprint(
+        method.upper(),
+        url,
+        kwargs.get("params"),
+        kwargs.get("data"),
+        kwargs.get("json"),
+        kwargs.get("headers"),
+    )
+
+
+def _get_flight_timeout(flight_settings) -> float:
+    # Waiting for another request must not outlast the exchange either
+    exchange_policy = get_current_policy()
+    remaining = exchange_policy.remaining() if exchange_policy else None
+    if remaining is None:
+        return flight_settings["WAIT"]
+    return max(min(flight_settings["WAIT"], remaining), 0)
+
+
+def _get_shared_flight(flight_settings) -> SharedFlight:
+    return SharedFlight(
+        wait=flight_settings["WAIT"], result_ttl=flight_settings["RESULT_TTL"]
+    )
+
+
+def _dump_headers(headers) -> list[tuple[str, str]]:
+    return [
+        (name, value)
+        for name, value in headers.items()
+        if name.lower() not in _ENCODING_HEADERS
+    ]
+
+
+def _dump_response(response: requests.Response) -> dict:
+    return {
+        "status_code": response.status_code,
+        "headers": _dump_headers(response.headers),
+        "content": response.content,
+        "url": response.url,
+        "encoding": response.encoding,
+    }
+
+
+def _load_response(data: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    response.headers = CaseInsensitiveDict(data["headers"])
+    response._content = data["content"]
+    response.url = data["url"]
+    response.encoding = data["encoding"]
+    return response
+
+
+def _adump_response(response: "httpx.Response") -> dict:
+    return {
+        "status_code": response.status_code,
+        "headers": _dump_headers(response.headers),
+        "content": response.content,
+        "method": response.request.method,
+        "url": str(response.request.url),
+    }
+
+
+def _aload_response(data: dict) -> "httpx.Response":
+    return httpx.Response(
+        data["status_code"],
+        headers=data["headers"],
+        content=data["content"],
+        request=httpx.Request(data["method"], data["url"]),
+    )
+
+
+def _record_call(
+    method: str,
+    url: str,
+    status_code: int | None,
+    duration: float,
+    breaker: CircuitBreaker | None,
+    probe: bool,
+) -> None:
+    # A status code of None stands for a connection error or a timeout
+    idp_request_duration.observe(
+        duration,
+        endpoint=get_endpoint(url),
+        method=method.upper(),
+        status=status_code or "error",
+    )
+    if breaker is not None:
+        breaker.record(status_code is None or status_code >= 500, duration, probe)
+
+
+def preconnect(url: str) -> None:
+    """Open a pooled connection to the host of a URL ahead of the first request.
+
+    Sends a HEAD request whose response is ignored, so that the DNS lookup and
+    the TCP and TLS handshakes are done and the connection is kept alive in
+    the pool of the shared session. The request bypasses the circuit breaker
+    and the metrics of the IdP requests.
+
+    Args:
+        url: URL of an endpoint of the host, e.g. the token endpoint
+
+    Raises:
+        requests.exceptions.RequestException: If the host cannot be reached
+    """
+    get_session().head(url, timeout=get_timeout(), allow_redirects=False).close()
+
+
+def close_session() -> None:
+    """Close the shared session. A new one is built on the next request."""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+    # Async clients are bound to their event loop and cannot be closed from
+    # here. Dropping them lets each loop build a client with the new settings.
+    _async_clients.clear()
+
+
+def _reload_session(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        close_session()
+
+
+setting_changed.connect(_reload_session)
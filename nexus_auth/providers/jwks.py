@@ -0,0 +1,355 @@
+import asyncio
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import jwt
+import requests
+from django.core.signals import setting_changed
+
+from nexus_auth.cache import LRUCache, get_shared_cache, make_key
+from nexus_auth.exceptions import InvalidIDTokenError, JWKSFetchError
+from nexus_auth.providers import http
+from nexus_auth.providers.http import httpx
+from nexus_auth.providers.singleflight import flights
+from nexus_auth.settings import nexus_settings
+
+# Interval between two looks at the shared cache while another worker refreshes
+_REFRESH_POLL_INTERVAL = 0.05
+
+# States of the shared refresh lock
+_REFRESH_PENDING = "pending"
+_REFRESH_DONE = "done"
+
+
+def _parse_key_set(jwks: dict[str, Any]) -> dict[str, jwt.PyJWK]:
+    """Parse the signing keys of a JSON Web Key Set.
+
+    Keys that cannot be used for signature verification are skipped.
+
+    Args:
+        jwks: JSON Web Key Set
+
+    Returns:
+        Dict[str, jwt.PyJWK]: Signing keys by key ID
+    """
+    keys = {}
+    for key_data in jwks.get("keys", []):
+        if key_data.get("use", "sig") != "sig" or "kid" not in key_data:
+            continue
+        try:
+            keys[key_data["kid"]] = jwt.PyJWK(key_data)
+        except jwt.PyJWTError:
+            continue
+    return keys
+
+
+class JWKSCache:
+    """Two-tier cache of the signing keys published by each issuer.
+
+    Parsed keys are kept in process and the raw key sets in the shared Django
+    cache. A key set is only refreshed when a token is signed with an unknown
+    ``kid``, at most once per ``MIN_REFRESH_INTERVAL`` and by a single worker,
+    so key rotation at the IdP does not cause a burst of JWKS requests.
+    """
+
+    namespace = "jwks"
+
+    def __init__(self) -> None:
+        self._local: LRUCache | None = None
+        self._last_refresh: dict[str, float] = {}
+        # Lock of each key set being refreshed, and the number of threads using it
+        self._refresh_locks: dict[str, list] = {}
+        self._refresh_locks_lock = threading.Lock()
+
+    @property
+    def settings(self) -> dict[str, Any]:
+        return nexus_settings.get_jwks_cache_settings()
+
+    @property
+    def local(self) -> LRUCache:
+        if self._local is None:
+            self._local = LRUCache(
+                max_entries=self.settings["MAX_ENTRIES"],
+                ttl=self.settings["TTL"],
+                name="jwks",
+            )
+        return self._local
+
+    def get_signing_key(self, jwks_url: str, kid: str | None) -> jwt.PyJWK:
+        """Get the key the IdP used to sign a token.
+
+        Args:
+            jwks_url: URL of the issuer's JSON Web Key Set
+            kid: Key ID from the token header
+
+        Returns:
+            jwt.PyJWK: Signing key
+
+        Raises:
+            InvalidIDTokenError: If no key matches the key ID
+            JWKSFetchError: If the key set cannot be retrieved
+        """
+        keys = self.local.get(jwks_url)
+        if keys is not None and kid in keys:
+            return keys[kid]
+
+        shared_cache = get_shared_cache()
+        key = make_key(self.namespace, jwks_url)
+        jwks = shared_cache.get(key)
+        if jwks is not None:
+            keys = self._store_local(jwks_url, jwks)
+            if kid in keys:
+                return keys[kid]
+
+        with self._refresh_lock(jwks_url):
+            # Another thread may have refreshed the keys while we waited
+            keys = self.local.get(jwks_url) or {}
+            if kid not in keys and self._claim_refresh(jwks_url):
+                lock_key = self._lock_key(jwks_url)
+                if shared_cache.add(lock_key, _REFRESH_PENDING, self._lock_timeout):
+                    try:
+                        jwks = self.fetch(jwks_url)
+                    except JWKSFetchError:
+                        # Let the next login retry instead of failing until the
+                        # end of the refresh interval
+                        self._release_refresh(jwks_url)
+                        shared_cache.delete(lock_key)
+                        raise
+                    shared_cache.set(key, jwks, self.settings["TTL"])
+                    keys = self._store_local(jwks_url, jwks)
+                    # Keep the lock until the end of the refresh interval
+                    shared_cache.set(lock_key, _REFRESH_DONE, self._lock_timeout)
+                else:
+                    keys = self._wait_for_refresh(jwks_url) or keys
+
+        if kid not in keys:
+            raise InvalidIDTokenError()
+        return keys[kid]
+
+    async def aget_signing_key(self, jwks_url: str, kid: str | None) -> jwt.PyJWK:
+        """Async version of :meth:`get_signing_key`.
+
+        Args:
+            jwks_url: URL of the issuer's JSON Web Key Set
+            kid: Key ID from the token header
+
+        Returns:
+            jwt.PyJWK: Signing key
+
+        Raises:
+            InvalidIDTokenError: If no key matches the key ID
+            JWKSFetchError: If the key set cannot be retrieved
+        """
+        keys = self.local.get(jwks_url)
+        if keys is not None and kid in keys:
+            return keys[kid]
+
+        shared_cache = get_shared_cache()
+        key = make_key(self.namespace, jwks_url)
+        jwks = await shared_cache.aget(key)
+        if jwks is not None:
+            keys = self._store_local(jwks_url, jwks)
+            if kid in keys:
+                return keys[kid]
+
+        keys = keys or {}
+        if self._claim_refresh(jwks_url):
+            lock_key = self._lock_key(jwks_url)
+            if await shared_cache.aadd(lock_key, _REFRESH_PENDING, self._lock_timeout):
+                try:
+                    jwks = await self.afetch(jwks_url)
+                except JWKSFetchError:
+                    self._release_refresh(jwks_url)
+                    await shared_cache.adelete(lock_key)
+                    raise
+                await shared_cache.aset(key, jwks, self.settings["TTL"])
+                keys = self._store_local(jwks_url, jwks)
+                # Keep the lock until the end of the refresh interval
+                await shared_cache.aset(lock_key, _REFRESH_DONE, self._lock_timeout)
+            else:
+                keys = await self._await_refresh(jwks_url) or keys
+
+        if kid not in keys:
+            raise InvalidIDTokenError()
+        return keys[kid]
+
+    def fetch(self, jwks_url: str) -> dict[str, Any]:
+        """Fetch the key set from the IdP.
+
+        Args:
+            jwks_url: URL of the JSON Web Key Set
+
+        Returns:
+            Dict[str, Any]: JSON Web Key Set
+
+        Raises:
+            JWKSFetchError: If the request fails or the response is invalid
+        """
+        try:
+            response = http.request("get", jwks_url)
+            response.raise_for_status()
+            jwks = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise JWKSFetchError() from e
+        if not isinstance(jwks, dict):
+            raise JWKSFetchError()
+        return jwks
+
+    async def afetch(self, jwks_url: str) -> dict[str, Any]:
+        """Async version of :meth:`fetch`.
+
+        Args:
+            jwks_url: URL of the JSON Web Key Set
+
+        Returns:
+            Dict[str, Any]: JSON Web Key Set
+
+        Raises:
+            JWKSFetchError: If the request fails or the response is invalid
+        """
+        # Raise ImproperlyConfigured early if httpx is missing
+        http.get_async_client()
+        try:
+            response = await http.arequest("get", jwks_url)
+            response.raise_for_status()
+            jwks = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise JWKSFetchError() from e
+        if not isinstance(jwks, dict):
+            raise JWKSFetchError()
+        return jwks
+
+    def warm_up(self, jwks_url: str) -> None:
+        """Load the key set of an issuer into the caches, fetching it if no worker did.
+
+        Concurrent calls for the same key set share a single fetch. Unlike an
+        unknown ``kid``, this does not count as a refresh, so a key rotated
+        right after the warm-up is still picked up.
+
+        Args:
+            jwks_url: URL of the issuer's JSON Web Key Set
+
+        Raises:
+            JWKSFetchError: If the key set cannot be retrieved
+        """
+        if self.local.get(jwks_url) is not None:
+            return
+        key = make_key(self.namespace, jwks_url)
+        flights.do(key, lambda: self._load(jwks_url, key))
+
+    def _load(self, jwks_url: str, key: str) -> None:
+        shared_cache = get_shared_cache()
+        jwks = shared_cache.get(key)
+        if jwks is None:
+            jwks = self.fetch(jwks_url)
+            shared_cache.set(key, jwks, self.settings["TTL"])
+        self._store_local(jwks_url, jwks)
+
+    def clear(self) -> None:
+        """Drop the in-process keys. The shared cache expires on its own."""
+        self._local = None
+        self._last_refresh.clear()
+
+    @property
+    def _lock_timeout(self) -> int:
+        return max(int(self.settings["MIN_REFRESH_INTERVAL"]), 1)
+
+    def _lock_key(self, jwks_url: str) -> str:
+        return make_key(f"{self.namespace}_refresh", jwks_url)
+
+    @contextmanager
+    def _refresh_lock(self, jwks_url: str) -> Iterator[None]:
+        """Hold the in-process lock of a key set, so that only its refresh is serialized.
+
+        The lock is dropped once no thread uses it.
+        """
+        with self._refresh_locks_lock:
+            entry = self._refresh_locks.get(jwks_url)
+            if entry is None:
+                entry = self._refresh_locks[jwks_url] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._refresh_locks_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._refresh_locks[jwks_url]
+
+    def _claim_refresh(self, jwks_url: str) -> bool:
+        """Rate limit the refreshes of a key set within this process."""
+        now = time.monotonic()
+        last_refresh = self._last_refresh.get(jwks_url)
+        if (
+            last_refresh is not None
+            and now - last_refresh < self.settings["MIN_REFRESH_INTERVAL"]
+        ):
+            return False
+        self._last_refresh[jwks_url] = now
+        return True
+
+    def _release_refresh(self, jwks_url: str) -> None:
+        """Undo the claim of a refresh that failed."""
+        self._last_refresh.pop(jwks_url, None)
+
+    def _store_local(self, jwks_url: str, jwks: dict[str, Any]) -> dict:
+        keys = _parse_key_set(jwks)
+        self.local.set(jwks_url, keys)
+        return keys
+
+    def _wait_for_refresh(self, jwks_url: str) -> dict:
+        """Wait for the worker holding the refresh lock to share the new key set.
+
+        Returns immediately if the key set was already refreshed during the
+        current interval, since the key ID is then unknown to the IdP as well.
+
+        Raises:
+            JWKSFetchError: If the other worker failed to fetch the key set
+        """
+        shared_cache = get_shared_cache()
+        key = make_key(self.namespace, jwks_url)
+        lock_key = self._lock_key(jwks_url)
+        deadline = time.monotonic() + self.settings["REFRESH_WAIT"]
+        while (state := shared_cache.get(lock_key)) == _REFRESH_PENDING:
+            if time.monotonic() >= deadline:
+                return {}
+            time.sleep(_REFRESH_POLL_INTERVAL)
+        jwks = shared_cache.get(key)
+        return self._refreshed(jwks_url, jwks, state)
+
+    async def _await_refresh(self, jwks_url: str) -> dict:
+        """Async version of :meth:`_wait_for_refresh`."""
+        shared_cache = get_shared_cache()
+        key = make_key(self.namespace, jwks_url)
+        lock_key = self._lock_key(jwks_url)
+        deadline = time.monotonic() + self.settings["REFRESH_WAIT"]
+        while (state := await shared_cache.aget(lock_key)) == _REFRESH_PENDING:
+            if time.monotonic() >= deadline:
+                return {}
+            await asyncio.sleep(_REFRESH_POLL_INTERVAL)
+        jwks = await shared_cache.aget(key)
+        return self._refreshed(jwks_url, jwks, state)
+
+    def _refreshed(self, jwks_url: str, jwks: dict | None, state: str | None) -> dict:
+        if jwks is not None:
+            return self._store_local(jwks_url, jwks)
+        if state is None:
+            # The refresh lock was released without a key set: the fetch failed
+            self._release_refresh(jwks_url)
+            raise JWKSFetchError()
+        return {}
+
+
+jwks_cache = JWKSCache()
+
+
+def _reset_jwks_cache(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        jwks_cache.clear()
+
+
+setting_changed.connect(_reset_jwks_cache)
@@ -1,12 +1,79 @@
+import uuid
+from typing import Any
+
 import requests
+from django.core.exceptions import ImproperlyConfigured
 
 from nexus_auth.exceptions import (
     AccessTokenExchangeError,
+    InvalidIDTokenError,
     InvalidTokenResponseError,
     MicrosoftGraphAPIError,
     MissingAccessTokenError,
 )
-from nexus_auth.providers.base import OAuth2IdentityProvider, ProviderBuilder
+from nexus_auth.metrics import email_resolutions
+from nexus_auth.providers import http
+from nexus_auth.providers.base import (
+    OAuth2IdentityProvider,
+    ProviderBuilder,
+    ProviderIdentity,
+)
+from nexus_auth.providers.http import httpx
+from nexus_auth.timing import PHASE_GRAPH, PHASE_TOKEN, timed
+
+AUTHORITY_URL = "https://login.microsoftonline.com"
+GRAPH_ME_URL = "https://graph.microsoft.com/v1.0/me"
+
+# Tenant IDs that accept users from any tenant. ID tokens are then issued by the
+# home tenant of the user instead of the tenant in the authority URL.
+MULTI_TENANT_IDS = ("common", "organizations", "consumers")
+
+# Email resolution strategies
+EMAIL_RESOLUTION_GRAPH = "graph"
+EMAIL_RESOLUTION_ID_TOKEN = "id_token"
+EMAIL_RESOLUTION_ID_TOKEN_THEN_GRAPH = "id_token_then_graph"
+EMAIL_RESOLUTIONS = (
+    EMAIL_RESOLUTION_GRAPH,
+    EMAIL_RESOLUTION_ID_TOKEN,
+    EMAIL_RESOLUTION_ID_TOKEN_THEN_GRAPH,
+)
+
+
+class EmailResolutionStats:
+    """Counters of where the email was resolved from, per strategy.
+
+    The sources are ``id_token``, ``graph`` and ``miss`` (no email in the ID token
+    and no fallback). The counters are kept in the
+    ``nexus_auth_email_resolutions_total`` metric.
+    """
+
+    def increment(self, strategy: str, source: str) -> None:
+        email_resolutions.inc(strategy=strategy, source=source)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        """Get the current counters.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Hits by source, by strategy
+        """
+        stats: dict[str, dict[str, int]] = {}
+        for (strategy, source), count in email_resolutions.collect().items():
+            stats.setdefault(strategy, {})[source] = int(count)
+        return stats
+
+    def reset(self) -> None:
+        email_resolutions.reset()
+
+
+email_resolution_stats = EmailResolutionStats()
+
+
+def _is_tenant_guid(tenant_id: str | None) -> bool:
+    try:
+        uuid.UUID(tenant_id or "")
+    except ValueError:
+        return False
+    return True
 
 
 class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
@@ -14,15 +81,90 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
 
     Note: Microsoft Entra requires sending a request to the Microsoft Graph API to get the user's email address
     as documented here: https://learn.microsoft.com/en-us/entra/identity-platform/id-tokens#claims-in-an-id-token
+
+    The ``email_resolution`` strategy allows reading the email from the optional claims of the ID token instead,
+    which avoids the Graph API request when the claims are present.
     """
 
+    # ID token claims checked for the email address, in order
+    EMAIL_CLAIMS = ("email", "preferred_username", "upn")
+
+    # Object ID of the user, which unlike sub is the same for every application
+    SUBJECT_CLAIM = "oid"
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        tenant_id: str | None = None,
+        email_resolution: str = EMAIL_RESOLUTION_GRAPH,
+        authority: str = AUTHORITY_URL,
+        graph_url: str = GRAPH_ME_URL,
+    ) -> None:
+        """Initialize the Microsoft Entra provider.
+
+        Args:
+            client_id: OAuth2 client ID
+            client_secret: OAuth2 client secret
+            tenant_id: Microsoft Entra tenant ID
+            email_resolution: Where to read the email from, one of ``EMAIL_RESOLUTIONS``
+            authority: Base URL of the Microsoft identity platform, e.g. of a national cloud or a stub IdP
+            graph_url: URL of the Microsoft Graph endpoint returning the signed-in user
+
+        Raises:
+            ImproperlyConfigured: If the email resolution strategy is unknown
+        """
+        super().__init__(client_id, client_secret, tenant_id)
+        if email_resolution not in EMAIL_RESOLUTIONS:
+            raise ImproperlyConfigured(
+                f"Unknown email_resolution '{email_resolution}'. "
+                f"Expected one of: {', '.join(EMAIL_RESOLUTIONS)}."
+            )
+        self.email_resolution = email_resolution
+        self.authority = authority.rstrip("/")
+        self.graph_url = graph_url
+
     def get_authorization_url(self):
-        return (
-            f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/authorize"
-        )
+        return f"{self.authority}/{self.tenant_id}/oauth2/v2.0/authorize"
+
+    def warm_up(self) -> list[str]:
+        urls = super().warm_up()
+        if self.email_resolution != EMAIL_RESOLUTION_ID_TOKEN:
+            urls.append(self.graph_url)
+        return urls
 
     def get_token_url(self):
-        return f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
+        return f"{self.authority}/{self.tenant_id}/oauth2/v2.0/token"
+
+    def get_jwks_url(self):
+        return f"{self.authority}/{self.tenant_id}/discovery/v2.0/keys"
+
+    def get_issuer(self):
+        if not _is_tenant_guid(self.tenant_id):
+            # ID tokens are issued with the GUID of the tenant, which a multi-tenant
+            # ID or a domain name such as contoso.onmicrosoft.com does not tell, so
+            # the issuer is checked against the tid claim in decode_id_token instead
+            return None
+        return f"{self.authority}/{self.tenant_id}/v2.0"
+
+    def decode_id_token(self, id_token: str) -> dict[str, Any]:
+        claims = super().decode_id_token(id_token)
+        self._check_home_tenant_issuer(claims)
+        return claims
+
+    async def adecode_id_token(self, id_token: str) -> dict[str, Any]:
+        claims = await super().adecode_id_token(id_token)
+        self._check_home_tenant_issuer(claims)
+        return claims
+
+    def _check_home_tenant_issuer(self, claims: dict[str, Any]) -> None:
+        if self.get_issuer() is not None or not self._should_verify_id_token(
+            self.get_jwks_url()
+        ):
+            return
+        expected_issuer = f"{self.authority}/{claims.get('tid')}/v2.0"
+        if claims.get("iss") != expected_issuer:
+            raise InvalidIDTokenError()
 
     def fetch_access_token(
         self, authorization_code: str, code_verifier: str, redirect_uri: str
@@ -37,28 +179,46 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
         Returns:
             str: Access token
 
+        Raises:
+            AccessTokenExchangeError: If the token exchange requests fails
+            MissingAccessTokenError: If the token response is missing the access token
+            InvalidTokenResponseError: If the token response from the IdP is invalid
+        """
+        token_data = self.fetch_token_response(
+            authorization_code, code_verifier, redirect_uri
+        )
+        return token_data["access_token"]
+
+    def fetch_token_response(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> dict[str, Any]:
+        """Exchange authorization code for the tokens issued by Microsoft Entra.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            Dict[str, Any]: Token response, with the access token and usually the ID token
+
         Raises:
             AccessTokenExchangeError: If the token exchange requests fails
             MissingAccessTokenError: If the token response is missing the access token
             InvalidTokenResponseError: If the token response from the IdP is invalid
         """
         token_url = self.get_token_url()
-        data = {
-            "grant_type": "authorization_code",
-            "code": authorization_code,
-            "redirect_uri": redirect_uri,
-            "client_id": self.client_id,
-            "code_verifier": code_verifier,
-            "client_secret": self.client_secret,
-        }
+        data = self.get_token_request_data(
+            authorization_code, code_verifier, redirect_uri
+        )
 
         try:
-            response = requests.post(
-                token_url,
-                data=data,
-                timeout=10,
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
+            with timed(PHASE_TOKEN):
+                response = self._post(
+                    token_url,
+                    data=data,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                )
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             raise AccessTokenExchangeError() from e
@@ -71,8 +231,77 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
         if "access_token" not in token_data:
             raise MissingAccessTokenError()
 
+        return token_data
+
+    async def afetch_access_token(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> str:
+        """Async version of :meth:`fetch_access_token`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            str: Access token
+
+        Raises:
+            AccessTokenExchangeError: If the token exchange requests fails
+            MissingAccessTokenError: If the token response is missing the access token
+            InvalidTokenResponseError: If the token response from the IdP is invalid
+        """
+        token_data = await self.afetch_token_response(
+            authorization_code, code_verifier, redirect_uri
+        )
         return token_data["access_token"]
 
+    async def afetch_token_response(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> dict[str, Any]:
+        """Async version of :meth:`fetch_token_response`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            Dict[str, Any]: Token response, with the access token and usually the ID token
+
+        Raises:
+            AccessTokenExchangeError: If the token exchange requests fails
+            MissingAccessTokenError: If the token response is missing the access token
+            InvalidTokenResponseError: If the token response from the IdP is invalid
+        """
+        token_url = self.get_token_url()
+        data = self.get_token_request_data(
+            authorization_code, code_verifier, redirect_uri
+        )
+
+        # Raise ImproperlyConfigured early if httpx is missing
+        http.get_async_client()
+        try:
+            with timed(PHASE_TOKEN):
+                response = await self._apost(
+                    token_url,
+                    data=data,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise AccessTokenExchangeError() from e
+
+        try:
+            token_data = response.json()
+        except ValueError as e:
+            raise InvalidTokenResponseError() from e
+
+        if "access_token" not in token_data:
+            raise MissingAccessTokenError()
+
+        return token_data
+
     def fetch_user_email(self, access_token: str) -> str | None:
         """
         Using the access token, get the user's email address by fetching from the Microsoft Graph API.
@@ -92,11 +321,8 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
             "Content-Type": "application/json",
         }
         try:
-            response = requests.get(
-                "https://graph.microsoft.com/v1.0/me",
-                headers=headers,
-                timeout=10,
-            )
+            with timed(PHASE_GRAPH):
+                response = self._get(self.graph_url, headers=headers)
             response.raise_for_status()
         except requests.exceptions.RequestException as e:
             raise MicrosoftGraphAPIError() from e
@@ -112,12 +338,81 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
 
         return user_data["userPrincipalName"]
 
+    async def afetch_user_email(self, access_token: str) -> str | None:
+        """Async version of :meth:`fetch_user_email`.
+
+        Args:
+            access_token: OAuth2 access token. To be used with the Microsoft Graph API.
+
+        Returns:
+            Optional[str]: User's email address
+
+        Raises:
+            MicrosoftGraphAPIError: If the Microsoft Graph API request fails
+        """
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+        # Raise ImproperlyConfigured early if httpx is missing
+        http.get_async_client()
+        try:
+            with timed(PHASE_GRAPH):
+                response = await self._aget(self.graph_url, headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise MicrosoftGraphAPIError() from e
+
+        try:
+            user_data = response.json()
+        except ValueError as e:
+            raise InvalidTokenResponseError() from e
+
+        # Select the User Principal Name (UPN) as the email address
+        if "userPrincipalName" not in user_data:
+            raise InvalidTokenResponseError()
+
+        return user_data["userPrincipalName"]
+
     def exchange_code_for_email(
         self, authorization_code: str, code_verifier: str, redirect_uri: str
     ) -> str | None:
         """
         Exchange authorization code for an email address.
 
+        Depending on ``email_resolution``, the email is read from the ID token
+        returned with the access token, from the Microsoft Graph API, or from
+        the ID token with a fallback to the Graph API.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        token_data = self.fetch_token_response(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        id_token = token_data.get("id_token")
+        claims = (
+            self.decode_id_token(id_token)
+            if id_token and self.email_resolution != EMAIL_RESOLUTION_GRAPH
+            else {}
+        )
+        return self.resolve_identity_email(
+            self._build_token_identity(token_data, claims)
+        )
+
+    async def aexchange_code_for_email(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> str | None:
+        """
+        Async version of :meth:`exchange_code_for_email`.
+
         Args:
             authorization_code: OAuth2 authorization code
             code_verifier: PKCE code verifier
@@ -126,15 +421,156 @@ class MicrosoftEntraTenantOAuth2Provider(OAuth2IdentityProvider):
         Returns:
             Optional[str]: User's email address
         """
-        access_token = self.fetch_access_token(
+        token_data = await self.afetch_token_response(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        id_token = token_data.get("id_token")
+        claims = (
+            await self.adecode_id_token(id_token)
+            if id_token and self.email_resolution != EMAIL_RESOLUTION_GRAPH
+            else {}
+        )
+        return await self.aresolve_identity_email(
+            self._build_token_identity(token_data, claims)
+        )
+
+    def get_identity_tenant(self, claims: dict[str, Any]) -> str:
+        # Object IDs are unique within the home tenant of the user
+        return claims.get("tid") or self.tenant_id or ""
+
+    def exchange_code_for_identity(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> ProviderIdentity:
+        """Exchange authorization code for the identity of the user.
+
+        The identity is read from the ID token. The Microsoft Graph API is only
+        called by :meth:`resolve_identity_email`, if the email is needed.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            ProviderIdentity: Identity of the user
+        """
+        token_data = self.fetch_token_response(
             authorization_code=authorization_code,
             code_verifier=code_verifier,
             redirect_uri=redirect_uri,
         )
-        email = self.fetch_user_email(access_token)
-        return email
+        id_token = token_data.get("id_token")
+        claims = self.decode_id_token(id_token) if id_token else {}
+        return self._build_token_identity(token_data, claims)
+
+    async def aexchange_code_for_identity(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> ProviderIdentity:
+        """Async version of :meth:`exchange_code_for_identity`.
+
+        Args:
+            authorization_code: OAuth2 authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+
+        Returns:
+            ProviderIdentity: Identity of the user
+        """
+        token_data = await self.afetch_token_response(
+            authorization_code=authorization_code,
+            code_verifier=code_verifier,
+            redirect_uri=redirect_uri,
+        )
+        id_token = token_data.get("id_token")
+        claims = await self.adecode_id_token(id_token) if id_token else {}
+        return self._build_token_identity(token_data, claims)
+
+    def resolve_identity_email(self, identity: ProviderIdentity) -> str | None:
+        """Get the email address of an identity according to ``email_resolution``.
+
+        Args:
+            identity: Identity returned by :meth:`exchange_code_for_identity`
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        if self._use_identity_email(identity):
+            return identity.email
+        return self.fetch_user_email(identity.access_token)
+
+    async def aresolve_identity_email(self, identity: ProviderIdentity) -> str | None:
+        """Async version of :meth:`resolve_identity_email`.
+
+        Args:
+            identity: Identity returned by :meth:`aexchange_code_for_identity`
+
+        Returns:
+            Optional[str]: User's email address
+        """
+        if self._use_identity_email(identity):
+            return identity.email
+        return await self.afetch_user_email(identity.access_token)
+
+    def _build_token_identity(
+        self, token_data: dict[str, Any], claims: dict[str, Any]
+    ) -> ProviderIdentity:
+        email = (
+            None
+            if self.email_resolution == EMAIL_RESOLUTION_GRAPH
+            else self.extract_email_from_claims(claims)
+        )
+        return self.build_identity(
+            claims, email=email, access_token=token_data["access_token"]
+        )
+
+    def _use_identity_email(self, identity: ProviderIdentity) -> bool:
+        """Record where the email is resolved from and whether the ID token is enough."""
+        if self.email_resolution != EMAIL_RESOLUTION_GRAPH and (
+            identity.email or self.email_resolution == EMAIL_RESOLUTION_ID_TOKEN
+        ):
+            email_resolution_stats.increment(
+                self.email_resolution, "id_token" if identity.email else "miss"
+            )
+            return True
+        email_resolution_stats.increment(self.email_resolution, "graph")
+        return False
+
+    def extract_email_from_claims(self, claims: dict[str, Any]) -> str | None:
+        """Read the user's email address from the claims of an ID token.
+
+        Args:
+            claims: Claims of the ID token
+
+        Returns:
+            Optional[str]: First of the ``EMAIL_CLAIMS`` holding an email address
+        """
+        for claim in self.EMAIL_CLAIMS:
+            value = claims.get(claim)
+            if value and "@" in value:
+                return value
+        return None
 
 
 class MicrosoftEntraTenantOAuth2ProviderBuilder(ProviderBuilder):
-    def __call__(self, client_id, client_secret, tenant_id, **_ignored):
-        return MicrosoftEntraTenantOAuth2Provider(client_id, client_secret, tenant_id)
+    required_options = ("client_id", "client_secret", "tenant_id")
+
+    def __call__(
+        self,
+        client_id,
+        client_secret,
+        tenant_id,
+        email_resolution=EMAIL_RESOLUTION_GRAPH,
+        authority=AUTHORITY_URL,
+        graph_url=GRAPH_ME_URL,
+        **_ignored,
+    ):
+        return MicrosoftEntraTenantOAuth2Provider(
+            client_id,
+            client_secret,
+            tenant_id,
+            email_resolution=email_resolution,
+            authority=authority,
+            graph_url=graph_url,
+        )
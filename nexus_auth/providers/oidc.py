@@ -0,0 +1,251 @@
+from typing import Any
+
+import requests
+from django.core.signals import setting_changed
+
+from nexus_auth.cache import LRUCache, get_shared_cache, make_key
+from nexus_auth.exceptions import DiscoveryDocumentError
+from nexus_auth.providers import http
+from nexus_auth.providers.base import OAuth2IdentityProvider, ProviderBuilder
+from nexus_auth.providers.http import httpx
+from nexus_auth.providers.singleflight import flights
+from nexus_auth.settings import nexus_settings
+
+DISCOVERY_PATH = "/.well-known/openid-configuration"
+
+_REQUIRED_METADATA = ("issuer", "authorization_endpoint", "token_endpoint")
+
+
+class DiscoveryDocumentCache:
+    """Two-tier cache of OIDC discovery documents.
+
+    Documents are kept in a bounded in-process LRU and in the shared Django cache,
+    so a document is fetched from the IdP at most once per TTL across all workers.
+    """
+
+    namespace = "oidc_discovery"
+
+    def __init__(self) -> None:
+        self._local: LRUCache | None = None
+
+    @property
+    def local(self) -> LRUCache:
+        if self._local is None:
+            cache_settings = nexus_settings.get_discovery_cache_settings()
+            self._local = LRUCache(
+                max_entries=cache_settings["MAX_ENTRIES"],
+                ttl=cache_settings["TTL"],
+                name="discovery",
+            )
+        return self._local
+
+    @property
+    def ttl(self) -> int:
+        return nexus_settings.get_discovery_cache_settings()["TTL"]
+
+    def get(self, discovery_url: str) -> dict[str, Any]:
+        """Get the discovery document, fetching it from the IdP on a cache miss.
+
+        Args:
+            discovery_url: URL of the discovery document
+
+        Returns:
+            Dict[str, Any]: Provider metadata
+
+        Raises:
+            DiscoveryDocumentError: If the document cannot be retrieved
+        """
+        document = self.local.get(discovery_url)
+        if document is not None:
+            return document
+
+        key = make_key(self.namespace, discovery_url)
+        document = get_shared_cache().get(key)
+        if document is None:
+            # Concurrent misses of this process, e.g. of the tenants of the
+            # same issuer after a deploy, share a single fetch
+            document, _ = flights.do(
+                key, lambda: self._fetch_shared(discovery_url, key)
+            )
+
+        self.local.set(discovery_url, document)
+        return document
+
+    def _fetch_shared(self, discovery_url: str, key: str) -> dict[str, Any]:
+        document = self.fetch(discovery_url)
+        get_shared_cache().set(key, document, self.ttl)
+        return document
+
+    async def aget(self, discovery_url: str) -> dict[str, Any]:
+        """Async version of :meth:`get`.
+
+        Args:
+            discovery_url: URL of the discovery document
+
+        Returns:
+            Dict[str, Any]: Provider metadata
+
+        Raises:
+            DiscoveryDocumentError: If the document cannot be retrieved
+        """
+        document = self.local.get(discovery_url)
+        if document is not None:
+            return document
+
+        key = make_key(self.namespace, discovery_url)
+        document = await get_shared_cache().aget(key)
+        if document is None:
+            document = await self.afetch(discovery_url)
+            await get_shared_cache().aset(key, document, self.ttl)
+
+        self.local.set(discovery_url, document)
+        return document
+
+    def fetch(self, discovery_url: str) -> dict[str, Any]:
+        """Fetch the discovery document from the IdP.
+
+        Args:
+            discovery_url: URL of the discovery document
+
+        Returns:
+            Dict[str, Any]: Provider metadata
+
+        Raises:
+            DiscoveryDocumentError: If the request fails or the document is invalid
+        """
+        try:
+            response = http.request("get", discovery_url)
+            response.raise_for_status()
+            document = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise DiscoveryDocumentError() from e
+        return self.validate(document)
+
+    async def afetch(self, discovery_url: str) -> dict[str, Any]:
+        """Async version of :meth:`fetch`.
+
+        Args:
+            discovery_url: URL of the discovery document
+
+        Returns:
+            Dict[str, Any]: Provider metadata
+
+        Raises:
+            DiscoveryDocumentError: If the request fails or the document is invalid
+        """
+        # Raise ImproperlyConfigured early if httpx is missing
+        http.get_async_client()
+        try:
+            response = await http.arequest("get", discovery_url)
+            response.raise_for_status()
+            document = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise DiscoveryDocumentError() from e
+        return self.validate(document)
+
+    def validate(self, document: Any) -> dict[str, Any]:
+        """Check that the document has the metadata needed for the code flow.
+
+        Args:
+            document: Decoded discovery document
+
+        Returns:
+            Dict[str, Any]: The document
+
+        Raises:
+            DiscoveryDocumentError: If required metadata is missing
+        """
+        if not isinstance(document, dict) or any(
+            field not in document for field in _REQUIRED_METADATA
+        ):
+            raise DiscoveryDocumentError()
+        return document
+
+    def clear(self) -> None:
+        """Drop the in-process documents. The shared cache expires on its own."""
+        self._local = None
+
+
+discovery_cache = DiscoveryDocumentCache()
+
+
+def _reset_discovery_cache(*, setting: str, **kwargs) -> None:
+    if setting == "NEXUS_AUTH":
+        discovery_cache.clear()
+
+
+setting_changed.connect(_reset_discovery_cache)
+
+
+class OpenIDConnectProvider(OAuth2IdentityProvider):
+    """Generic OpenID Connect provider (e.g. Okta, Keycloak, Auth0).
+
+    Endpoints are read from the issuer's discovery document, which is cached by
+    ``discovery_cache``.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        issuer: str,
+        discovery_url: str | None = None,
+        tenant_id: str | None = None,
+    ) -> None:
+        """Initialize the OIDC provider.
+
+        Args:
+            client_id: OAuth2 client ID
+            client_secret: OAuth2 client secret
+            issuer: Issuer identifier of the IdP
+            discovery_url: URL of the discovery document, derived from the issuer if omitted
+            tenant_id: Optional tenant ID for multi-tenant providers
+        """
+        super().__init__(client_id, client_secret, tenant_id)
+        self.issuer = issuer.rstrip("/")
+        self.discovery_url = discovery_url or f"{self.issuer}{DISCOVERY_PATH}"
+
+    def get_discovery_document(self) -> dict[str, Any]:
+        """Get the cached discovery document of the issuer.
+
+        Returns:
+            Dict[str, Any]: Provider metadata
+        """
+        return discovery_cache.get(self.discovery_url)
+
+    def get_authorization_url(self) -> str:
+        return self.get_discovery_document()["authorization_endpoint"]
+
+    def get_token_url(self) -> str:
+        return self.get_discovery_document()["token_endpoint"]
+
+    def get_jwks_url(self) -> str | None:
+        return self.get_discovery_document().get("jwks_uri")
+
+    def get_issuer(self) -> str:
+        return self.get_discovery_document()["issuer"]
+
+    def get_identity_tenant(self, claims: dict[str, Any]) -> str:
+        # Subjects are unique per issuer
+        return self.issuer
+
+    async def afetch_id_token(
+        self, authorization_code: str, code_verifier: str, redirect_uri: str
+    ) -> str:
+        # Load the document without blocking the event loop, so that the
+        # get_token_url call in the base implementation is a memory lookup
+        await discovery_cache.aget(self.discovery_url)
+        return await super().afetch_id_token(
+            authorization_code, code_verifier, redirect_uri
+        )
+
+
+class OpenIDConnectProviderBuilder(ProviderBuilder):
+    required_options = ("client_id", "client_secret", "issuer")
+
+    def __call__(
+        self, client_id, client_secret, issuer, discovery_url=None, **_ignored
+    ):
+        return OpenIDConnectProvider(
+            client_id, client_secret, issuer, discovery_url=discovery_url
+        )
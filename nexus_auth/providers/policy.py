@@ -0,0 +1,169 @@
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from nexus_auth.settings import nexus_settings
+
+# HTTP methods that can be sent again without side effects at the IdP
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass(frozen=True)
+class ExchangePolicy:
+    """Deadline and retry policy of an exchange with an IdP."""
+
+    # Monotonic time by which the exchange must be over, None for no deadline
+    deadline: float | None
+    retries: int
+    backoff_base: float
+    backoff_max: float
+    retry_statuses: frozenset[int]
+
+    def remaining(self) -> float | None:
+        """Get the time left before the deadline.
+
+        Returns:
+            Optional[float]: Seconds left, ``None`` if there is no deadline
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def cap_timeout(
+        self, timeout: tuple[float, float] | float | None
+    ) -> tuple[float, float] | float | None:
+        """Shorten a request timeout so that the request ends by the deadline.
+
+        Args:
+            timeout: (connect, read) timeout of the request
+
+        Returns:
+            Timeout capped to the time left
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(min(value, remaining) for value in timeout)
+        return min(timeout, remaining)
+
+    def get_retry_delay(
+        self, method: str, status_code: Any, headers: Any, attempt: int
+    ) -> float | None:
+        """Get the delay before retrying a request, if it should be retried.
+
+        Only idempotent requests answered with a transient status are retried.
+        The delay is the ``Retry-After`` of the response or an exponential
+        backoff with full jitter, and must end before the deadline.
+
+        Args:
+            method: HTTP method of the request
+            status_code: Status code of the response
+            headers: Headers of the response
+            attempt: Number of retries already made
+
+        Returns:
+            Optional[float]: Delay in seconds, ``None`` to not retry
+        """
+        if (
+            attempt >= self.retries
+            or method.upper() not in IDEMPOTENT_METHODS
+            or status_code not in self.retry_statuses
+        ):
+            return None
+        delay = parse_retry_after(headers.get("Retry-After"))
+        if delay is None:
+            delay = random.uniform(
+                0, min(self.backoff_max, self.backoff_base * 2**attempt)
+            )
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a ``Retry-After`` header, in seconds or as an HTTP date.
+
+    Args:
+        value: Header value
+
+    Returns:
+        Optional[float]: Delay in seconds, ``None`` if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+_current_policy: ContextVar[ExchangePolicy | None] = ContextVar(
+    "nexus_auth_exchange_policy", default=None
+)
+
+
+def get_current_policy() -> ExchangePolicy | None:
+    """Get the policy of the exchange in progress.
+
+    Returns:
+        Optional[ExchangePolicy]: Policy, ``None`` outside of an exchange
+    """
+    return _current_policy.get()
+
+
+def build_policy(provider_type: str) -> ExchangePolicy:
+    """Build the policy of an exchange starting now.
+
+    Args:
+        provider_type: Type of the provider
+
+    Returns:
+        ExchangePolicy: Policy from NEXUS_AUTH.EXCHANGE_POLICIES
+    """
+    policy_settings = nexus_settings.get_exchange_policy_settings(provider_type)
+    deadline = policy_settings["DEADLINE"]
+    return ExchangePolicy(
+        deadline=time.monotonic() + deadline if deadline else None,
+        retries=policy_settings["RETRIES"],
+        backoff_base=policy_settings["BACKOFF_BASE"],
+        backoff_max=policy_settings["BACKOFF_MAX"],
+        retry_statuses=frozenset(policy_settings["RETRY_STATUSES"]),
+    )
+
+
+@contextmanager
+def exchange_policy(provider_type: str) -> Iterator[ExchangePolicy]:
+    """Apply the policy of a provider to the IdP requests sent in the block.
+
+    All the requests share a single deadline, so that the exchange as a
+    whole has a known maximum duration.
+
+    Args:
+        provider_type: Type of the provider
+
+    Yields:
+        ExchangePolicy: Policy of the exchange
+    """
+    policy = build_policy(provider_type)
+    token = _current_policy.set(policy)
+    try:
+        yield policy
+    finally:
+        _current_policy.reset(token)
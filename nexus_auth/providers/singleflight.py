@@ -0,0 +1,301 @@
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from nexus_auth.cache import get_shared_cache, make_key
+
+# Interval between two looks at the shared cache while another worker runs the call
+_POLL_INTERVAL = 0.05
+
+# States of a result stored in the shared cache
+_SUCCEEDED = "succeeded"
+_FAILED = "failed"
+
+
+class SharedFlightError(Exception):
+    """The call of another worker, whose result was awaited, failed."""
+
+
+class _Flight:
+    """Call in progress in this process, whose outcome is shared with its waiters."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Coalesce the concurrent calls made with the same key.
+
+    The first caller of a key runs the call, and the callers arriving while
+    it is in progress wait for its outcome instead of running it again: they
+    get the same result, or the same exception. Calls are only coalesced
+    while in flight, nothing is kept once they are over.
+
+    Threads share flights across the process. Coroutines share flights with
+    the other coroutines of their event loop.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._async_flights: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def do(
+        self, key: str, func: Callable[[], Any], timeout: float | None = None
+    ) -> tuple[Any, bool]:
+        """Run a call, or wait for the outcome of the call in flight with the same key.
+
+        Args:
+            key: Key of the call, e.g. a fingerprint of a request
+            func: Function running the call
+            timeout: Maximum seconds to wait for the call in flight
+
+        Returns:
+            Tuple[Any, bool]: Result of the call, and whether it was shared
+            with another caller
+
+        Raises:
+            TimeoutError: If the call in flight is not over after ``timeout`` seconds
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Call '{key}' still in flight")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def ado(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        timeout: float | None = None,
+    ) -> tuple[Any, bool]:
+        """Async version of :meth:`do`.
+
+        Args:
+            key: Key of the call, e.g. a fingerprint of a request
+            func: Coroutine function running the call
+            timeout: Maximum seconds to wait for the call in flight
+
+        Returns:
+            Tuple[Any, bool]: Result of the call, and whether it was shared
+            with another caller
+
+        Raises:
+            TimeoutError: If the call in flight is not over after ``timeout`` seconds
+        """
+        loop = asyncio.get_running_loop()
+        flights = self._async_flights.setdefault(loop, {})
+        while (future := flights.get(key)) is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout), True
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Call '{key}' still in flight") from None
+            except asyncio.CancelledError:
+                # The caller running the call was cancelled, not this one
+                if not future.cancelled():
+                    raise
+
+        future = flights[key] = loop.create_future()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Avoid the "exception was never retrieved" warning without waiters
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del flights[key]
+        return result, False
+
+
+class SharedFlight:
+    """Coalesce the concurrent calls made with the same key by all workers.
+
+    The worker adding the lock of a key to the shared Django cache runs the
+    call and stores its serialized result for ``result_ttl`` seconds. The
+    other workers poll the cache until the result is there. If the call
+    fails, the waiting workers fail as well rather than running it again,
+    since it may not be safe to repeat. Only if the worker running it dies
+    and its lock expires, one of the waiting workers runs the call.
+    """
+
+    namespace = "single_flight"
+
+    def __init__(self, wait: float, result_ttl: float) -> None:
+        """Initialize the shared flights.
+
+        Args:
+            wait: Lifetime of the lock, the longest a call may take
+            result_ttl: Seconds the result of a call is kept for the waiting workers
+        """
+        self.wait = wait
+        self.result_ttl = result_ttl
+
+    def do(
+        self,
+        key: str,
+        func: Callable[[], Any],
+        serialize: Callable[[Any], Any],
+        deserialize: Callable[[Any], Any],
+        timeout: float | None = None,
+    ) -> tuple[Any, bool]:
+        """Run a call, or wait for the result of the call run by another worker.
+
+        Args:
+            key: Key of the call, e.g. a fingerprint of a request
+            func: Function running the call
+            serialize: Function converting the result to a picklable value
+            deserialize: Function converting the stored value to a result
+            timeout: Maximum seconds to wait for the other worker
+
+        Returns:
+            Tuple[Any, bool]: Result of the call, and whether it was run by
+            another worker
+
+        Raises:
+            TimeoutError: If the other worker is not done after ``timeout`` seconds
+            SharedFlightError: If the call of the other worker failed
+        """
+        cache = get_shared_cache()
+        lock_key = make_key(self.namespace, key)
+        deadline = self._get_deadline(timeout)
+        flight_id = uuid.uuid4().hex
+        while True:
+            if cache.add(lock_key, flight_id, self.wait):
+                try:
+                    result = func()
+                except BaseException:
+                    cache.set(self._result_key(flight_id), (_FAILED,), self.result_ttl)
+                    cache.delete(lock_key)
+                    raise
+                cache.set(
+                    self._result_key(flight_id),
+                    (_SUCCEEDED, serialize(result)),
+                    self.result_ttl,
+                )
+                cache.delete(lock_key)
+                return result, False
+
+            owner = cache.get(lock_key)
+            while owner is not None:
+                stored = cache.get(self._result_key(owner))
+                if stored is not None:
+                    return self._load(key, stored, deserialize), True
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Call '{key}' still in flight")
+                time.sleep(_POLL_INTERVAL)
+                current = cache.get(lock_key)
+                if current != owner:
+                    # The owner is done: its result is stored, or it failed
+                    stored = cache.get(self._result_key(owner))
+                    if stored is not None:
+                        return self._load(key, stored, deserialize), True
+                owner = current
+
+    async def ado(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        serialize: Callable[[Any], Any],
+        deserialize: Callable[[Any], Any],
+        timeout: float | None = None,
+    ) -> tuple[Any, bool]:
+        """Async version of :meth:`do`.
+
+        Args:
+            key: Key of the call, e.g. a fingerprint of a request
+            func: Coroutine function running the call
+            serialize: Function converting the result to a picklable value
+            deserialize: Function converting the stored value to a result
+            timeout: Maximum seconds to wait for the other worker
+
+        Returns:
+            Tuple[Any, bool]: Result of the call, and whether it was run by
+            another worker
+
+        Raises:
+            TimeoutError: If the other worker is not done after ``timeout`` seconds
+            SharedFlightError: If the call of the other worker failed
+        """
+        cache = get_shared_cache()
+        lock_key = make_key(self.namespace, key)
+        deadline = self._get_deadline(timeout)
+        flight_id = uuid.uuid4().hex
+        while True:
+            if await cache.aadd(lock_key, flight_id, self.wait):
+                try:
+                    result = await func()
+                except BaseException:
+                    await cache.aset(
+                        self._result_key(flight_id), (_FAILED,), self.result_ttl
+                    )
+                    await cache.adelete(lock_key)
+                    raise
+                await cache.aset(
+                    self._result_key(flight_id),
+                    (_SUCCEEDED, serialize(result)),
+                    self.result_ttl,
+                )
+                await cache.adelete(lock_key)
+                return result, False
+
+            owner = await cache.aget(lock_key)
+            while owner is not None:
+                stored = await cache.aget(self._result_key(owner))
+                if stored is not None:
+                    return self._load(key, stored, deserialize), True
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Call '{key}' still in flight")
+                await asyncio.sleep(_POLL_INTERVAL)
+                current = await cache.aget(lock_key)
+                if current != owner:
+                    stored = await cache.aget(self._result_key(owner))
+                    if stored is not None:
+                        return self._load(key, stored, deserialize), True
+                owner = current
+
+    def _load(self, key: str, stored: tuple, deserialize: Callable[[Any], Any]) -> Any:
+        if stored[0] == _FAILED:
+            raise SharedFlightError(f"Call '{key}' failed in another worker")
+        return deserialize(stored[1])
+
+    def _get_deadline(self, timeout: float | None) -> float:
+        wait = self.wait if timeout is None else min(self.wait, timeout)
+        return time.monotonic() + wait
+
+    def _result_key(self, flight_id: str) -> str:
+        return make_key(f"{self.namespace}_result", flight_id)
+
+
+flights = SingleFlight()
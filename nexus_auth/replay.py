@@ -0,0 +1,163 @@
+import asyncio
+import time
+from typing import Any
+
+from nexus_auth.cache import get_shared_cache, make_key
+from nexus_auth.exceptions import ExchangeInProgressError
+from nexus_auth.metrics import record_cache_lookup
+from nexus_auth.providers.policy import get_current_policy
+from nexus_auth.settings import nexus_settings
+
+REPLAY_NAMESPACE = "exchange_replay"
+
+# Seconds between two checks of a duplicate exchange in progress
+POLL_INTERVAL = 0.05
+
+# Entries are tuples starting with their state
+_PENDING = ("pending",)
+_RESOLVED = "resolved"
+
+
+class ExchangeReplay:
+    """Replay cache of the exchange of an authorization code, shared by all workers.
+
+    The first request exchanging a code claims it in the shared cache, and
+    stores the primary key of the resolved user once the exchange succeeds.
+    Duplicate submissions of the same code within EXCHANGE_REPLAY.TTL seconds
+    get the stored user without contacting the IdP, which would reject the
+    code as already redeemed. Duplicates arriving while the first exchange is
+    in progress wait for its result.
+
+    The entry is keyed by a hash of the provider type, the code, the code
+    verifier and the redirect URI, so a replay requires the same proof as
+    the exchange itself.
+    """
+
+    def __init__(
+        self, provider_type: str, code: str, code_verifier: str, redirect_uri: str
+    ) -> None:
+        """Initialize the replay cache of an exchange.
+
+        Args:
+            provider_type: Type of the provider
+            code: Authorization code
+            code_verifier: PKCE code verifier
+            redirect_uri: Redirect URI used in the authorization request
+        """
+        replay_settings = nexus_settings.get_exchange_replay_settings()
+        self.key = make_key(
+            REPLAY_NAMESPACE, provider_type, code, code_verifier, redirect_uri
+        )
+        self.ttl = replay_settings["TTL"]
+        self.wait = replay_settings["WAIT"]
+        self.claimed = False
+
+    def claim(self) -> Any | None:
+        """Claim the exchange, or get the user resolved by a duplicate.
+
+        Returns:
+            Optional[Any]: Primary key of the user resolved by a duplicate,
+            ``None`` if the exchange was claimed and must be run
+
+        Raises:
+            ExchangeInProgressError: If a duplicate is still in progress after EXCHANGE_REPLAY.WAIT seconds
+        """
+        cache = get_shared_cache()
+        deadline = self._get_wait_deadline()
+        while True:
+            if cache.add(self.key, _PENDING, self.wait):
+                return self._claimed()
+            entry = cache.get(self.key)
+            if entry is None:
+                # The duplicate failed and released the claim
+                continue
+            if entry != _PENDING and entry[0] == _RESOLVED:
+                return self._replayed(entry)
+            if time.monotonic() >= deadline:
+                raise ExchangeInProgressError()
+            time.sleep(POLL_INTERVAL)
+
+    async def aclaim(self) -> Any | None:
+        """Async version of :meth:`claim`.
+
+        Returns:
+            Optional[Any]: Primary key of the user resolved by a duplicate,
+            ``None`` if the exchange was claimed and must be run
+
+        Raises:
+            ExchangeInProgressError: If a duplicate is still in progress after EXCHANGE_REPLAY.WAIT seconds
+        """
+        cache = get_shared_cache()
+        deadline = self._get_wait_deadline()
+        while True:
+            if await cache.aadd(self.key, _PENDING, self.wait):
+                return self._claimed()
+            entry = await cache.aget(self.key)
+            if entry is None:
+                continue
+            if entry != _PENDING and entry[0] == _RESOLVED:
+                return self._replayed(entry)
+            if time.monotonic() >= deadline:
+                raise ExchangeInProgressError()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def complete(self, user: Any) -> None:
+        """Store the user resolved by the claimed exchange.
+
+        Args:
+            user: Authenticated user
+        """
+        get_shared_cache().set(self.key, (_RESOLVED, user.pk), self.ttl)
+
+    async def acomplete(self, user: Any) -> None:
+        """Async version of :meth:`complete`.
+
+        Args:
+            user: Authenticated user
+        """
+        await get_shared_cache().aset(self.key, (_RESOLVED, user.pk), self.ttl)
+
+    def release(self) -> None:
+        """Release the claim of a failed exchange, so that a duplicate can run it."""
+        if self.claimed:
+            get_shared_cache().delete(self.key)
+
+    async def arelease(self) -> None:
+        """Async version of :meth:`release`."""
+        if self.claimed:
+            await get_shared_cache().adelete(self.key)
+
+    def _get_wait_deadline(self) -> float:
+        deadline = time.monotonic() + self.wait
+        policy = get_current_policy()
+        if policy is not None and policy.deadline is not None:
+            return min(deadline, policy.deadline)
+        return deadline
+
+    def _claimed(self) -> None:
+        self.claimed = True
+        record_cache_lookup(REPLAY_NAMESPACE, hit=False)
+        return None
+
+    def _replayed(self, entry: tuple[str, Any]) -> Any:
+        record_cache_lookup(REPLAY_NAMESPACE, hit=True)
+        return entry[1]
+
+
+def get_exchange_replay(
+    provider_type: str, code: str, code_verifier: str, redirect_uri: str
+) -> ExchangeReplay | None:
+    """Get the replay cache of an exchange, if EXCHANGE_REPLAY.ENABLED is set.
+
+    Args:
+        provider_type: Type of the provider
+        code: Authorization code
+        code_verifier: PKCE code verifier
+        redirect_uri: Redirect URI used in the authorization request
+
+    Returns:
+        Optional[ExchangeReplay]: Replay cache, ``None`` if disabled
+    """
+    if not nexus_settings.get_exchange_replay_settings()["ENABLED"]:
+        return None
+    return ExchangeReplay(provider_type, code, code_verifier, redirect_uri)
@@ -1,20 +1,91 @@
+import copy
+import hashlib
+import json
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
 from typing import Any
 
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.utils.module_loading import import_string
 
 from nexus_auth.exceptions import NoActiveProviderError
 
 
+@dataclass(frozen=True)
+class CompiledSettings:
+    """Immutable snapshot of the NEXUS_AUTH setting merged with the defaults."""
+
+    user_settings: Mapping[str, Any]
+    handler_path: str | None
+    builders: Mapping[str, str]
+    merged: Mapping[str, Mapping[str, Any]]
+
+    @cached_property
+    def handler(self) -> Callable[..., dict[str, dict[str, str]] | None] | None:
+        """Providers configuration handler, imported on first use.
+
+        Importing it while compiling could be circular, as the default handler
+        lives in a module that depends on these settings.
+        """
+        return import_string(self.handler_path) if self.handler_path else None
+
+    @cached_property
+    def tenant_key_func(self) -> Callable[..., Any] | None:
+        """Function returning the key of the tenant a request belongs to, imported on first use."""
+        path = self.user_settings.get(NexusAuthSettings._FIELD_TENANT_KEY_FUNC)
+        return import_string(path) if path else None
+
+    @cached_property
+    def version(self) -> str:
+        """Hash of the user settings, used to namespace data cached across workers."""
+        payload = json.dumps(
+            dict(self.user_settings), sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @property
+    def uses_default_handler(self) -> bool:
+        """Whether the providers configuration comes from the static CONFIG setting."""
+        return self.handler_path == NexusAuthSettings._DEFAULT_HANDLER
+
+
 class NexusAuthSettings:
     _FIELD_NEXUS_AUTH = "NEXUS_AUTH"
     _FIELD_PROVIDERS = "CONFIG"
     _FIELD_HANDLER = "PROVIDERS_HANDLER"
     _FIELD_BUILDERS = "PROVIDER_BUILDERS"
+    _FIELD_HTTP = "HTTP"
+    _FIELD_CACHE_ALIAS = "CACHE_ALIAS"
+    _FIELD_DISCOVERY_CACHE = "DISCOVERY_CACHE"
+    _FIELD_JWKS_CACHE = "JWKS_CACHE"
+    _FIELD_ID_TOKEN_VERIFICATION = "ID_TOKEN_VERIFICATION"
+    _FIELD_PROVIDER_CACHE = "PROVIDER_CACHE"
+    _FIELD_EAGER_BUILDERS = "EAGER_PROVIDER_BUILDERS"
+    _FIELD_PROVIDERS_RESPONSE = "PROVIDERS_RESPONSE"
+    _FIELD_TENANT_KEY_FUNC = "TENANT_KEY_FUNC"
+    _FIELD_USER_LOOKUP = "USER_LOOKUP"
+    _FIELD_SUBJECT_LINKS = "SUBJECT_LINKS"
+    _FIELD_LAST_LOGIN = "LAST_LOGIN"
+    _FIELD_CIRCUIT_BREAKER = "CIRCUIT_BREAKER"
+    _FIELD_EXCHANGE_POLICIES = "EXCHANGE_POLICIES"
+    _FIELD_TIMING = "TIMING"
+    _FIELD_METRICS = "METRICS"
+    _FIELD_LOADTEST = "LOADTEST"
+    _FIELD_EXCHANGE_REPLAY = "EXCHANGE_REPLAY"
+    _FIELD_SINGLE_FLIGHT = "SINGLE_FLIGHT"
+    _FIELD_THROTTLE = "THROTTLE"
+    _FIELD_PROVIDER_CONFIGURATIONS = "PROVIDER_CONFIGURATIONS"
+    _FIELD_WARMUP = "WARMUP"
+    _DEFAULT_POLICY = "DEFAULT"
     _DEFAULT_HANDLER = "nexus_auth.utils.load_providers_config"
 
     def __init__(self, defaults=None):
         self.defaults = defaults or {}
+        self._snapshot: CompiledSettings | None = None
+        setting_changed.connect(self._on_setting_changed)
 
     def __getattr__(self, attr: str) -> Any:
         if attr in self.defaults:
@@ -23,11 +94,35 @@ class NexusAuthSettings:
             f"'{self.__class__.__name__}' object has no attribute '{attr}'"
         )
 
-    def _get_user_settings(self) -> dict[str, Any]:
+    @property
+    def snapshot(self) -> CompiledSettings:
+        """Get the compiled settings, compiling them on first access.
+
+        Returns:
+            CompiledSettings: Settings snapshot
         """
-        Get the NEXUS_AUTH setting from Django's settings.
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = self._compile()
+        return snapshot
+
+    def reload(self) -> None:
+        """Drop the compiled settings. They are compiled again on next access."""
+        self._snapshot = None
+
+    def _on_setting_changed(self, *, setting: str, **kwargs) -> None:
+        if setting == self._FIELD_NEXUS_AUTH:
+            self.reload()
+
+    def _compile(self) -> CompiledSettings:
+        """Compile the NEXUS_AUTH setting into an immutable snapshot.
+
+        Returns:
+            CompiledSettings: Settings snapshot
         """
-        user_settings = getattr(settings, self._FIELD_NEXUS_AUTH, {})
+        # Copy the user settings so that the snapshot is not affected by, and
+        # does not alter, the dict in Django's settings
+        user_settings = copy.deepcopy(getattr(settings, self._FIELD_NEXUS_AUTH, {}))
 
         # If CONFIG is provided but no handler is set, use the default handler
         if (
@@ -36,7 +131,23 @@ class NexusAuthSettings:
         ):
             user_settings[self._FIELD_HANDLER] = self._DEFAULT_HANDLER
 
-        return user_settings
+        merged = {
+            field: MappingProxyType({**default, **user_settings.get(field, {})})
+            for field, default in self.defaults.items()
+            if isinstance(default, dict) and field != self._FIELD_PROVIDERS
+        }
+        return CompiledSettings(
+            user_settings=MappingProxyType(user_settings),
+            handler_path=user_settings.get(self._FIELD_HANDLER),
+            builders=merged.get(self._FIELD_BUILDERS, MappingProxyType({})),
+            merged=MappingProxyType(merged),
+        )
+
+    def _get_user_settings(self) -> Mapping[str, Any]:
+        """
+        Get the NEXUS_AUTH setting from Django's settings.
+        """
+        return self.snapshot.user_settings
 
     def providers_config_setting(self) -> dict[str, dict[str, str]]:
         """Get the CONFIG setting. This will be the value you have set in your Django settings for NEXUS_AUTH.CONFIG.
@@ -59,25 +170,221 @@ class NexusAuthSettings:
         Returns:
             Optional[Dict[str, Dict[str, str]]]: Provider configuration, or ``None`` if no handler is configured.
         """
-        user_settings = self._get_user_settings()
-        handler_path = user_settings.get(self._FIELD_HANDLER)
-        if handler_path:
-            handler = import_string(handler_path)
+        handler = self.snapshot.handler
+        if handler:
             return handler(**kwargs)
         return None
 
-    def get_provider_builders(self) -> dict[str, str]:
+    def get_provider_builders(self) -> Mapping[str, str]:
         """Get the PROVIDER_BUILDERS setting.
 
         Returns:
             Dict[str, str]: Builder configuration
         """
-        user_builders = self._get_user_settings().get(self._FIELD_BUILDERS, {})
-        merged_builders = {
-            **self.defaults.get(self._FIELD_BUILDERS, {}),
-            **user_builders,
+        return self.snapshot.builders
+
+    def get_http_settings(self) -> Mapping[str, Any]:
+        """Get the HTTP setting used to configure the pooled IdP sessions.
+
+        Returns:
+            Dict[str, Any]: HTTP client configuration
+        """
+        return self.snapshot.merged[self._FIELD_HTTP]
+
+    def get_cache_alias(self) -> str:
+        """Get the alias of the Django cache shared by all workers.
+
+        Returns:
+            str: Cache alias from the CACHES setting
+        """
+        return self._get_user_settings().get(
+            self._FIELD_CACHE_ALIAS, self.defaults[self._FIELD_CACHE_ALIAS]
+        )
+
+    def get_discovery_cache_settings(self) -> Mapping[str, Any]:
+        """Get the DISCOVERY_CACHE setting used for OIDC discovery documents.
+
+        Returns:
+            Dict[str, Any]: Discovery cache configuration
+        """
+        return self.snapshot.merged[self._FIELD_DISCOVERY_CACHE]
+
+    def get_jwks_cache_settings(self) -> Mapping[str, Any]:
+        """Get the JWKS_CACHE setting used for the signing keys of the IdPs.
+
+        Returns:
+            Dict[str, Any]: JWKS cache configuration
+        """
+        return self.snapshot.merged[self._FIELD_JWKS_CACHE]
+
+    def get_id_token_verification_settings(self) -> Mapping[str, Any]:
+        """Get the ID_TOKEN_VERIFICATION setting.
+
+        Returns:
+            Dict[str, Any]: ID token verification configuration
+        """
+        return self.snapshot.merged[self._FIELD_ID_TOKEN_VERIFICATION]
+
+    def get_provider_cache_settings(self) -> Mapping[str, Any]:
+        """Get the PROVIDER_CACHE setting used for the built provider instances.
+
+        Returns:
+            Dict[str, Any]: Provider cache configuration
+        """
+        return self.snapshot.merged[self._FIELD_PROVIDER_CACHE]
+
+    def get_providers_response_settings(self) -> Mapping[str, Any]:
+        """Get the PROVIDERS_RESPONSE setting used to cache the providers endpoint.
+
+        Returns:
+            Dict[str, Any]: Providers response cache configuration
+        """
+        return self.snapshot.merged[self._FIELD_PROVIDERS_RESPONSE]
+
+    def get_user_lookup_settings(self) -> Mapping[str, Any]:
+        """Get the USER_LOOKUP setting used to find the user of an email address.
+
+        Returns:
+            Dict[str, Any]: User lookup configuration
+        """
+        return self.snapshot.merged[self._FIELD_USER_LOOKUP]
+
+    def get_subject_links_settings(self) -> Mapping[str, Any]:
+        """Get the SUBJECT_LINKS setting used to resolve users by their IdP subject.
+
+        Returns:
+            Dict[str, Any]: Subject links configuration
+        """
+        return self.snapshot.merged[self._FIELD_SUBJECT_LINKS]
+
+    def get_last_login_settings(self) -> Mapping[str, Any]:
+        """Get the LAST_LOGIN setting used to buffer the last login updates.
+
+        Returns:
+            Dict[str, Any]: Last login configuration
+        """
+        return self.snapshot.merged[self._FIELD_LAST_LOGIN]
+
+    def get_circuit_breaker_settings(self) -> Mapping[str, Any]:
+        """Get the CIRCUIT_BREAKER setting used to guard the IdP endpoints.
+
+        Returns:
+            Dict[str, Any]: Circuit breaker configuration
+        """
+        return self.snapshot.merged[self._FIELD_CIRCUIT_BREAKER]
+
+    def get_timing_settings(self) -> Mapping[str, Any]:
+        """Get the TIMING setting used to report the duration of the exchange phases.
+
+        Returns:
+            Dict[str, Any]: Timing configuration
+        """
+        return self.snapshot.merged[self._FIELD_TIMING]
+
+    def get_metrics_settings(self) -> Mapping[str, Any]:
+        """Get the METRICS setting of the in-process metrics registry.
+
+        Returns:
+            Dict[str, Any]: Metrics configuration
+        """
+        return self.snapshot.merged[self._FIELD_METRICS]
+
+    def get_loadtest_settings(self) -> Mapping[str, Any]:
+        """Get the LOADTEST setting of the synthetic tenants handler.
+
+        Returns:
+            Dict[str, Any]: Load test configuration
+        """
+        return self.snapshot.merged[self._FIELD_LOADTEST]
+
+    def get_exchange_replay_settings(self) -> Mapping[str, Any]:
+        """Get the EXCHANGE_REPLAY setting used to answer duplicate exchanges of a code.
+
+        Returns:
+            Dict[str, Any]: Exchange replay configuration
+        """
+        return self.snapshot.merged[self._FIELD_EXCHANGE_REPLAY]
+
+    def get_single_flight_settings(self) -> Mapping[str, Any]:
+        """Get the SINGLE_FLIGHT setting used to coalesce identical IdP requests.
+
+        Returns:
+            Dict[str, Any]: Single-flight configuration
+        """
+        return self.snapshot.merged[self._FIELD_SINGLE_FLIGHT]
+
+    def get_throttle_settings(self) -> Mapping[str, Any]:
+        """Get the THROTTLE setting used to rate limit the Nexus Auth views.
+
+        Returns:
+            Dict[str, Any]: Throttle configuration
+        """
+        return self.snapshot.merged[self._FIELD_THROTTLE]
+
+    def get_provider_configurations_settings(self) -> Mapping[str, Any]:
+        """Get the PROVIDER_CONFIGURATIONS setting used to cache the configurations read from the database.
+
+        Returns:
+            Dict[str, Any]: Provider configurations cache configuration
+        """
+        return self.snapshot.merged[self._FIELD_PROVIDER_CONFIGURATIONS]
+
+    def get_warmup_settings(self) -> Mapping[str, Any]:
+        """Get the WARMUP setting used to fill the caches of all tenants ahead of their first login.
+
+        Returns:
+            Dict[str, Any]: Warm-up configuration
+        """
+        return self.snapshot.merged[self._FIELD_WARMUP]
+
+    def get_exchange_policy_settings(self, provider_type: str) -> dict[str, Any]:
+        """Get the deadline and retry policy of a provider from the EXCHANGE_POLICIES setting.
+
+        The policy of the provider type is merged over the DEFAULT policy.
+
+        Args:
+            provider_type: Type of the provider
+
+        Returns:
+            Dict[str, Any]: Exchange policy
+        """
+        policies = self.snapshot.merged[self._FIELD_EXCHANGE_POLICIES]
+        return {
+            **self.defaults[self._FIELD_EXCHANGE_POLICIES][self._DEFAULT_POLICY],
+            **policies.get(self._DEFAULT_POLICY, {}),
+            **policies.get(provider_type, {}),
         }
-        return merged_builders
+
+    def get_tenant_key(self, request: Any) -> str | None:
+        """Get the key of the tenant whose providers configuration the handler returns for a request.
+
+        The key is computed by the function set in NEXUS_AUTH.TENANT_KEY_FUNC. Without it, all
+        requests share the same key when the static CONFIG setting is used, and the tenant is
+        unknown when a custom handler is used.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            Optional[str]: Tenant key, or ``None`` if the tenant cannot be identified.
+        """
+        snapshot = self.snapshot
+        if snapshot.tenant_key_func:
+            tenant_key = snapshot.tenant_key_func(request)
+            return None if tenant_key is None else str(tenant_key)
+        if snapshot.uses_default_handler:
+            return ""
+        return None
+
+    def get_eager_provider_builders(self) -> bool:
+        """Get the EAGER_PROVIDER_BUILDERS setting.
+
+        Returns:
+            bool: Whether the provider builders are imported when the app is ready
+        """
+        return self._get_user_settings().get(
+            self._FIELD_EAGER_BUILDERS, self.defaults[self._FIELD_EAGER_BUILDERS]
+        )
 
 
 DEFAULTS = {
@@ -85,6 +392,112 @@ DEFAULTS = {
     "PROVIDER_BUILDERS": {
         "google": "nexus_auth.providers.google.GoogleOAuth2ProviderBuilder",
         "microsoft_tenant": "nexus_auth.providers.microsoft.MicrosoftEntraTenantOAuth2ProviderBuilder",
+        "oidc": "nexus_auth.providers.oidc.OpenIDConnectProviderBuilder",
+    },
+    "HTTP": {
+        "POOL_CONNECTIONS": 10,
+        "POOL_MAXSIZE": 10,
+        "POOL_BLOCK": False,
+        "MAX_RETRIES": 2,
+        "BACKOFF_FACTOR": 0.1,
+        "CONNECT_TIMEOUT": 3.05,
+        "READ_TIMEOUT": 10,
+    },
+    "CACHE_ALIAS": "default",
+    "DISCOVERY_CACHE": {
+        "TTL": 3600,
+        "MAX_ENTRIES": 1024,
+    },
+    "JWKS_CACHE": {
+        "TTL": 3600,
+        "MAX_ENTRIES": 1024,
+        "MIN_REFRESH_INTERVAL": 60,
+        "REFRESH_WAIT": 2,
+    },
+    "ID_TOKEN_VERIFICATION": {
+        "ENABLED": True,
+        "ALGORITHMS": ["RS256"],
+        "LEEWAY": 60,
+    },
+    "PROVIDER_CACHE": {
+        "MAX_ENTRIES": 4096,
+    },
+    "EAGER_PROVIDER_BUILDERS": False,
+    "PROVIDERS_RESPONSE": {
+        "CACHE_TTL": 300,
+        "MAX_AGE": 300,
+        "PUBLIC": False,
+        "VARY": [],
+    },
+    "TENANT_KEY_FUNC": None,
+    "USER_LOOKUP": {
+        "STRATEGY": "iexact",
+        # None loads all the user fields
+        "EXTRA_FIELDS": None,
+    },
+    "SUBJECT_LINKS": {
+        "ENABLED": False,
+    },
+    "LAST_LOGIN": {
+        "WRITE_BEHIND": False,
+        "BACKEND": "memory",
+        "FLUSH_INTERVAL": 5,
+        "FLUSH_SIZE": 500,
+    },
+    "CIRCUIT_BREAKER": {
+        "ENABLED": False,
+        "WINDOW": 60,
+        "MIN_CALLS": 20,
+        "FAILURE_RATE": 0.5,
+        "SLOW_CALL_DURATION": 5,
+        "SLOW_CALL_RATE": 0.8,
+        "OPEN_DURATION": 30,
+    },
+    "EXCHANGE_POLICIES": {
+        "DEFAULT": {
+            "DEADLINE": 15,
+            "RETRIES": 2,
+            "BACKOFF_BASE": 0.2,
+            "BACKOFF_MAX": 2,
+            "RETRY_STATUSES": [429, 503],
+        },
+    },
+    "TIMING": {
+        "SERVER_TIMING": False,
+    },
+    "METRICS": {
+        "MAX_SERIES": 1000,
+    },
+    "LOADTEST": {
+        "STUB_URL": None,
+        "TENANT_HEADER": "X-Nexus-Tenant",
+    },
+    "EXCHANGE_REPLAY": {
+        "ENABLED": False,
+        "TTL": 60,
+        "WAIT": 15,
+    },
+    "SINGLE_FLIGHT": {
+        "ENABLED": False,
+        "SHARED": False,
+        "WAIT": 10,
+        "RESULT_TTL": 5,
+    },
+    "THROTTLE": {
+        "TENANT_RATE": None,
+        "TENANT_RATES": {},
+        "IP_RATE": None,
+    },
+    "PROVIDER_CONFIGURATIONS": {
+        "CACHE_TTL": 300,
+        "LOCAL_TTL": 30,
+        "MAX_ENTRIES": 1024,
+        "ADMIN": True,
+    },
+    "WARMUP": {
+        "ON_STARTUP": False,
+        "MAX_WORKERS": 8,
+        "PRECONNECT": True,
     },
 }
 
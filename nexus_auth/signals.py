@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent at the end of each exchange with the duration of its phases, see nexus_auth.timing.
+# Arguments: request, provider_type, timings (ExchangeTimings)
+exchange_timed = Signal()
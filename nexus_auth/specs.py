@@ -0,0 +1,139 @@
+import sys
+from collections.abc import Hashable, Iterator, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+
+from nexus_auth.cache import fingerprint
+from nexus_auth.providers.factory import providers
+
+ProviderSpecs = Mapping[str, "ProviderSpec"]
+
+# Tuples of option names, shared by the specs with the same options
+_names: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+# Options whose values are shared by many tenants, e.g. of the same issuer.
+# Secrets and other per-tenant values are never interned: interned strings
+# stay in memory as long as a spec refers to them, and are shared process-wide.
+SHARED_OPTIONS = frozenset({"issuer", "authority", "graph_url", "email_resolution"})
+
+
+def _intern(name: str, value: Any) -> Any:
+    if name in SHARED_OPTIONS and type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class ProviderSpec(Mapping):
+    """Compiled configuration of a provider.
+
+    Option names are lowercased once, when the spec is compiled. The sorted
+    names are shared by all the specs with the same options, and the values
+    of :data:`SHARED_OPTIONS` are interned, so that e.g. the tenants of the
+    same issuer share a single copy of it. A spec takes a fraction of the memory of the dict it
+    is compiled from, is a read-only mapping of the options, and compares
+    equal to a dict holding the same options.
+    """
+
+    provider_type: str
+    names: tuple[str, ...]
+    values: tuple[Any, ...]
+
+    @classmethod
+    def compile(cls, provider_type: str, config: Mapping[str, Any]) -> "ProviderSpec":
+        """Compile the configuration of a provider.
+
+        Args:
+            provider_type: Type of the provider
+            config: Provider configuration, with option names in any case
+
+        Returns:
+            ProviderSpec: Compiled configuration
+        """
+        kwargs = {name.lower(): value for name, value in config.items()}
+        names = tuple(sorted(kwargs))
+        names = _names.setdefault(names, tuple(sys.intern(name) for name in names))
+        return cls(
+            provider_type=sys.intern(provider_type),
+            names=names,
+            values=tuple(_intern(name, kwargs[name]) for name in names),
+        )
+
+    @property
+    def key(self) -> Hashable:
+        """Key of the provider built from this configuration."""
+        key = (self.provider_type, self.names, self.values)
+        try:
+            hash(key)
+        except TypeError:
+            # Options holding e.g. lists
+            return fingerprint(self.provider_type, self.kwargs)
+        return key
+
+    @property
+    def kwargs(self) -> dict[str, Any]:
+        """Options as the keyword arguments of the provider builder."""
+        return dict(zip(self.names, self.values, strict=False))
+
+    def validate(self, required: tuple[str, ...]) -> None:
+        """Check that the required options are set.
+
+        Args:
+            required: Names of the required options
+
+        Raises:
+            ImproperlyConfigured: If a required option is missing or empty
+        """
+        missing = [name for name in required if not self.get(name)]
+        if missing:
+            raise ImproperlyConfigured(
+                f"Provider '{self.provider_type}' is missing the required "
+                f"option(s): {', '.join(missing)}."
+            )
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self.values[self.names.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def compile_providers_config(config: Mapping[str, Mapping[str, Any]]) -> ProviderSpecs:
+    """Compile and validate a providers configuration.
+
+    The required options of each provider are those of its builder. Providers
+    whose builder is not registered, or cannot be imported, are compiled
+    without validation.
+
+    Args:
+        config: Providers configuration, e.g. the CONFIG setting
+
+    Returns:
+        Mapping[str, ProviderSpec]: Provider type to spec
+
+    Raises:
+        ImproperlyConfigured: If a provider is missing a required option
+    """
+    specs = {}
+    for provider_type, provider_config in config.items():
+        spec = (
+            provider_config
+            if isinstance(provider_config, ProviderSpec)
+            else ProviderSpec.compile(provider_type, provider_config)
+        )
+        try:
+            builder = providers.get_builder(provider_type)
+        except ImportError:
+            # Reported when the provider is built, like without compilation
+            builder = None
+        spec.validate(getattr(builder, "required_options", ()))
+        specs[spec.provider_type] = spec
+    return specs
@@ -0,0 +1,64 @@
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+
+from nexus_auth.settings import nexus_settings
+
+# Path of the issuer of each synthetic tenant at the stub IdP
+TENANT_ISSUER_PATH = "/tenants/{tenant}"
+
+
+def get_synthetic_tenant(request: Any) -> str | None:
+    """Get the synthetic tenant of a load test request.
+
+    Use it as the TENANT_KEY_FUNC of a deployment under load test.
+
+    Args:
+        request: HTTP request
+
+    Returns:
+        Optional[str]: Tenant set in the LOADTEST.TENANT_HEADER header
+    """
+    return request.headers.get(nexus_settings.get_loadtest_settings()["TENANT_HEADER"])
+
+
+def synthetic_tenants_handler(request: Any) -> dict[str, dict[str, str]] | None:
+    """Providers handler serving the synthetic tenants of a load test.
+
+    Each tenant gets an ``oidc`` and a ``microsoft_tenant`` provider of its
+    own, both pointing to the stub IdP at LOADTEST.STUB_URL, so that the
+    provider, discovery and JWKS caches hold one entry per tenant as they
+    would in production.
+
+    Args:
+        request: HTTP request
+
+    Returns:
+        Optional[Dict[str, Dict[str, str]]]: Providers of the tenant, ``None`` without a tenant
+
+    Raises:
+        ImproperlyConfigured: If LOADTEST.STUB_URL is not set
+    """
+    stub_url = nexus_settings.get_loadtest_settings()["STUB_URL"]
+    if not stub_url:
+        raise ImproperlyConfigured(
+            "NEXUS_AUTH.LOADTEST.STUB_URL is required by the synthetic tenants handler."
+        )
+    tenant = get_synthetic_tenant(request)
+    if not tenant:
+        return None
+    stub_url = stub_url.rstrip("/")
+    return {
+        "oidc": {
+            "client_id": f"client-{tenant}",
+            "client_secret": "stub-secret",
+            "issuer": f"{stub_url}{TENANT_ISSUER_PATH.format(tenant=tenant)}",
+        },
+        "microsoft_tenant": {
+            "client_id": f"client-{tenant}",
+            "client_secret": "stub-secret",
+            "tenant_id": tenant,
+            "authority": stub_url,
+            "graph_url": f"{stub_url}/v1.0/me",
+        },
+    }
@@ -0,0 +1,96 @@
+import bisect
+import math
+import threading
+from collections import Counter
+from typing import Any
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Get a percentile of sorted values, with the nearest-rank method.
+
+    Args:
+        sorted_values: Values in increasing order
+        fraction: Percentile between 0 and 1, e.g. 0.95
+
+    Returns:
+        float: Percentile, 0 if there are no values
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LatencyRecorder:
+    """Thread-safe recorder of the latencies and errors of a load run."""
+
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, error: str | None = None) -> None:
+        """Record a request.
+
+        Args:
+            latency: Duration of the request in seconds
+            error: Kind of error, e.g. the status code, ``None`` for a success
+        """
+        with self._lock:
+            self.latencies.append(latency)
+            if error is not None:
+                self.errors[error] += 1
+
+    def summary(self, duration: float) -> dict[str, Any]:
+        """Summarize the run.
+
+        Args:
+            duration: Wall-clock duration of the run in seconds
+
+        Returns:
+            Dict[str, Any]: Request and error counts, throughput in requests per
+            second and latency percentiles in milliseconds
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            errors = dict(self.errors)
+        return {
+            "requests": len(latencies),
+            "errors": sum(errors.values()),
+            "error_breakdown": errors,
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(latencies) / duration, 1) if duration else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2)
+                if latencies
+                else 0.0,
+                "p50": round(percentile(latencies, 0.50) * 1000, 2),
+                "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+        }
+
+    def histogram(
+        self, buckets_ms: tuple[float, ...] = DEFAULT_BUCKETS_MS
+    ) -> list[dict[str, Any]]:
+        """Build the cumulative histogram of the latencies.
+
+        Args:
+            buckets_ms: Upper bounds of the buckets, in milliseconds
+
+        Returns:
+            List[Dict[str, Any]]: Number of requests at or under each bound,
+            ending with the ``+Inf`` bucket
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+        histogram = [
+            {"le": bound, "count": bisect.bisect_right(latencies, bound / 1000)}
+            for bound in buckets_ms
+        ]
+        histogram.append({"le": "+Inf", "count": len(latencies)})
+        return histogram
@@ -0,0 +1,387 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from nexus_auth.providers.oidc import DISCOVERY_PATH
+
+ENDPOINT_DISCOVERY = "discovery"
+ENDPOINT_JWKS = "jwks"
+ENDPOINT_TOKEN = "token"
+ENDPOINT_GRAPH = "graph"
+ENDPOINTS = (ENDPOINT_DISCOVERY, ENDPOINT_JWKS, ENDPOINT_TOKEN, ENDPOINT_GRAPH)
+
+DEFAULT_EMAIL = "user@example.com"
+
+# Prefix of the access tokens, followed by the email of the user
+_ACCESS_TOKEN_PREFIX = "stub."
+
+# Token endpoint of a Microsoft Entra tenant, e.g. /{tenant}/oauth2/v2.0/token
+_TENANT_TOKEN_PATH = re.compile(r"^/(?P<tenant>[^/]+)/oauth2/v2\.0/token$")
+
+
+@dataclass
+class EndpointProfile:
+    """Latency and error profile of an endpoint of the stub IdP."""
+
+    # Delay before each response, in seconds
+    latency: float = 0.0
+    # Maximum random delay added to the latency, in seconds
+    jitter: float = 0.0
+    # Share of the requests answered with error_status, between 0 and 1
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    def apply(self) -> int | None:
+        """Wait for the latency of a request and draw its error.
+
+        Returns:
+            Optional[int]: Error status to answer with, ``None`` to answer normally
+        """
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+
+def parse_endpoint_values(values: Sequence[str]) -> dict[str, float]:
+    """Parse ``endpoint=number`` options, e.g. ``token=0.05``.
+
+    Args:
+        values: Options to parse
+
+    Returns:
+        Dict[str, float]: Numbers by endpoint
+
+    Raises:
+        ValueError: If an option is malformed or names an unknown endpoint
+    """
+    parsed = {}
+    for value in values:
+        endpoint, _, number = value.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(
+                f"Unknown endpoint in '{value}'. Expected one of: {', '.join(ENDPOINTS)}."
+            )
+        try:
+            parsed[endpoint] = float(number)
+        except ValueError as e:
+            raise ValueError(f"Invalid '{value}', expected endpoint=number.") from e
+    return parsed
+
+
+def build_profiles(
+    latency: Sequence[str] = (),
+    jitter: Sequence[str] = (),
+    error_rate: Sequence[str] = (),
+) -> dict[str, EndpointProfile]:
+    """Build the endpoint profiles from ``endpoint=number`` options.
+
+    Args:
+        latency: Latencies in seconds, e.g. ``token=0.05``
+        jitter: Jitters in seconds
+        error_rate: Error rates between 0 and 1
+
+    Returns:
+        Dict[str, EndpointProfile]: Profiles by endpoint
+
+    Raises:
+        ValueError: If an option is malformed
+    """
+    latencies = parse_endpoint_values(latency)
+    jitters = parse_endpoint_values(jitter)
+    error_rates = parse_endpoint_values(error_rate)
+    return {
+        endpoint: EndpointProfile(
+            latency=latencies.get(endpoint, 0.0),
+            jitter=jitters.get(endpoint, 0.0),
+            error_rate=error_rates.get(endpoint, 0.0),
+        )
+        for endpoint in ENDPOINTS
+    }
+
+
+class StubIdP:
+    """Local identity provider serving the endpoints used by the exchange.
+
+    Serves an OpenID Connect discovery document, a JWKS, a token endpoint and
+    a Microsoft Graph ``/v1.0/me`` endpoint, with a configurable latency and
+    error profile per endpoint. The authorization code is the email of the
+    user to log in, so that a benchmark can log in any user without a
+    browser.
+
+    Every path prefix is an issuer of its own, e.g. ``/tenants/a`` serves
+    ``/tenants/a/.well-known/openid-configuration``, so that the stub can
+    stand in for the IdPs of many tenants.
+
+    Usage:
+
+        with StubIdP(profiles={"token": EndpointProfile(latency=0.05)}) as idp:
+            settings.NEXUS_AUTH = {"CONFIG": {"oidc": idp.oidc_config()}}
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        profiles: dict[str, EndpointProfile] | None = None,
+        token_ttl: int = 3600,
+        public_url: str | None = None,
+    ) -> None:
+        """Initialize the stub IdP.
+
+        Args:
+            host: Host to listen on
+            port: Port to listen on, 0 for a free port
+            profiles: Profiles by endpoint, one of ``ENDPOINTS``
+            token_ttl: Lifetime of the issued ID tokens in seconds
+            public_url: URL of the IdP as seen by its clients, used in the
+                issuers and endpoints. Defaults to the listening address
+        """
+        unknown = set(profiles or {}) - set(ENDPOINTS)
+        if unknown:
+            raise ValueError(
+                f"Unknown endpoints {', '.join(sorted(unknown))}. "
+                f"Expected some of: {', '.join(ENDPOINTS)}."
+            )
+        self.profiles = {endpoint: EndpointProfile() for endpoint in ENDPOINTS}
+        self.profiles.update(profiles or {})
+        self.token_ttl = token_ttl
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.requests: Counter = Counter()
+        self._requests_lock = threading.Lock()
+        self._private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self._kid = "stub-key"
+        self._server = ThreadingHTTPServer((host, port), _build_handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        if self.public_url:
+            return self.public_url
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def graph_url(self) -> str:
+        return f"{self.base_url}/v1.0/me"
+
+    def start(self) -> "StubIdP":
+        """Serve the requests from a background thread.
+
+        Returns:
+            StubIdP: The started stub
+        """
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="nexus-auth-stub-idp", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StubIdP":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def oidc_config(self, client_id: str = "stub-client") -> dict[str, str]:
+        """Build the configuration of an ``oidc`` provider using the stub.
+
+        Args:
+            client_id: Client ID of the provider
+
+        Returns:
+            Dict[str, str]: Provider configuration, for the CONFIG setting or a providers handler
+        """
+        return {
+            "client_id": client_id,
+            "client_secret": "stub-secret",
+            "issuer": self.base_url,
+        }
+
+    def microsoft_config(
+        self,
+        client_id: str = "stub-client",
+        tenant_id: str = "stub-tenant",
+        email_resolution: str = "graph",
+    ) -> dict[str, str]:
+        """Build the configuration of a ``microsoft_tenant`` provider using the stub.
+
+        Args:
+            client_id: Client ID of the provider
+            tenant_id: Tenant ID of the provider
+            email_resolution: Email resolution strategy of the provider
+
+        Returns:
+            Dict[str, str]: Provider configuration, for the CONFIG setting or a providers handler
+        """
+        return {
+            "client_id": client_id,
+            "client_secret": "stub-secret",
+            "tenant_id": tenant_id,
+            "email_resolution": email_resolution,
+            "authority": self.base_url,
+            "graph_url": self.graph_url,
+        }
+
+    def get_discovery_document(self, prefix: str = "") -> dict[str, Any]:
+        """Get the discovery document of an issuer of the stub.
+
+        Args:
+            prefix: Path of the issuer, e.g. ``/tenants/a`` for a synthetic tenant
+
+        Returns:
+            Dict[str, Any]: Discovery document
+        """
+        issuer = f"{self.base_url}{prefix}"
+        return {
+            "issuer": issuer,
+            "authorization_endpoint": f"{issuer}/authorize",
+            "token_endpoint": f"{issuer}/token",
+            "jwks_uri": f"{issuer}/keys",
+        }
+
+    def get_jwks(self) -> dict[str, Any]:
+        jwk = json.loads(
+            jwt.algorithms.RSAAlgorithm.to_jwk(self._private_key.public_key())
+        )
+        jwk.update({"kid": self._kid, "use": "sig", "alg": "RS256"})
+        return {"keys": [jwk]}
+
+    def issue_tokens(self, path: str, form: dict[str, str]) -> dict[str, Any]:
+        """Issue the tokens of an authorization code.
+
+        Args:
+            path: Path of the token request, which selects the tenant of Microsoft Entra
+            form: Form data of the token request
+
+        Returns:
+            Dict[str, Any]: Token response
+        """
+        code = form.get("code", "")
+        email = code if "@" in code else DEFAULT_EMAIL
+        subject = hashlib.sha256(email.encode()).hexdigest()[:32]
+        now = int(time.time())
+        claims = {
+            # The issuer is the path of the token endpoint, e.g. /tenants/a/token
+            "iss": f"{self.base_url}{path.removesuffix('/token')}",
+            "aud": form.get("client_id", ""),
+            "sub": subject,
+            "oid": subject,
+            "email": email,
+            "iat": now,
+            "exp": now + self.token_ttl,
+        }
+        match = _TENANT_TOKEN_PATH.match(path)
+        if match:
+            tenant = match.group("tenant")
+            claims.update(iss=f"{self.base_url}/{tenant}/v2.0", tid=tenant)
+        id_token = jwt.encode(
+            claims, self._private_key, algorithm="RS256", headers={"kid": self._kid}
+        )
+        return {
+            "token_type": "Bearer",
+            "expires_in": self.token_ttl,
+            "access_token": f"{_ACCESS_TOKEN_PREFIX}{email}",
+            "id_token": id_token,
+        }
+
+    def get_user(self, authorization: str) -> dict[str, Any] | None:
+        """Get the Graph user of an access token.
+
+        Args:
+            authorization: Authorization header of the request
+
+        Returns:
+            Optional[Dict[str, Any]]: User, ``None`` if the access token is invalid
+        """
+        token = authorization.removeprefix("Bearer ")
+        if not token.startswith(_ACCESS_TOKEN_PREFIX):
+            return None
+        email = token.removeprefix(_ACCESS_TOKEN_PREFIX)
+        return {"userPrincipalName": email, "mail": email}
+
+    def _count(self, endpoint: str) -> None:
+        with self._requests_lock:
+            self.requests[endpoint] += 1
+
+
+def _build_handler(idp: StubIdP) -> type[BaseHTTPRequestHandler]:
+    class StubIdPRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            path = urlsplit(self.path).path
+            if path.endswith(DISCOVERY_PATH):
+                prefix = path.removesuffix(DISCOVERY_PATH)
+                self._respond(
+                    ENDPOINT_DISCOVERY, lambda: idp.get_discovery_document(prefix)
+                )
+            elif path.endswith("/keys"):
+                self._respond(ENDPOINT_JWKS, idp.get_jwks)
+            elif path.endswith("/v1.0/me"):
+                self._respond(
+                    ENDPOINT_GRAPH,
+                    lambda: idp.get_user(self.headers.get("Authorization", "")),
+                )
+            else:
+                self._send_json(404, {"error": "not_found"})
+
+        def do_POST(self) -> None:
+            path = urlsplit(self.path).path
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode()
+            if not path.endswith("/token"):
+                self._send_json(404, {"error": "not_found"})
+                return
+            form = {key: values[0] for key, values in parse_qs(body).items()}
+            self._respond(ENDPOINT_TOKEN, lambda: idp.issue_tokens(path, form))
+
+        def _respond(self, endpoint: str, build_body) -> None:
+            idp._count(endpoint)
+            error_status = idp.profiles[endpoint].apply()
+            if error_status is not None:
+                self._send_json(error_status, {"error": "stub_error"})
+                return
+            body = build_body()
+            if body is None:
+                self._send_json(401, {"error": "invalid_token"})
+                return
+            self._send_json(200, body)
+
+        def _send_json(self, status: int, data: dict[str, Any]) -> None:
+            payload = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Keep the benchmark output readable
+            pass
+
+    return StubIdPRequestHandler
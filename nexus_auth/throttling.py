@@ -0,0 +1,206 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+from nexus_auth.cache import get_shared_cache, make_key
+from nexus_auth.metrics import throttled_requests
+from nexus_auth.settings import nexus_settings
+
+THROTTLE_NAMESPACE = "throttle"
+
+# Seconds of each period of a rate, e.g. "100/min"
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """Parse a rate in the format of DRF's throttles, e.g. ``100/min``.
+
+    Args:
+        rate: Number of requests per second, minute, hour or day
+
+    Returns:
+        Tuple[int, int]: Number of requests and duration of the period in seconds
+
+    Raises:
+        ImproperlyConfigured: If the rate is malformed
+    """
+    try:
+        num, period = rate.split("/")
+        return int(num), _PERIODS[period[0]]
+    except (AttributeError, ValueError, KeyError, IndexError) as e:
+        raise ImproperlyConfigured(
+            f"Invalid rate '{rate}'. Expected e.g. '100/min'."
+        ) from e
+
+
+class TokenBucket:
+    """Token bucket stored in the shared Django cache.
+
+    The bucket holds ``capacity`` tokens and gains one every
+    ``period / capacity`` seconds. It is stored as a single integer, the time
+    at which it will be full again (the theoretical arrival time of the
+    generic cell rate algorithm), and updated with the atomic ``incr`` of the
+    cache, so concurrent requests of all workers cannot overdraw it. The
+    entry expires once the bucket is full.
+    """
+
+    def __init__(self, key: str, capacity: int, period: float) -> None:
+        """Initialize the bucket.
+
+        Args:
+            key: Cache key of the bucket
+            capacity: Maximum number of tokens, i.e. of requests in a burst
+            period: Seconds to refill the bucket from empty
+        """
+        self.key = key
+        # Milliseconds per token, and the furthest the bucket may run ahead of now
+        self.interval = max(round(period * 1000 / capacity), 1)
+        self.tolerance = self.interval * capacity
+
+    def consume(self) -> float | None:
+        """Take a token from the bucket.
+
+        Returns:
+            Optional[float]: ``None`` if a token was taken, otherwise the
+            seconds until the next token is available
+        """
+        cache = get_shared_cache()
+        now = math.floor(time.time() * 1000)
+        if cache.add(self.key, now + self.interval, self._timeout(self.interval)):
+            return None
+        try:
+            arrival = cache.incr(self.key, self.interval)
+            # The entry outlives the moment the bucket is full, so the arrival
+            # time may be in the past: it starts from now, as max(tat, now)
+            # of GCRA, so that the bucket never holds more than its capacity.
+            # Concurrent requests may each move it forward, erring on the side
+            # of throttling.
+            if arrival - self.interval < now:
+                arrival = cache.incr(self.key, now - (arrival - self.interval))
+        except ValueError:
+            # The bucket expired since the add, so it is full
+            return None
+        if arrival - now > self.tolerance:
+            try:
+                cache.decr(self.key, self.interval)
+            except ValueError:
+                pass
+            return (arrival - now - self.tolerance) / 1000
+        cache.touch(self.key, self._timeout(arrival - now))
+        return None
+
+    def _timeout(self, delay: int) -> int:
+        # Keep the entry a little longer than the bucket takes to fill up
+        return math.ceil(max(delay, 0) / 1000) + 1
+
+
+class TokenBucketThrottle(BaseThrottle, ABC):
+    """Base class of the token bucket throttles of the Nexus Auth views.
+
+    The limits are read from the THROTTLE setting, and a throttle without
+    a rate lets every request through without touching the cache. Each
+    view has its own buckets, named after its ``rate_limit_scope``.
+    """
+
+    # Kind of limit, e.g. "tenant"
+    limit = ""
+
+    def __init__(self) -> None:
+        self.wait_time: float | None = None
+
+    @abstractmethod
+    def get_bucket_ident(self, request: Any) -> str | None:
+        """Get the identifier of the bucket the request draws from.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            Optional[str]: Identifier, ``None`` to let the request through
+        """
+
+    @abstractmethod
+    def get_rate(self, ident: str) -> str | None:
+        """Get the rate of a bucket.
+
+        Args:
+            ident: Identifier of the bucket
+
+        Returns:
+            Optional[str]: Rate, e.g. ``100/min``, ``None`` for no limit
+        """
+
+    def allow_request(self, request: Any, view: Any) -> bool:
+        ident = self.get_bucket_ident(request)
+        rate = self.get_rate(ident) if ident is not None else None
+        if not rate:
+            return True
+        capacity, period = parse_rate(rate)
+        scope = getattr(view, "rate_limit_scope", view.__class__.__name__)
+        bucket = TokenBucket(
+            make_key(THROTTLE_NAMESPACE, scope, self.limit, ident), capacity, period
+        )
+        self.wait_time = bucket.consume()
+        if self.wait_time is None:
+            return True
+        throttled_requests.inc(view=scope, limit=self.limit)
+        return False
+
+    def wait(self) -> float | None:
+        return self.wait_time
+
+
+class TenantRateThrottle(TokenBucketThrottle):
+    """Limit the requests of each tenant, as identified by TENANT_KEY_FUNC.
+
+    Requests of an unknown tenant are not limited by this throttle. With the
+    static CONFIG setting, all requests belong to the same tenant.
+    """
+
+    limit = "tenant"
+
+    def get_bucket_ident(self, request: Any) -> str | None:
+        throttle_settings = nexus_settings.get_throttle_settings()
+        if (
+            not throttle_settings["TENANT_RATE"]
+            and not throttle_settings["TENANT_RATES"]
+        ):
+            return None
+        return nexus_settings.get_tenant_key(request)
+
+    def get_rate(self, ident: str) -> str | None:
+        throttle_settings = nexus_settings.get_throttle_settings()
+        return throttle_settings["TENANT_RATES"].get(
+            ident, throttle_settings["TENANT_RATE"]
+        )
+
+
+class IPRateThrottle(TokenBucketThrottle):
+    """Limit the requests of each client IP address.
+
+    The address is read like DRF's throttles do, from the
+    ``X-Forwarded-For`` header according to the ``NUM_PROXIES`` setting.
+    """
+
+    limit = "ip"
+
+    def get_bucket_ident(self, request: Any) -> str | None:
+        if not nexus_settings.get_throttle_settings()["IP_RATE"]:
+            return None
+        return self.get_ident(request)
+
+    def get_rate(self, ident: str) -> str | None:
+        return nexus_settings.get_throttle_settings()["IP_RATE"]
+
+
+def get_rate_limit_throttles() -> list[TokenBucketThrottle]:
+    """Get the throttles applied to the Nexus Auth views on top of DRF's defaults.
+
+    Returns:
+        List[TokenBucketThrottle]: Tenant and client IP throttles
+    """
+    return [TenantRateThrottle(), IPRateThrottle()]
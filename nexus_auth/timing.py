@@ -0,0 +1,128 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from nexus_auth.settings import nexus_settings
+from nexus_auth.signals import exchange_timed
+
+# Phases of an exchange, in order
+PHASE_VALIDATE = "validate"
+PHASE_CONFIG = "config"
+PHASE_PROVIDER = "provider"
+PHASE_TOKEN = "token"
+PHASE_GRAPH = "graph"
+PHASE_ID_TOKEN = "id_token"
+PHASE_USER = "user"
+PHASE_JWT = "jwt"
+PHASE_SIGNAL = "signal"
+
+
+class ExchangeTimings:
+    """Durations of the phases of an exchange, in seconds.
+
+    A phase run several times, e.g. the user queries of a first login with
+    subject links, is reported as the sum of its runs.
+    """
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        self.started_at = time.perf_counter()
+        self.total: float | None = None
+
+    def add(self, phase: str, duration: float) -> None:
+        """Add the duration of a run of a phase.
+
+        Args:
+            phase: Name of the phase
+            duration: Duration in seconds
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def stop(self) -> None:
+        """Record the total duration of the exchange."""
+        self.total = time.perf_counter() - self.started_at
+
+    def as_server_timing(self) -> str:
+        """Format the timings as a ``Server-Timing`` header value.
+
+        Returns:
+            str: Header value, with the durations in milliseconds
+        """
+        metrics = [
+            f"{phase};dur={duration * 1000:.1f}"
+            for phase, duration in self.phases.items()
+        ]
+        if self.total is not None:
+            metrics.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_current_timings: ContextVar[ExchangeTimings | None] = ContextVar(
+    "nexus_auth_exchange_timings", default=None
+)
+
+
+def is_timing_enabled() -> bool:
+    """Check whether the exchange timings are reported anywhere.
+
+    Returns:
+        bool: Whether the Server-Timing header is enabled or the signal has receivers
+    """
+    return (
+        nexus_settings.get_timing_settings()["SERVER_TIMING"]
+        or exchange_timed.has_listeners()
+    )
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Time the block as a phase of the exchange in progress.
+
+    Does nothing outside of an exchange, or if timing is disabled.
+
+    Args:
+        phase: Name of the phase
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+@contextmanager
+def time_exchange(
+    sender: Any, request: Any, provider_type: str
+) -> Iterator[ExchangeTimings | None]:
+    """Collect the timings of the phases run in the block and send exchange_timed.
+
+    Args:
+        sender: View running the exchange
+        request: HTTP request of the exchange
+        provider_type: Type of the provider
+
+    Yields:
+        Optional[ExchangeTimings]: Timings, ``None`` if timing is disabled
+    """
+    if not is_timing_enabled():
+        yield None
+        return
+    timings = ExchangeTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+        timings.stop()
+        exchange_timed.send_robust(
+            sender=sender,
+            request=request,
+            provider_type=provider_type,
+            timings=timings,
+        )
@@ -0,0 +1,335 @@
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.base_user import AbstractBaseUser
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from django.db.migrations.operations import AddIndex
+from django.db.models.functions import Lower
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from nexus_auth.models import ProviderSubjectLink
+from nexus_auth.settings import nexus_settings
+
+if TYPE_CHECKING:
+    from nexus_auth.providers.base import ProviderIdentity
+
+LOOKUP_IEXACT = "iexact"
+LOOKUP_NORMALIZED = "normalized"
+LOOKUP_LOWER = "lower"
+
+UserLookup = Callable[[models.QuerySet, str], models.QuerySet]
+
+
+def normalize_email(email: str) -> str:
+    """Normalize an email address for the ``normalized`` lookup.
+
+    Args:
+        email: Email address returned by the IdP
+
+    Returns:
+        str: Lowercased email address without surrounding whitespace
+    """
+    return email.strip().lower()
+
+
+def iexact_lookup(queryset: models.QuerySet, email: str) -> models.QuerySet:
+    """Match the email case-insensitively.
+
+    On PostgreSQL, this compares ``UPPER(email)`` and cannot use a plain index
+    on the email column.
+    """
+    return queryset.filter(
+        **{f"{get_user_model().get_email_field_name()}__iexact": email}
+    )
+
+
+def normalized_lookup(queryset: models.QuerySet, email: str) -> models.QuerySet:
+    """Match the normalized email exactly, using a plain index on the email column.
+
+    Requires the emails to be stored normalized, see :func:`normalize_email`.
+    """
+    return queryset.filter(
+        **{get_user_model().get_email_field_name(): normalize_email(email)}
+    )
+
+
+def lower_lookup(queryset: models.QuerySet, email: str) -> models.QuerySet:
+    """Match ``LOWER(email)``, using the index created by :func:`add_lower_email_index`."""
+    email_field = get_user_model().get_email_field_name()
+    return queryset.alias(nexus_auth_email_lower=Lower(email_field)).filter(
+        nexus_auth_email_lower=email.strip().lower()
+    )
+
+
+USER_LOOKUPS: dict[str, UserLookup] = {
+    LOOKUP_IEXACT: iexact_lookup,
+    LOOKUP_NORMALIZED: normalized_lookup,
+    LOOKUP_LOWER: lower_lookup,
+}
+
+
+def get_user_lookup() -> UserLookup:
+    """Get the lookup set in NEXUS_AUTH.USER_LOOKUP.STRATEGY.
+
+    Returns:
+        UserLookup: Function filtering a user queryset by email
+
+    Raises:
+        ImproperlyConfigured: If the strategy is neither a built-in lookup nor a dotted path
+    """
+    strategy = nexus_settings.get_user_lookup_settings()["STRATEGY"]
+    if strategy in USER_LOOKUPS:
+        return USER_LOOKUPS[strategy]
+    try:
+        return import_string(strategy)
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            f"Invalid USER_LOOKUP strategy '{strategy}'. Expected one of "
+            f"{', '.join(USER_LOOKUPS)} or the dotted path of a function."
+        ) from e
+
+
+def get_user_fields() -> list[str] | None:
+    """Get the user fields needed to check the user and mint the JWT tokens.
+
+    Only the fields of projects setting NEXUS_AUTH.USER_LOOKUP.EXTRA_FIELDS
+    are restricted, since the ``user_logged_in`` receivers, e.g. the one
+    saving ``last_login``, read other fields of the user.
+
+    Returns:
+        Optional[List[str]]: Field names, including EXTRA_FIELDS, or ``None``
+        to load all the fields if EXTRA_FIELDS is not set
+    """
+    extra_fields = nexus_settings.get_user_lookup_settings()["EXTRA_FIELDS"]
+    if extra_fields is None:
+        return None
+    User = get_user_model()
+    fields = [User._meta.pk.name, jwt_settings.USER_ID_FIELD, "is_active"]
+    if jwt_settings.CHECK_REVOKE_TOKEN:
+        fields.append("password")
+    fields.extend(extra_fields)
+
+    concrete_fields = []
+    for field in dict.fromkeys(fields):
+        try:
+            User._meta.get_field(field)
+        except FieldDoesNotExist:
+            # e.g. is_active is a plain attribute of AbstractBaseUser
+            continue
+        concrete_fields.append(field)
+    return concrete_fields
+
+
+def _get_users() -> models.QuerySet:
+    queryset = get_user_model()._default_manager.all()
+    fields = get_user_fields()
+    return queryset if fields is None else queryset.only(*fields)
+
+
+def get_user_queryset(email: str) -> models.QuerySet:
+    """Get the queryset matching the user of an email address.
+
+    Args:
+        email: Email address returned by the IdP
+
+    Returns:
+        QuerySet: Users matching the email, loading only the needed fields
+        if EXTRA_FIELDS is set
+    """
+    return get_user_lookup()(_get_users(), email)
+
+
+def get_user_by_email(email: str) -> AbstractBaseUser:
+    """Get the user of an email address.
+
+    Args:
+        email: Email address returned by the IdP
+
+    Returns:
+        AbstractBaseUser: Matching user
+
+    Raises:
+        User.DoesNotExist: If no user matches the email
+        User.MultipleObjectsReturned: If several users match the email
+    """
+    return get_user_queryset(email).get()
+
+
+async def aget_user_by_email(email: str) -> AbstractBaseUser:
+    """Async version of :func:`get_user_by_email`.
+
+    Args:
+        email: Email address returned by the IdP
+
+    Returns:
+        AbstractBaseUser: Matching user
+
+    Raises:
+        User.DoesNotExist: If no user matches the email
+        User.MultipleObjectsReturned: If several users match the email
+    """
+    return await get_user_queryset(email).aget()
+
+
+def get_user_by_pk(pk: Any) -> AbstractBaseUser:
+    """Get a user by primary key, loading only the needed fields if EXTRA_FIELDS is set.
+
+    Args:
+        pk: Primary key of the user
+
+    Returns:
+        AbstractBaseUser: User
+
+    Raises:
+        User.DoesNotExist: If the user does not exist
+    """
+    return _get_users().get(pk=pk)
+
+
+async def aget_user_by_pk(pk: Any) -> AbstractBaseUser:
+    """Async version of :func:`get_user_by_pk`.
+
+    Args:
+        pk: Primary key of the user
+
+    Returns:
+        AbstractBaseUser: User
+
+    Raises:
+        User.DoesNotExist: If the user does not exist
+    """
+    return await _get_users().aget(pk=pk)
+
+
+def _get_link_queryset(provider_type: str, identity: "ProviderIdentity"):
+    queryset = ProviderSubjectLink.objects.select_related("user")
+    fields = get_user_fields()
+    if fields is not None:
+        queryset = queryset.only("user", *(f"user__{field}" for field in fields))
+    return queryset.filter(
+        provider_type=provider_type,
+        tenant=identity.tenant,
+        subject=identity.subject,
+    )
+
+
+def get_linked_user(
+    provider_type: str, identity: "ProviderIdentity"
+) -> AbstractBaseUser | None:
+    """Get the user linked to an identity by a previous login.
+
+    Args:
+        provider_type: Type of the provider
+        identity: Identity returned by the provider
+
+    Returns:
+        Optional[AbstractBaseUser]: Linked user, ``None`` if the identity is not linked yet.
+    """
+    if not identity.subject:
+        return None
+    link = _get_link_queryset(provider_type, identity).first()
+    return link.user if link else None
+
+
+async def aget_linked_user(
+    provider_type: str, identity: "ProviderIdentity"
+) -> AbstractBaseUser | None:
+    """Async version of :func:`get_linked_user`.
+
+    Args:
+        provider_type: Type of the provider
+        identity: Identity returned by the provider
+
+    Returns:
+        Optional[AbstractBaseUser]: Linked user, ``None`` if the identity is not linked yet.
+    """
+    if not identity.subject:
+        return None
+    link = await _get_link_queryset(provider_type, identity).afirst()
+    return link.user if link else None
+
+
+def link_user(
+    provider_type: str, identity: "ProviderIdentity", user: AbstractBaseUser
+) -> None:
+    """Link an identity to the user it was matched to by email.
+
+    Identities without a subject are not linked. An existing link is kept.
+
+    Args:
+        provider_type: Type of the provider
+        identity: Identity returned by the provider
+        user: User matching the email of the identity
+    """
+    if identity.subject:
+        # Concurrent first logins of the same user may race to create the link
+        ProviderSubjectLink.objects.bulk_create(
+            [
+                ProviderSubjectLink(
+                    provider_type=provider_type,
+                    tenant=identity.tenant,
+                    subject=identity.subject,
+                    user=user,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+
+async def alink_user(
+    provider_type: str, identity: "ProviderIdentity", user: AbstractBaseUser
+) -> None:
+    """Async version of :func:`link_user`.
+
+    Args:
+        provider_type: Type of the provider
+        identity: Identity returned by the provider
+        user: User matching the email of the identity
+    """
+    if identity.subject:
+        await ProviderSubjectLink.objects.abulk_create(
+            [
+                ProviderSubjectLink(
+                    provider_type=provider_type,
+                    tenant=identity.tenant,
+                    subject=identity.subject,
+                    user=user,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def add_lower_email_index(
+    model_name: str,
+    name: str,
+    field_name: str = "email",
+    concurrently: bool = False,
+) -> AddIndex:
+    """Build the migration operation creating the index used by the ``lower`` lookup.
+
+    Add it to a migration of the app defining the user model:
+
+        operations = [
+            add_lower_email_index("user", name="user_email_lower_idx"),
+        ]
+
+    Args:
+        model_name: Name of the user model
+        name: Name of the index
+        field_name: Name of the email field
+        concurrently: Create the index without locking the table, on PostgreSQL only.
+            The migration must then set ``atomic = False``.
+
+    Returns:
+        AddIndex: Migration operation
+    """
+    index = models.Index(Lower(field_name), name=name)
+    if concurrently:
+        from django.contrib.postgres.operations import AddIndexConcurrently
+
+        return AddIndexConcurrently(model_name=model_name, index=index)
+    return AddIndex(model_name=model_name, index=index)
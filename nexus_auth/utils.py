@@ -1,19 +1,34 @@
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
+
+from django.core.signals import setting_changed
 from rest_framework.request import Request
 
 from nexus_auth.exceptions import NoActiveProviderError
-from nexus_auth.providers.base import OAuth2IdentityProvider
 from nexus_auth.providers.factory import providers
 from nexus_auth.settings import nexus_settings
+from nexus_auth.specs import ProviderSpec, ProviderSpecs, compile_providers_config
+
+if TYPE_CHECKING:
+    from nexus_auth.providers.base import OAuth2IdentityProvider
+
+# Compiled CONFIG setting, dropped when the NEXUS_AUTH setting changes
+_static_specs: ProviderSpecs | None = None
 
 
 def build_oauth_provider(
-    provider_type: str, providers_config: dict[str, dict[str, str]]
-) -> OAuth2IdentityProvider | None:
+    provider_type: str, providers_config: Mapping[str, Mapping[str, str]] | None
+) -> "OAuth2IdentityProvider | None":
     """Build an OAuth provider object by provider type.
 
+    Compiled configurations, as returned by :func:`load_providers_config` and
+    :class:`~nexus_auth.handlers.CachedProvidersHandler`, are used as is.
+    Plain dicts are compiled on each call.
+
     Args:
         provider_type: Type of provider to get
-        providers_config: Providers configuration
+        providers_config: Providers configuration, ``None`` or empty if the
+            tenant has no provider
 
     Returns:
         Optional[OAuth2IdentityProvider]: The active provider if found, None if no provider exists.
@@ -21,27 +36,45 @@ def build_oauth_provider(
     Raises:
         NoActiveProviderError: If no active provider is found.
     """
+    if not providers_config:
+        raise NoActiveProviderError()
+
     provider_config = providers_config.get(provider_type)
     if not provider_config:
         raise NoActiveProviderError()
 
-    config_kwargs = {k.lower(): v for k, v in provider_config.items()}
+    if not isinstance(provider_config, ProviderSpec):
+        provider_config = ProviderSpec.compile(provider_type, provider_config)
 
-    return providers.get(
-        provider_type,
-        **config_kwargs,
-    )
+    return providers.get_from_spec(provider_config)
 
 
 def load_providers_config(
     request: Request | None = None,
-) -> dict[str, dict[str, str]]:
+) -> ProviderSpecs:
     """Load providers configuration.
 
+    The CONFIG setting is compiled on first use and shared by all requests.
+
     Args:
         request: HTTP request
 
     Returns:
-        Dict[str, Dict[str, str]]: Provider configuration
+        Mapping[str, ProviderSpec]: Provider configuration
     """
-    return nexus_settings.providers_config_setting()
+    global _static_specs
+    specs = _static_specs
+    if specs is None:
+        specs = _static_specs = compile_providers_config(
+            nexus_settings.providers_config_setting()
+        )
+    return specs
+
+
+def _reset_static_specs(*, setting: str, **kwargs) -> None:
+    global _static_specs
+    if setting == "NEXUS_AUTH":
+        _static_specs = None
+
+
+setting_changed.connect(_reset_static_specs)
@@ -1,26 +1,72 @@
+import json
+from typing import TYPE_CHECKING
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.views import View
+from rest_framework.exceptions import APIException, ParseError, Throttled
 from rest_framework.permissions import AllowAny
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from nexus_auth import metrics
+from nexus_auth.cache import (
+    fingerprint,
+    get_providers_response_key,
+    get_shared_cache,
+)
 from nexus_auth.exceptions import (
     EmailExtractionError,
+    IdentityProviderUnavailableError,
     MissingEmailFromProviderError,
     NexusAuthBaseException,
     NoActiveProviderError,
     NoAssociatedUserError,
     UserNotActiveError,
 )
-from nexus_auth.providers.base import OAuth2IdentityProvider
+from nexus_auth.metrics import record_cache_lookup, record_exchange
+from nexus_auth.providers.policy import exchange_policy
+from nexus_auth.replay import get_exchange_replay
 from nexus_auth.serializers import (
     OAuth2ExchangeSerializer,
 )
 from nexus_auth.settings import nexus_settings
+from nexus_auth.throttling import get_rate_limit_throttles
+from nexus_auth.timing import (
+    PHASE_CONFIG,
+    PHASE_JWT,
+    PHASE_PROVIDER,
+    PHASE_SIGNAL,
+    PHASE_USER,
+    PHASE_VALIDATE,
+    ExchangeTimings,
+    time_exchange,
+    timed,
+)
+from nexus_auth.users import (
+    aget_linked_user,
+    aget_user_by_email,
+    aget_user_by_pk,
+    alink_user,
+    get_linked_user,
+    get_user_by_email,
+    get_user_by_pk,
+    link_user,
+)
 from nexus_auth.utils import build_oauth_provider
 
+if TYPE_CHECKING:
+    from nexus_auth.providers.base import OAuth2IdentityProvider
+
 User = get_user_model()
 
 
@@ -28,10 +74,55 @@ class OAuthProvidersView(APIView):
     """View to get the providers"""
 
     permission_classes = (AllowAny,)
+    rate_limit_scope = "providers"
+
+    def get_throttles(self):
+        return [*super().get_throttles(), *get_rate_limit_throttles()]
 
     def get(self, request: Request) -> Response:
         """
         Retrieve active providers with authorization URLs.
+
+        The providers of each tenant are cached in the shared cache for
+        PROVIDERS_RESPONSE.CACHE_TTL seconds. Responses carry a strong ETag, so
+        that clients holding the current version get a 304 response.
+        """
+        response_settings = nexus_settings.get_providers_response_settings()
+        cache_ttl = response_settings["CACHE_TTL"]
+        cache_key = self.get_cache_key(request) if cache_ttl else None
+        shared_cache = get_shared_cache()
+
+        cached = shared_cache.get(cache_key) if cache_key else None
+        if cache_key:
+            record_cache_lookup("providers_response", hit=cached is not None)
+        if cached is None:
+            data = {"providers": self.get_providers(request)}
+            cached = (data, f'"{fingerprint(data)}"')
+            if cache_key:
+                shared_cache.set(cache_key, cached, cache_ttl)
+        data, etag = cached
+
+        response = Response(data, status=200)
+        response["ETag"] = etag
+        if response_settings["PUBLIC"]:
+            patch_cache_control(
+                response, public=True, max_age=response_settings["MAX_AGE"]
+            )
+        else:
+            patch_cache_control(
+                response, private=True, max_age=response_settings["MAX_AGE"]
+            )
+        patch_vary_headers(response, response_settings["VARY"])
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def get_providers(self, request: Request) -> list[dict[str, str]]:
+        """Build the active providers and their authorization URLs.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            List[Dict[str, str]]: Provider types and authorization URLs
         """
         providers_config = nexus_settings.get_providers_config(request=request) or {}
         providers = []
@@ -46,14 +137,77 @@ class OAuthProvidersView(APIView):
                     }
                 )
 
-        return Response({"providers": providers}, status=200)
+        return providers
+
+    def get_cache_key(self, request: Request) -> str | None:
+        """Get the shared cache key of the providers returned for a request.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            Optional[str]: Cache key, or ``None`` if the tenant of the request is unknown.
+        """
+        tenant_key = nexus_settings.get_tenant_key(request)
+        if tenant_key is None:
+            return None
+        return get_providers_response_key(tenant_key)
+
+
+class OAuthExchangeMixin:
+    """Logic shared by the sync and async exchange views."""
+
+    # Timings of the exchange in progress, None if timing is disabled
+    timings: ExchangeTimings | None = None
+    # Name of the rate limit buckets of the view, see nexus_auth.throttling
+    rate_limit_scope = "exchange"
+
+    def issue_tokens(self, request: HttpRequest, user: User) -> dict[str, str]:
+        """Mint the JWT tokens for the user and send the user_logged_in signal.
+
+        Args:
+            request: HTTP request of the exchange
+            user: Authenticated user
+
+        Returns:
+            Dict[str, str]: JWT tokens (refresh and access)
+        """
+        with timed(PHASE_JWT):
+            refresh_token = RefreshToken.for_user(user)
+            access_token = refresh_token.access_token
+            tokens = {"refresh": str(refresh_token), "access": str(access_token)}
+
+        # Trigger user_logged_in signal
+        with timed(PHASE_SIGNAL):
+            user_logged_in.send(sender=self.__class__, request=request, user=user)
+
+        return tokens
+
+    def add_server_timing(self, response: HttpResponse) -> HttpResponse:
+        """Add the timings of the exchange to the response, if TIMING.SERVER_TIMING is set.
+
+        Args:
+            response: Response of the exchange
+
+        Returns:
+            HttpResponse: Response with a ``Server-Timing`` header
+        """
+        if (
+            self.timings is not None
+            and nexus_settings.get_timing_settings()["SERVER_TIMING"]
+        ):
+            response["Server-Timing"] = self.timings.as_server_timing()
+        return response
 
 
-class OAuthExchangeView(APIView):
+class OAuthExchangeView(OAuthExchangeMixin, APIView):
     """View to exchange the authorization code with the active provider for JWT tokens."""
 
     permission_classes = (AllowAny,)
 
+    def get_throttles(self):
+        return [*super().get_throttles(), *get_rate_limit_throttles()]
+
     def post(self, request: Request, provider_type: str) -> Response:
         """
 
@@ -70,29 +224,88 @@ class OAuthExchangeView(APIView):
             NoAssociatedUserError: If no user is associated with the provider
             UserNotActiveError: If the user is not active
             EmailExtractionError: If the email cannot be extracted from the provider
+            ExchangeInProgressError: If a duplicate exchange of the code is still in progress
         """
-        serializer = OAuth2ExchangeSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with (
+            time_exchange(self.__class__, request, provider_type) as self.timings,
+            record_exchange(request, provider_type),
+        ):
+            with timed(PHASE_VALIDATE):
+                serializer = OAuth2ExchangeSerializer(data=request.data)
+                serializer.is_valid(raise_exception=True)
 
-        user = self.authenticate_user_with_provider(
-            request,
-            provider_type,
-            serializer.validated_data["code"],
-            serializer.validated_data["code_verifier"],
-            serializer.validated_data["redirect_uri"],
-        )
-        if not user.is_active:
-            raise UserNotActiveError()
+            # The IdP requests of the exchange share the deadline of the provider
+            with exchange_policy(provider_type):
+                user = self.authenticate_user_once(
+                    request,
+                    provider_type,
+                    serializer.validated_data["code"],
+                    serializer.validated_data["code_verifier"],
+                    serializer.validated_data["redirect_uri"],
+                )
+            if not user.is_active:
+                raise UserNotActiveError()
 
-        refresh_token = RefreshToken.for_user(user)
-        access_token = refresh_token.access_token
+            tokens = self.issue_tokens(request, user)
 
-        # Trigger user_logged_in signal
-        user_logged_in.send(sender=self.__class__, request=request, user=user)
+        return Response(tokens, status=200)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Error responses carry the timings too
+        return self.add_server_timing(response)
+
+    def authenticate_user_once(
+        self,
+        request: Request,
+        provider_type: str,
+        authorization_code: str,
+        code_verifier: str,
+        redirect_uri: str,
+    ) -> User:
+        """Authenticate the user, replaying the result of a duplicate exchange of the code.
+
+        Without EXCHANGE_REPLAY.ENABLED, this is :meth:`authenticate_user_with_provider`.
 
-        return Response(
-            {"refresh": str(refresh_token), "access": str(access_token)}, status=200
+        Args:
+            request: HTTP request containing the authorization code
+            provider_type: Type of provider to use
+            authorization_code: Authorization code
+            code_verifier: Code verifier
+            redirect_uri: Redirect URI
+
+        Returns:
+            User: User associated with the authorization code
+
+        Raises:
+            ExchangeInProgressError: If a duplicate exchange of the code is still in progress
+            NoAssociatedUserError: If the user resolved by a duplicate was deleted
+        """
+        replay = get_exchange_replay(
+            provider_type, authorization_code, code_verifier, redirect_uri
         )
+        if replay is None:
+            return self.authenticate_user_with_provider(
+                request, provider_type, authorization_code, code_verifier, redirect_uri
+            )
+
+        user_pk = replay.claim()
+        if user_pk is not None:
+            try:
+                with timed(PHASE_USER):
+                    return get_user_by_pk(user_pk)
+            except User.DoesNotExist as e:
+                raise NoAssociatedUserError() from e
+
+        try:
+            user = self.authenticate_user_with_provider(
+                request, provider_type, authorization_code, code_verifier, redirect_uri
+            )
+        except BaseException:
+            replay.release()
+            raise
+        replay.complete(user)
+        return user
 
     def authenticate_user_with_provider(
         self,
@@ -120,19 +333,32 @@ class OAuthExchangeView(APIView):
             NoAssociatedUserError: If no user is associated with the provider
             EmailExtractionError: If the email cannot be extracted from the provider
         """
-        providers_config = nexus_settings.get_providers_config(request=request)
-        provider: OAuth2IdentityProvider | None = build_oauth_provider(
-            provider_type, providers_config
-        )
+        with timed(PHASE_CONFIG):
+            providers_config = nexus_settings.get_providers_config(request=request)
+        with timed(PHASE_PROVIDER):
+            provider: OAuth2IdentityProvider | None = build_oauth_provider(
+                provider_type, providers_config
+            )
         if not provider:
             raise NoActiveProviderError()
 
+        if nexus_settings.get_subject_links_settings()["ENABLED"]:
+            return self.authenticate_identity_with_provider(
+                provider_type,
+                provider,
+                authorization_code,
+                code_verifier,
+                redirect_uri,
+            )
+
         try:
             email: str | None = provider.exchange_code_for_email(
                 authorization_code=authorization_code,
                 code_verifier=code_verifier,
                 redirect_uri=redirect_uri,
             )
+        except IdentityProviderUnavailableError:
+            raise
         except NexusAuthBaseException as e:
             raise EmailExtractionError() from e
 
@@ -140,9 +366,403 @@ class OAuthExchangeView(APIView):
             raise MissingEmailFromProviderError()
 
         try:
-            # Match the email case-insensitively
-            user = User.objects.get(email__iexact=email)
+            with timed(PHASE_USER):
+                user = get_user_by_email(email)
         except User.DoesNotExist as e:
             raise NoAssociatedUserError() from e
 
         return user
+
+    def authenticate_identity_with_provider(
+        self,
+        provider_type: str,
+        provider: "OAuth2IdentityProvider",
+        authorization_code: str,
+        code_verifier: str,
+        redirect_uri: str,
+    ) -> User:
+        """Exchange the authorization code with the IdP and return the user linked to the identity
+
+        Users are matched by email on their first login, then linked to their
+        subject at the IdP, so that later logins skip the email resolution.
+
+        Args:
+            provider_type: Type of provider to use
+            provider: Provider to exchange the code with
+            authorization_code: Authorization code
+            code_verifier: Code verifier
+            redirect_uri: Redirect URI
+
+        Returns:
+            User: User associated with the authorization code
+
+        Raises:
+            MissingEmailFromProviderError: If no email is returned from the provider
+            NoAssociatedUserError: If no user is associated with the provider
+            EmailExtractionError: If the identity cannot be extracted from the provider
+        """
+        try:
+            identity = provider.exchange_code_for_identity(
+                authorization_code=authorization_code,
+                code_verifier=code_verifier,
+                redirect_uri=redirect_uri,
+            )
+        except IdentityProviderUnavailableError:
+            raise
+        except NexusAuthBaseException as e:
+            raise EmailExtractionError() from e
+
+        with timed(PHASE_USER):
+            user = get_linked_user(provider_type, identity)
+        if user is not None:
+            return user
+
+        try:
+            email = provider.resolve_identity_email(identity)
+        except IdentityProviderUnavailableError:
+            raise
+        except NexusAuthBaseException as e:
+            raise EmailExtractionError() from e
+
+        if not email:
+            raise MissingEmailFromProviderError()
+
+        try:
+            with timed(PHASE_USER):
+                user = get_user_by_email(email)
+        except User.DoesNotExist as e:
+            raise NoAssociatedUserError() from e
+
+        with timed(PHASE_USER):
+            link_user(provider_type, identity, user)
+        return user
+
+
+class AsyncOAuthExchangeView(OAuthExchangeMixin, View):
+    """Async variant of OAuthExchangeView for ASGI deployments.
+
+    The IdP calls are awaited on the event loop and the user lookup goes through
+    the async ORM, so a pending login does not hold a worker thread.
+    """
+
+    http_method_names = ["post"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # The exchange is authenticated by the authorization code, not a session
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request: HttpRequest, provider_type: str) -> JsonResponse:
+        """
+
+        Args:
+            request: HTTP request containing the authorization code
+            provider_type: Type of provider to use
+
+        Returns:
+            JsonResponse: JWT tokens (refresh and access), or the error details
+        """
+        # Rejected before anything else, like the throttles of DRF views
+        try:
+            await sync_to_async(self.check_throttles)(request)
+        except Throttled as exc:
+            return self.handle_exception(exc)
+
+        with time_exchange(self.__class__, request, provider_type) as self.timings:
+            try:
+                with record_exchange(request, provider_type):
+                    with timed(PHASE_VALIDATE):
+                        serializer = OAuth2ExchangeSerializer(
+                            data=self.get_request_data(request)
+                        )
+                        serializer.is_valid(raise_exception=True)
+
+                    with exchange_policy(provider_type):
+                        user = await self.aauthenticate_user_once(
+                            request,
+                            provider_type,
+                            serializer.validated_data["code"],
+                            serializer.validated_data["code_verifier"],
+                            serializer.validated_data["redirect_uri"],
+                        )
+                    if not user.is_active:
+                        raise UserNotActiveError()
+
+                    tokens = await sync_to_async(self.issue_tokens)(request, user)
+            except APIException as exc:
+                response = self.handle_exception(exc)
+            else:
+                response = JsonResponse(tokens, status=200)
+
+        return self.add_server_timing(response)
+
+    def get_throttles(self) -> list:
+        """Get the rate limits of the view.
+
+        Returns:
+            List: Throttle instances
+        """
+        return get_rate_limit_throttles()
+
+    def check_throttles(self, request: HttpRequest) -> None:
+        """Check the rate limits of the view, as DRF's ``APIView.check_throttles`` does.
+
+        Args:
+            request: HTTP request
+
+        Raises:
+            Throttled: If a rate limit is exceeded
+        """
+        waits = [
+            throttle.wait()
+            for throttle in self.get_throttles()
+            if not throttle.allow_request(request, self)
+        ]
+        if waits:
+            raise Throttled(
+                wait=max((wait for wait in waits if wait is not None), default=None)
+            )
+
+    def get_request_data(self, request: HttpRequest) -> dict:
+        """Parse the JSON or form encoded request body.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            Dict: Request data
+
+        Raises:
+            ParseError: If the JSON body is malformed
+        """
+        if request.content_type == "application/json":
+            try:
+                return json.loads(request.body or b"{}")
+            except ValueError as e:
+                raise ParseError() from e
+        return request.POST
+
+    def handle_exception(self, exc: APIException) -> JsonResponse:
+        """Render an API exception the same way as DRF's default exception handler.
+
+        Args:
+            exc: Exception raised during the exchange
+
+        Returns:
+            JsonResponse: Error details
+        """
+        if isinstance(exc.detail, list | dict):
+            data = exc.detail
+        else:
+            data = {"detail": exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = f"{int(exc.wait)}"
+        return response
+
+    async def aauthenticate_user_once(
+        self,
+        request: HttpRequest,
+        provider_type: str,
+        authorization_code: str,
+        code_verifier: str,
+        redirect_uri: str,
+    ) -> User:
+        """Async version of :meth:`OAuthExchangeView.authenticate_user_once`.
+
+        Args:
+            request: HTTP request containing the authorization code
+            provider_type: Type of provider to use
+            authorization_code: Authorization code
+            code_verifier: Code verifier
+            redirect_uri: Redirect URI
+
+        Returns:
+            User: User associated with the authorization code
+
+        Raises:
+            ExchangeInProgressError: If a duplicate exchange of the code is still in progress
+            NoAssociatedUserError: If the user resolved by a duplicate was deleted
+        """
+        replay = get_exchange_replay(
+            provider_type, authorization_code, code_verifier, redirect_uri
+        )
+        if replay is None:
+            return await self.aauthenticate_user_with_provider(
+                request, provider_type, authorization_code, code_verifier, redirect_uri
+            )
+
+        user_pk = await replay.aclaim()
+        if user_pk is not None:
+            try:
+                with timed(PHASE_USER):
+                    return await aget_user_by_pk(user_pk)
+            except User.DoesNotExist as e:
+                raise NoAssociatedUserError() from e
+
+        try:
+            user = await self.aauthenticate_user_with_provider(
+                request, provider_type, authorization_code, code_verifier, redirect_uri
+            )
+        except BaseException:
+            await replay.arelease()
+            raise
+        await replay.acomplete(user)
+        return user
+
+    async def aauthenticate_user_with_provider(
+        self,
+        request: HttpRequest,
+        provider_type: str,
+        authorization_code: str,
+        code_verifier: str,
+        redirect_uri: str,
+    ) -> User:
+        """Async version of :meth:`OAuthExchangeView.authenticate_user_with_provider`.
+
+        Args:
+            request: HTTP request containing the authorization code
+            provider_type: Type of provider to use
+            authorization_code: Authorization code
+            code_verifier: Code verifier
+            redirect_uri: Redirect URI
+
+        Returns:
+            User: User associated with the authorization code
+
+        Raises:
+            NoActiveProviderError: If no active provider is found
+            MissingEmailFromProviderError: If no email is returned from the provider
+            NoAssociatedUserError: If no user is associated with the provider
+            EmailExtractionError: If the email cannot be extracted from the provider
+        """
+        # The handler may query the database, e.g. in multi-tenant setups
+        with timed(PHASE_CONFIG):
+            providers_config = await sync_to_async(nexus_settings.get_providers_config)(
+                request=request
+            )
+        with timed(PHASE_PROVIDER):
+            provider: OAuth2IdentityProvider | None = build_oauth_provider(
+                provider_type, providers_config
+            )
+        if not provider:
+            raise NoActiveProviderError()
+
+        if nexus_settings.get_subject_links_settings()["ENABLED"]:
+            return await self.aauthenticate_identity_with_provider(
+                provider_type,
+                provider,
+                authorization_code,
+                code_verifier,
+                redirect_uri,
+            )
+
+        try:
+            email: str | None = await provider.aexchange_code_for_email(
+                authorization_code=authorization_code,
+                code_verifier=code_verifier,
+                redirect_uri=redirect_uri,
+            )
+        except IdentityProviderUnavailableError:
+            raise
+        except NexusAuthBaseException as e:
+            raise EmailExtractionError() from e
+
+        if not email:
+            raise MissingEmailFromProviderError()
+
+        try:
+            with timed(PHASE_USER):
+                user = await aget_user_by_email(email)
+        except User.DoesNotExist as e:
+            raise NoAssociatedUserError() from e
+
+        return user
+
+    async def aauthenticate_identity_with_provider(
+        self,
+        provider_type: str,
+        provider: "OAuth2IdentityProvider",
+        authorization_code: str,
+        code_verifier: str,
+        redirect_uri: str,
+    ) -> User:
+        """Async version of :meth:`OAuthExchangeView.authenticate_identity_with_provider`.
+
+        Args:
+            provider_type: Type of provider to use
+            provider: Provider to exchange the code with
+            authorization_code: Authorization code
+            code_verifier: Code verifier
+            redirect_uri: Redirect URI
+
+        Returns:
+            User: User associated with the authorization code
+
+        Raises:
+            MissingEmailFromProviderError: If no email is returned from the provider
+            NoAssociatedUserError: If no user is associated with the provider
+            EmailExtractionError: If the identity cannot be extracted from the provider
+        """
+        try:
+            identity = await provider.aexchange_code_for_identity(
+                authorization_code=authorization_code,
+                code_verifier=code_verifier,
+                redirect_uri=redirect_uri,
+            )
+        except IdentityProviderUnavailableError:
+            raise
+        except NexusAuthBaseException as e:
+            raise EmailExtractionError() from e
+
+        with timed(PHASE_USER):
+            user = await aget_linked_user(provider_type, identity)
+        if user is not None:
+            return user
+
+        try:
+            email = await provider.aresolve_identity_email(identity)
+        except IdentityProviderUnavailableError:
+            raise
+        except NexusAuthBaseException as e:
+            raise EmailExtractionError() from e
+
+        if not email:
+            raise MissingEmailFromProviderError()
+
+        try:
+            with timed(PHASE_USER):
+                user = await aget_user_by_email(email)
+        except User.DoesNotExist as e:
+            raise NoAssociatedUserError() from e
+
+        with timed(PHASE_USER):
+            await alink_user(provider_type, identity, user)
+        return user
+
+
+class MetricsView(View):
+    """View exposing the metrics of the process in the Prometheus text format.
+
+    It is not routed by default. Include it in a URL configuration only
+    reachable by the monitoring system, as the metrics reveal the tenants
+    and the outcome of their logins.
+    """
+
+    http_method_names = ["get"]
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        """
+        Render the metrics of the process.
+
+        Args:
+            request: HTTP request
+
+        Returns:
+            HttpResponse: Metrics page
+        """
+        return HttpResponse(
+            metrics.registry.render(), content_type=metrics.CONTENT_TYPE
+        )
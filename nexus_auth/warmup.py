@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlsplit
+
+from django.core.signals import request_started
+from django.db import connections
+
+from nexus_auth.exceptions import NoActiveProviderError
+from nexus_auth.handlers import DatabaseProvidersHandler
+from nexus_auth.providers import http
+from nexus_auth.providers.factory import providers
+from nexus_auth.settings import nexus_settings
+from nexus_auth.specs import ProviderSpecs
+from nexus_auth.utils import load_providers_config
+
+logger = logging.getLogger(__name__)
+
+# Key of the error of a tenant whose configuration cannot be loaded
+CONFIGURATION_ERROR = "configuration"
+
+DISPATCH_UID = "nexus_auth.warmup.start_on_first_request"
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def _describe(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+@dataclass
+class TenantWarmup:
+    """Outcome of the warm-up of the providers of a tenant."""
+
+    # None for the static CONFIG setting
+    tenant: str | None
+    duration: float = 0.0
+    providers: list[str] = field(default_factory=list)
+    # Error of each provider that failed to warm up
+    errors: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "tenant": self.tenant,
+            "duration_ms": round(self.duration * 1000, 2),
+            "providers": self.providers,
+            "errors": self.errors,
+        }
+
+
+def get_tenant_configs() -> dict[str | None, Callable[[], ProviderSpecs | None]]:
+    """Get the providers configuration loader of every tenant known to this process.
+
+    Tenants come from the static CONFIG setting, and the
+    ``ProviderConfiguration`` model when the
+    :class:`~nexus_auth.handlers.DatabaseProvidersHandler` is used, whose
+    configurations are all read in a single query. The configurations of
+    other handlers depend on the request, so they are not warmed up.
+
+    Returns:
+        Dict[Optional[str], Callable]: Function returning the compiled
+        providers configuration of each tenant, ``None`` for the static
+        configuration
+    """
+    snapshot = nexus_settings.snapshot
+    configs: dict[str | None, Callable[[], ProviderSpecs | None]] = {}
+    if snapshot.uses_default_handler:
+        configs[None] = load_providers_config
+    handler = snapshot.handler
+    if isinstance(handler, DatabaseProvidersHandler):
+        for tenant, config in handler.preload().items():
+            # Compiled by the handler, whose cache then serves the first logins
+            configs[tenant] = lambda tenant=tenant, config=config: (
+                handler.get_tenant_config(tenant, lambda: config)
+            )
+    return configs
+
+
+class Warmup:
+    """Warm-up of the providers of many tenants on a bounded pool of threads.
+
+    Each provider is built, fills the caches its exchanges use, and the
+    connections to the endpoints it calls are opened once per origin.
+    """
+
+    def __init__(self, max_workers: int, preconnect: bool = True) -> None:
+        """Initialize the warm-up.
+
+        Args:
+            max_workers: Maximum number of tenants warmed up concurrently
+            preconnect: Whether to open the pooled connections to the IdPs
+        """
+        self.max_workers = max_workers
+        self.preconnect = preconnect
+        self.origins: set[str] = set()
+        self._lock = threading.Lock()
+
+    def run(
+        self, configs: dict[str | None, Callable[[], ProviderSpecs | None]]
+    ) -> list[TenantWarmup]:
+        """Warm up the providers of the tenants.
+
+        Args:
+            configs: Function returning the compiled providers configuration of each tenant
+
+        Returns:
+            List[TenantWarmup]: Outcome of each tenant, in the order of ``configs``
+        """
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="nexus-auth-warmup"
+        ) as executor:
+            return list(
+                executor.map(lambda item: self.warm_up_tenant(*item), configs.items())
+            )
+
+    def warm_up_tenant(
+        self, tenant: str | None, load: Callable[[], ProviderSpecs | None]
+    ) -> TenantWarmup:
+        """Warm up the providers of a tenant.
+
+        Args:
+            tenant: Key of the tenant, ``None`` for the static configuration
+            load: Function returning the compiled providers configuration of the tenant
+
+        Returns:
+            TenantWarmup: Outcome of the tenant, whose ``errors`` hold the
+            error of each failed provider, or of the configuration as a whole
+            under ``configuration``
+        """
+        result = TenantWarmup(tenant)
+        start = time.perf_counter()
+        try:
+            specs = load() or {}
+        except NoActiveProviderError:
+            specs = {}
+        except Exception as e:
+            result.errors[CONFIGURATION_ERROR] = _describe(e)
+            specs = {}
+        for provider_type, spec in specs.items():
+            try:
+                urls = providers.get_from_spec(spec).warm_up()
+                if self.preconnect:
+                    for url in urls:
+                        self._preconnect(url)
+            except Exception as e:
+                result.errors[provider_type] = _describe(e)
+            else:
+                result.providers.append(provider_type)
+        result.duration = time.perf_counter() - start
+        return result
+
+    def _preconnect(self, url: str) -> None:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if origin in self.origins:
+                return
+            # Claimed even if it fails, so an unreachable IdP is tried once
+            self.origins.add(origin)
+        http.preconnect(url)
+
+
+def warm_up(
+    tenants: Iterable[str | None] | None = None,
+    max_workers: int | None = None,
+    preconnect: bool | None = None,
+) -> list[TenantWarmup]:
+    """Warm up the providers of all tenants, or of the given ones.
+
+    Args:
+        tenants: Keys of the tenants to warm up, ``None`` for all of them
+        max_workers: Maximum number of tenants warmed up concurrently, defaults to WARMUP.MAX_WORKERS
+        preconnect: Whether to open the pooled connections, defaults to WARMUP.PRECONNECT
+
+    Returns:
+        List[TenantWarmup]: Outcome of each tenant
+    """
+    warmup_settings = nexus_settings.get_warmup_settings()
+    configs = get_tenant_configs()
+    if tenants is not None:
+        tenants = set(tenants)
+        configs = {
+            tenant: specs for tenant, specs in configs.items() if tenant in tenants
+        }
+    return Warmup(
+        max_workers=max_workers or warmup_settings["MAX_WORKERS"],
+        preconnect=(
+            warmup_settings["PRECONNECT"] if preconnect is None else preconnect
+        ),
+    ).run(configs)
+
+
+def start_warm_up() -> threading.Thread:
+    """Warm up the providers of all tenants in a background thread, e.g. at startup.
+
+    Returns:
+        threading.Thread: Thread running the warm-up
+    """
+
+    def run() -> None:
+        try:
+            results = warm_up()
+        except Exception:
+            logger.exception("Failed to warm up the providers")
+            return
+        finally:
+            # Connections are per thread, this one would never be reused
+            connections.close_all()
+        failures = [result for result in results if not result.ok]
+        logger.info(
+            "Warmed up the providers of %d tenants, %d failed",
+            len(results),
+            len(failures),
+        )
+        for result in failures:
+            logger.warning(
+                "Failed to warm up the providers of tenant %r: %s",
+                result.tenant,
+                result.errors,
+            )
+
+    thread = threading.Thread(target=run, name="nexus-auth-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def install() -> None:
+    """Start the warm-up when the process serves its first request.
+
+    Management commands such as ``migrate`` serve no requests, so they do not
+    warm up, nor query the provider configurations before their table exists.
+    """
+    request_started.connect(_start_on_first_request, dispatch_uid=DISPATCH_UID)
+
+
+def uninstall() -> None:
+    """Stop waiting for the first request, e.g. in tests."""
+    global _started
+    request_started.disconnect(dispatch_uid=DISPATCH_UID)
+    with _started_lock:
+        _started = False
+
+
+def _start_on_first_request(**kwargs) -> None:
+    global _started
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+    request_started.disconnect(dispatch_uid=DISPATCH_UID)
+    start_warm_up()
@@ -8,7 +8,11 @@ setup(
         "Django>=4.2.19",
         "djangorestframework>=3.14.0",
         "djangorestframework-simplejwt>=5.4.0",
+        "PyJWT[crypto]>=2.6.0",
     ],
+    extras_require={
+        "async": ["httpx>=0.24.0"],
+    },
     python_requires=">=3.10",
     author="Gabriel Tan",
     author_email="gabriel.tan@panevo.com",
@@ -6,6 +6,7 @@ DATABASES = {
 }
 
 INSTALLED_APPS = (
+    "django.contrib.admin",
     "django.contrib.contenttypes",
     "django.contrib.staticfiles",
     "django.contrib.auth",
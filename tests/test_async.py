@@ -0,0 +1,153 @@
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import jwt
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+
+from nexus_auth.exceptions import (
+    AccessTokenExchangeError,
+    EmailExtractionError,
+    IDTokenExchangeError,
+    InvalidTokenResponseError,
+    MicrosoftGraphAPIError,
+    MissingIDTokenError,
+    NoAssociatedUserError,
+    UserNotActiveError,
+)
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+
+User = get_user_model()
+
+
+def mock_async_client(handler):
+    """Patch the shared async client with one that answers through the given handler."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return patch("nexus_auth.providers.http.get_async_client", return_value=client)
+
+
+@pytest.fixture
+def google_provider():
+    return GoogleOAuth2Provider(client_id="test_client", client_secret="test_secret")
+
+
+@pytest.fixture
+def microsoft_provider():
+    return MicrosoftEntraTenantOAuth2Provider(client_id="test_client", client_secret="test_secret", tenant_id="test_tenant")
+
+
+def test_afetch_id_token(google_provider):
+    def handler(request):
+        assert request.url == "https://www.googleapis.com/oauth2/v4/token"
+        assert b"code_verifier=verifier" in request.content
+        return httpx.Response(200, json={"id_token": "token"})
+
+    with mock_async_client(handler):
+        token = async_to_sync(google_provider.afetch_id_token)("auth_code", "verifier", "https://redirect.url")
+    assert token == "token"
+
+
+@pytest.mark.parametrize(
+    "response, expected_exception",
+    [
+        (httpx.Response(400, json={"error": "invalid_grant"}), IDTokenExchangeError),
+        (httpx.Response(200, content=b"{"), InvalidTokenResponseError),
+        (httpx.Response(200, json={}), MissingIDTokenError),
+    ],
+)
+def test_afetch_id_token_errors(google_provider, response, expected_exception):
+    with mock_async_client(lambda request: response):
+        with pytest.raises(expected_exception):
+            async_to_sync(google_provider.afetch_id_token)("auth_code", "verifier", "https://redirect.url")
+
+
+def test_aexchange_code_for_email_google(google_provider, settings):
+    settings.NEXUS_AUTH = {"ID_TOKEN_VERIFICATION": {"ENABLED": False}}
+    id_token = jwt.encode({"email": "test_user@example.com"}, "secret", algorithm="HS256")
+    with mock_async_client(lambda request: httpx.Response(200, json={"id_token": id_token})):
+        email = async_to_sync(google_provider.aexchange_code_for_email)("auth_code", "verifier", "https://redirect.url")
+    assert email == "test_user@example.com"
+
+
+def test_aexchange_code_for_email_microsoft(microsoft_provider):
+    def handler(request):
+        if request.url.host == "graph.microsoft.com":
+            assert request.headers["Authorization"] == "Bearer access"
+            return httpx.Response(200, json={"userPrincipalName": "test_user@example.com"})
+        return httpx.Response(200, json={"access_token": "access"})
+
+    with mock_async_client(handler):
+        email = async_to_sync(microsoft_provider.aexchange_code_for_email)("auth_code", "verifier", "https://redirect.url")
+    assert email == "test_user@example.com"
+
+
+def test_afetch_access_token_error(microsoft_provider):
+    with mock_async_client(lambda request: httpx.Response(500)):
+        with pytest.raises(AccessTokenExchangeError):
+            async_to_sync(microsoft_provider.afetch_access_token)("auth_code", "verifier", "https://redirect.url")
+
+
+def test_afetch_user_email_error(microsoft_provider):
+    with mock_async_client(lambda request: httpx.Response(503)):
+        with pytest.raises(MicrosoftGraphAPIError):
+            async_to_sync(microsoft_provider.afetch_user_email)("access")
+
+
+@pytest.fixture
+def mock_aexchange():
+    """Mock the async exchange of the OAuth provider."""
+    with patch("nexus_auth.views.build_oauth_provider") as mock_build_provider:
+        provider = GoogleOAuth2Provider(client_id="test_client_id", client_secret="test_client_secret")
+        provider.aexchange_code_for_email = AsyncMock(return_value="Active@example.com")
+        mock_build_provider.return_value = provider
+        yield provider
+
+
+def post_exchange(**kwargs):
+    data = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://app.com/callback"}
+    data.update(kwargs)
+
+    async def post():
+        return await AsyncClient().post(
+            reverse("oauth-exchange", args=["google"]), data=data, content_type="application/json"
+        )
+
+    return async_to_sync(post)()
+
+
+class TestAsyncOAuthExchangeView:
+    @pytest.fixture(autouse=True)
+    def async_urls(self, settings):
+        settings.ROOT_URLCONF = "nexus_auth.async_urls"
+
+    def test_exchange_success(self, db, mock_aexchange):
+        User.objects.create_user(email="active@example.com", password="password", username="active")
+        response = post_exchange()
+        assert response.status_code == 200
+        assert set(response.json()) == {"access", "refresh"}
+
+    def test_exchange_no_user(self, db, mock_aexchange):
+        response = post_exchange()
+        assert response.status_code == NoAssociatedUserError.status_code
+        assert response.json()["detail"] == NoAssociatedUserError.default_detail
+
+    def test_exchange_inactive_user(self, db, mock_aexchange):
+        User.objects.create_user(email="active@example.com", password="password", username="active", is_active=False)
+        response = post_exchange()
+        assert response.status_code == UserNotActiveError.status_code
+
+    def test_exchange_provider_error(self, db, mock_aexchange):
+        mock_aexchange.aexchange_code_for_email.side_effect = IDTokenExchangeError
+        response = post_exchange()
+        assert response.status_code == EmailExtractionError.status_code
+        assert response.json()["detail"] == EmailExtractionError.default_detail
+
+    def test_exchange_invalid_payload(self, db, mock_aexchange):
+        response = post_exchange(code="")
+        assert response.status_code == 400
+        assert "code" in response.json()
+        mock_aexchange.aexchange_code_for_email.assert_not_called()
@@ -0,0 +1,125 @@
+from unittest.mock import patch
+
+import pytest
+import requests
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.exceptions import IDTokenExchangeError, IdentityProviderUnavailableError
+from nexus_auth.providers.breaker import CircuitBreaker, get_breaker
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+
+TOKEN_URL = "https://www.googleapis.com/oauth2/v4/token"
+
+
+@pytest.fixture(autouse=True)
+def breaker_settings(settings):
+    cache.clear()
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "CIRCUIT_BREAKER": {"ENABLED": True, "MIN_CALLS": 4, "FAILURE_RATE": 0.5, "SLOW_CALL_DURATION": 1, "OPEN_DURATION": 30},
+    }
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def provider():
+    return GoogleOAuth2Provider(client_id="test_client", client_secret="test_secret")
+
+
+def exchange(provider):
+    return provider.fetch_id_token("auth_code", "verifier", "https://redirect.url")
+
+
+def test_breaker_is_per_host():
+    assert get_breaker(f"{TOKEN_URL}?query=1").endpoint == "https://www.googleapis.com"
+
+
+@patch("requests.Session.post", side_effect=requests.exceptions.ConnectTimeout)
+def test_tenants_of_an_idp_share_the_breaker(mock_post):
+    # The failures of each tenant alone stay under MIN_CALLS
+    for tenant_id in ("tenant1", "tenant2", "tenant3", "tenant4"):
+        provider = MicrosoftEntraTenantOAuth2Provider(client_id="client", client_secret="secret", tenant_id=tenant_id)
+        with pytest.raises(IDTokenExchangeError):
+            exchange(provider)
+
+    provider = MicrosoftEntraTenantOAuth2Provider(client_id="client", client_secret="secret", tenant_id="tenant5")
+    with pytest.raises(IdentityProviderUnavailableError):
+        exchange(provider)
+    assert mock_post.call_count == 4
+
+
+def test_breaker_disabled(settings):
+    settings.NEXUS_AUTH = {}
+    assert get_breaker(TOKEN_URL) is None
+
+
+@patch("requests.Session.post", side_effect=requests.exceptions.ConnectTimeout)
+def test_opens_on_failure_rate(mock_post, provider):
+    for _ in range(4):
+        with pytest.raises(IDTokenExchangeError):
+            exchange(provider)
+
+    with pytest.raises(IdentityProviderUnavailableError) as exc_info:
+        exchange(provider)
+    assert mock_post.call_count == 4
+    assert 0 < exc_info.value.wait <= 30
+
+
+@patch("requests.Session.post")
+def test_client_errors_do_not_open(mock_post, provider):
+    mock_post.return_value.status_code = 400
+    mock_post.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError
+    for _ in range(5):
+        with pytest.raises(IDTokenExchangeError):
+            exchange(provider)
+    assert not get_breaker(TOKEN_URL).is_open
+
+
+def test_opens_on_slow_calls():
+    breaker = CircuitBreaker(TOKEN_URL)
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    breaker.record(False, 2)
+    assert not breaker.is_open
+    for _ in range(12):
+        breaker.record(False, 2)
+    assert breaker.is_open
+
+
+def test_half_open_probe():
+    breaker = CircuitBreaker(TOKEN_URL)
+    for _ in range(4):
+        breaker.record(True, 0.1)
+    assert breaker.is_open
+
+    with patch("time.time", return_value=__import__("time").time() + 31):
+        # A single worker probes the endpoint
+        assert breaker.before_call() is True
+        with pytest.raises(IdentityProviderUnavailableError):
+            breaker.before_call()
+
+        breaker.record(True, 0.1, probe=True)
+        assert breaker.is_open
+
+    with patch("time.time", return_value=__import__("time").time() + 62):
+        assert breaker.before_call() is True
+        breaker.record(False, 0.1, probe=True)
+    assert not breaker.is_open
+    assert breaker.before_call() is False
+
+
+@pytest.mark.django_db
+def test_view_returns_retry_after(provider):
+    for _ in range(4):
+        get_breaker(TOKEN_URL).record(True, 0.1)
+
+    response = APIClient().post(reverse("oauth-exchange", args=["google"]), data={
+        "code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://redirect.url",
+    })
+    assert response.status_code == 503
+    assert response.data["detail"] == IdentityProviderUnavailableError.default_detail
+    assert 0 < int(response["Retry-After"]) <= 30
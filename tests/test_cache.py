@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+from nexus_auth.cache import LRUCache, make_key
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used entry
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_entries=10, ttl=60)
+    with patch("nexus_auth.cache.time.monotonic", return_value=1000):
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=120)
+    with patch("nexus_auth.cache.time.monotonic", return_value=1090):
+        assert cache.get("a", "expired") == "expired"
+        assert cache.get("b") == 2
+
+
+def test_lru_cache_delete_and_clear():
+    cache = LRUCache(max_entries=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_make_key_is_stable_and_namespaced():
+    key = make_key("namespace", "https://idp.example.com", "tenant")
+    assert key == make_key("namespace", "https://idp.example.com", "tenant")
+    assert key != make_key("namespace", "https://idp.example.com", "other")
+    assert key.startswith("nexus_auth:namespace:")
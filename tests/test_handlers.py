@@ -0,0 +1,277 @@
+from unittest.mock import Mock
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.exceptions import NoActiveProviderError
+from nexus_auth.cache import get_provider_configurations_key
+from nexus_auth.handlers import CachedProvidersHandler, DatabaseProvidersHandler, database_providers_handler
+from nexus_auth.models import ProviderConfiguration
+
+
+TENANT_CONFIG = {
+    "tenant1": {"google": {"client_id": "tenant1_client_id", "client_secret": "secret"}},
+    "tenant2": {"google": {"client_id": "tenant2_client_id", "client_secret": "secret"}},
+}
+
+load_tenant_config = Mock(side_effect=lambda request: TENANT_CONFIG.get(request.headers.get("X-Tenant")))
+
+def get_tenant_key(request):
+    return request.headers.get("X-Tenant")
+
+providers_handler = CachedProvidersHandler(
+    f"{__name__}.load_tenant_config",
+    tenant_key_func=f"{__name__}.get_tenant_key",
+)
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    cache.clear()
+    load_tenant_config.reset_mock()
+    providers_handler.clear()
+    database_providers_handler.clear()
+    yield
+    cache.clear()
+
+
+def make_request(tenant=None):
+    headers = {"HTTP_X_TENANT": tenant} if tenant else {}
+    return RequestFactory().get("/", **headers)
+
+
+def test_configuration_is_cached_per_tenant():
+    assert providers_handler(request=make_request("tenant1")) == TENANT_CONFIG["tenant1"]
+    assert providers_handler(request=make_request("tenant1")) == TENANT_CONFIG["tenant1"]
+    assert providers_handler(request=make_request("tenant2")) == TENANT_CONFIG["tenant2"]
+    assert load_tenant_config.call_count == 2
+
+
+def test_unknown_tenant_is_not_cached():
+    assert providers_handler(request=make_request()) is None
+    assert providers_handler(request=make_request()) is None
+    assert load_tenant_config.call_count == 2
+
+
+def test_missing_configuration_is_cached():
+    assert providers_handler(request=make_request("tenant3")) is None
+    assert providers_handler(request=make_request("tenant3")) is None
+    assert load_tenant_config.call_count == 1
+
+
+def test_cache_is_bounded():
+    handler = CachedProvidersHandler(load_tenant_config, tenant_key_func=get_tenant_key, max_entries=1)
+    handler(request=make_request("tenant1"))
+    handler(request=make_request("tenant2"))
+    handler(request=make_request("tenant1"))
+    assert len(handler.cache) == 1
+    assert load_tenant_config.call_count == 3
+
+
+def test_invalidate():
+    providers_handler(request=make_request("tenant1"))
+    providers_handler(request=make_request("tenant2"))
+    providers_handler.invalidate("tenant1")
+    providers_handler(request=make_request("tenant1"))
+    providers_handler(request=make_request("tenant2"))
+    assert load_tenant_config.call_count == 3
+
+
+def test_default_tenant_key_func(settings):
+    settings.NEXUS_AUTH = {
+        "PROVIDERS_HANDLER": f"{__name__}.providers_handler",
+        "TENANT_KEY_FUNC": f"{__name__}.get_tenant_key",
+    }
+    handler = CachedProvidersHandler(load_tenant_config)
+    handler(request=make_request("tenant1"))
+    handler(request=make_request("tenant1"))
+    assert load_tenant_config.call_count == 1
+
+
+def test_views_use_cached_configuration(settings):
+    """Test that the handler and the providers response are invalidated together."""
+    settings.NEXUS_AUTH = {
+        "PROVIDERS_HANDLER": f"{__name__}.providers_handler",
+        "TENANT_KEY_FUNC": f"{__name__}.get_tenant_key",
+    }
+    client = APIClient()
+    response = client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    assert "tenant1_client_id" in response.data["providers"][0]["auth_url"]
+    client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    assert load_tenant_config.call_count == 1
+
+    providers_handler.invalidate("tenant1")
+    client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    assert load_tenant_config.call_count == 2
+
+
+@pytest.fixture
+def database_handler_settings(settings):
+    settings.NEXUS_AUTH = {
+        "PROVIDERS_HANDLER": "nexus_auth.handlers.database_providers_handler",
+        "TENANT_KEY_FUNC": f"{__name__}.get_tenant_key",
+    }
+
+
+@pytest.fixture
+def configurations(db):
+    return [
+        ProviderConfiguration.objects.create(
+            tenant="tenant1", provider_type="google", client_id="tenant1_client_id", client_secret="secret"
+        ),
+        ProviderConfiguration.objects.create(
+            tenant="tenant1",
+            provider_type="microsoft_tenant",
+            client_id="tenant1_client_id",
+            client_secret="secret",
+            options={"tenant_id": "tenant1_tenant_id"},
+        ),
+        ProviderConfiguration.objects.create(
+            tenant="tenant2", provider_type="google", client_id="tenant2_client_id", client_secret="secret", enabled=False
+        ),
+        ProviderConfiguration.objects.create(
+            tenant="", provider_type="google", client_id="default_client_id", client_secret="secret"
+        ),
+    ]
+
+
+def test_database_handler_reads_enabled_configurations(database_handler_settings, configurations):
+    config = database_providers_handler(request=make_request("tenant1"))
+    assert config == {
+        "google": {"client_id": "tenant1_client_id", "client_secret": "secret"},
+        "microsoft_tenant": {
+            "client_id": "tenant1_client_id",
+            "client_secret": "secret",
+            "tenant_id": "tenant1_tenant_id",
+        },
+    }
+    assert database_providers_handler(request=make_request("tenant2")) == {}
+    assert database_providers_handler(request=make_request("tenant3")) == {}
+    # Requests of an unknown tenant get the configurations of the "" tenant
+    assert database_providers_handler(request=make_request())["google"]["client_id"] == "default_client_id"
+
+
+def test_database_handler_queries_once_per_tenant(
+    database_handler_settings, configurations, django_assert_num_queries
+):
+    with django_assert_num_queries(2):
+        database_providers_handler(request=make_request("tenant1"))
+        database_providers_handler(request=make_request("tenant1"))
+        database_providers_handler(request=make_request("tenant3"))
+        database_providers_handler(request=make_request("tenant3"))
+
+    # Once expired in process, the configurations are read from the shared cache
+    database_providers_handler.cache.clear()
+    with django_assert_num_queries(0):
+        database_providers_handler(request=make_request("tenant1"))
+        database_providers_handler(request=make_request("tenant3"))
+
+
+def test_database_handler_keeps_secrets_out_of_the_shared_cache(
+    database_handler_settings, configurations, django_assert_num_queries
+):
+    database_providers_handler(request=make_request("tenant1"))
+
+    assert "secret" not in str(cache.get(get_provider_configurations_key("tenant1")))
+
+    # Other processes read the secrets from the database
+    other_process = DatabaseProvidersHandler(tenant_key_func=get_tenant_key)
+    with django_assert_num_queries(1):
+        config = other_process(request=make_request("tenant1"))
+    assert config["google"]["client_secret"] == "secret"
+
+
+def test_database_handler_is_invalidated_on_save_and_delete(
+    database_handler_settings, configurations, django_capture_on_commit_callbacks
+):
+    database_providers_handler(request=make_request("tenant1"))
+
+    google = configurations[0]
+    with django_capture_on_commit_callbacks(execute=True):
+        google.client_id = "rotated_client_id"
+        google.save()
+    config = database_providers_handler(request=make_request("tenant1"))
+    assert config["google"]["client_id"] == "rotated_client_id"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        google.delete()
+    assert set(database_providers_handler(request=make_request("tenant1"))) == {"microsoft_tenant"}
+
+
+def test_database_handler_is_not_invalidated_before_commit(
+    database_handler_settings, configurations, django_capture_on_commit_callbacks
+):
+    database_providers_handler(request=make_request("tenant1"))
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        configurations[0].client_id = "rotated_client_id"
+        configurations[0].save()
+        assert database_providers_handler(request=make_request("tenant1"))["google"]["client_id"] == "tenant1_client_id"
+    assert len(callbacks) == 1
+
+
+def test_views_use_database_configurations(
+    database_handler_settings, configurations, django_capture_on_commit_callbacks
+):
+    client = APIClient()
+    response = client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    assert response.status_code == 200
+    assert {provider["type"] for provider in response.data["providers"]} == {"google", "microsoft_tenant"}
+
+    # The cached providers response of the tenant is dropped along with its configurations
+    with django_capture_on_commit_callbacks(execute=True):
+        ProviderConfiguration.objects.create(
+            tenant="tenant1", provider_type="oidc", client_id="id", client_secret="secret", enabled=False
+        )
+    with django_capture_on_commit_callbacks(execute=True):
+        configurations[1].delete()
+    response = client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    assert [provider["type"] for provider in response.data["providers"]] == ["google"]
+
+
+def test_exchange_of_unknown_database_tenant(database_handler_settings, configurations):
+    response = APIClient().post(
+        reverse("oauth-exchange", args=["microsoft_tenant"]),
+        data={"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://app.com/callback"},
+        HTTP_X_TENANT="tenant3",
+    )
+    assert response.status_code == NoActiveProviderError.status_code
+    assert response.data["detail"] == NoActiveProviderError.default_detail
+
+
+def test_admin_form_keeps_the_stored_secret(configurations):
+    from nexus_auth.admin import ProviderConfigurationForm
+
+    google = configurations[0]
+    form = ProviderConfigurationForm(instance=google)
+    assert "value=" not in str(form["client_secret"])
+
+    data = {"client_id": "rotated_client_id", "client_secret": "", "options": "{}", "enabled": True}
+    form = ProviderConfigurationForm(data={**data, "tenant": "tenant1", "provider_type": "google"}, instance=google)
+    assert form.is_valid(), form.errors
+    assert form.save().client_secret == "secret"
+
+    form = ProviderConfigurationForm(data={**data, "tenant": "tenant3", "provider_type": "google"})
+    assert "client_secret" in form.errors
+
+
+def test_admin_registration_is_optional(settings):
+    import importlib
+
+    from django.contrib import admin
+
+    import nexus_auth.admin
+
+    assert admin.site.is_registered(ProviderConfiguration)
+
+    admin.site.unregister(ProviderConfiguration)
+    settings.NEXUS_AUTH = {"PROVIDER_CONFIGURATIONS": {"ADMIN": False}}
+    importlib.reload(nexus_auth.admin)
+    assert not admin.site.is_registered(ProviderConfiguration)
+
+    settings.NEXUS_AUTH = {}
+    importlib.reload(nexus_auth.admin)
+    assert admin.site.is_registered(ProviderConfiguration)
@@ -0,0 +1,48 @@
+from unittest.mock import patch
+
+from django.test.utils import override_settings
+
+from nexus_auth.providers import http
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+
+
+def test_session_is_shared_across_providers():
+    """Test that every provider instance sends requests through the same pooled session."""
+    http.close_session()
+    session = http.get_session()
+    assert http.get_session() is session
+
+    google = GoogleOAuth2Provider(client_id="id", client_secret="secret")
+    microsoft = MicrosoftEntraTenantOAuth2Provider(client_id="id", client_secret="secret", tenant_id="tenant")
+    with patch.object(session, "post") as mock_post:
+        mock_post.return_value.json.return_value = {"id_token": "token", "access_token": "token"}
+        google.fetch_id_token("code", "verifier", "https://redirect.url")
+        microsoft.fetch_access_token("code", "verifier", "https://redirect.url")
+    assert mock_post.call_count == 2
+
+
+def test_session_uses_http_settings():
+    """Test that the pool size, retries and timeouts are read from NEXUS_AUTH.HTTP."""
+    with override_settings(NEXUS_AUTH={"HTTP": {"POOL_MAXSIZE": 42, "MAX_RETRIES": 5, "READ_TIMEOUT": 7}}):
+        adapter = http.get_session().get_adapter("https://login.microsoftonline.com")
+        assert adapter._pool_maxsize == 42
+        assert adapter.max_retries.connect == 5
+        assert adapter.max_retries.read == 0
+        assert http.get_timeout() == (3.05, 7)
+
+
+def test_session_is_rebuilt_when_settings_change():
+    """Test that changing NEXUS_AUTH closes the shared session."""
+    session = http.get_session()
+    with override_settings(NEXUS_AUTH={"HTTP": {"POOL_MAXSIZE": 1}}):
+        assert http.get_session() is not session
+
+
+@patch("requests.Session.post")
+def test_provider_requests_use_configured_timeout(mock_post):
+    """Test that providers pass the (connect, read) timeout to the session."""
+    mock_post.return_value.json.return_value = {"id_token": "token"}
+    provider = GoogleOAuth2Provider(client_id="id", client_secret="secret")
+    provider.fetch_id_token("code", "verifier", "https://redirect.url")
+    assert mock_post.call_args.kwargs["timeout"] == http.get_timeout()
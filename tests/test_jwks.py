@@ -0,0 +1,266 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import jwt
+import pytest
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+
+from nexus_auth.cache import make_key
+from nexus_auth.exceptions import InvalidIDTokenError, JWKSFetchError
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.providers.jwks import jwks_cache
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+from requests import RequestException
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+
+
+def make_signing_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return private_key, jwk
+
+
+KEY_1, JWK_1 = make_signing_key("key-1")
+KEY_2, JWK_2 = make_signing_key("key-2")
+
+
+def make_id_token(private_key=KEY_1, kid="key-1", **claims):
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": "client",
+        "sub": "subject",
+        "email": "user@example.com",
+        "iat": now,
+        "exp": now + 300,
+    }
+    payload.update(claims)
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+def expire_refresh_limit():
+    """Simulate that MIN_REFRESH_INTERVAL has elapsed since the last refresh."""
+    jwks_cache._last_refresh.clear()
+    cache.delete(jwks_cache._lock_key(GOOGLE_JWKS_URL))
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    jwks_cache.clear()
+    yield
+    cache.clear()
+    jwks_cache.clear()
+
+
+@pytest.fixture
+def mock_get():
+    with patch("requests.Session.get") as mock_get:
+        mock_get.return_value.json.return_value = {"keys": [JWK_1]}
+        yield mock_get
+
+
+@pytest.fixture
+def provider():
+    return GoogleOAuth2Provider(client_id="client", client_secret="secret")
+
+
+def test_verified_email_extraction(provider, mock_get):
+    assert provider.extract_email_from_id_token(make_id_token()) == "user@example.com"
+    assert provider.extract_email_from_id_token(make_id_token(email="other@example.com")) == "other@example.com"
+    # The key set is fetched once and then served from the cache
+    mock_get.assert_called_once()
+    assert mock_get.call_args.args[0] == GOOGLE_JWKS_URL
+
+
+@pytest.mark.parametrize(
+    "id_token",
+    [
+        make_id_token(aud="other-client"),
+        make_id_token(iss="https://evil.example.com"),
+        make_id_token(exp=int(time.time()) - 3600),
+        make_id_token(private_key=KEY_2),
+        "not-a-jwt",
+    ],
+)
+def test_invalid_id_token(provider, mock_get, id_token):
+    with pytest.raises(InvalidIDTokenError):
+        provider.decode_id_token(id_token)
+
+
+def test_unknown_kid_refreshes_keys_once(provider, mock_get):
+    provider.decode_id_token(make_id_token())
+
+    # The IdP rotates its keys after MIN_REFRESH_INTERVAL
+    mock_get.return_value.json.return_value = {"keys": [JWK_1, JWK_2]}
+    expire_refresh_limit()
+    claims = provider.decode_id_token(make_id_token(private_key=KEY_2, kid="key-2"))
+    assert claims["email"] == "user@example.com"
+    assert mock_get.call_count == 2
+
+
+def test_refresh_is_rate_limited(provider, mock_get):
+    provider.decode_id_token(make_id_token())
+    for _ in range(3):
+        with pytest.raises(InvalidIDTokenError):
+            provider.decode_id_token(make_id_token(private_key=KEY_2, kid="unknown"))
+    # No refresh within MIN_REFRESH_INTERVAL of the first fetch
+    mock_get.assert_called_once()
+
+
+def test_keys_are_shared_between_workers(provider, mock_get):
+    provider.decode_id_token(make_id_token())
+    # Another worker starts with an empty in-process cache
+    jwks_cache.clear()
+    provider.decode_id_token(make_id_token())
+    mock_get.assert_called_once()
+
+
+def test_worker_waits_for_refresh_in_progress(provider, mock_get):
+    # Another worker holds the refresh lock and publishes the key set shortly after
+    lock_key = jwks_cache._lock_key(GOOGLE_JWKS_URL)
+    cache.add(lock_key, "pending")
+
+    def publish_keys():
+        cache.set(make_key(jwks_cache.namespace, GOOGLE_JWKS_URL), {"keys": [JWK_1]})
+        cache.set(lock_key, "done")
+
+    publish = threading.Timer(0.1, publish_keys)
+    publish.start()
+
+    assert provider.decode_id_token(make_id_token())["sub"] == "subject"
+    publish.join()
+    mock_get.assert_not_called()
+
+
+def test_worker_does_not_wait_after_recent_refresh(provider, mock_get):
+    provider.decode_id_token(make_id_token())
+    # Another worker, whose own refresh limit has not been reached
+    jwks_cache._last_refresh.clear()
+    started = time.monotonic()
+    with pytest.raises(InvalidIDTokenError):
+        provider.decode_id_token(make_id_token(private_key=KEY_2, kid="unknown"))
+    assert time.monotonic() - started < 0.5
+    mock_get.assert_called_once()
+
+
+def test_refresh_does_not_block_other_issuers():
+    other_jwks_url = "https://login.example.com/keys"
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def fetch(jwks_url):
+        if jwks_url == GOOGLE_JWKS_URL:
+            fetching.set()
+            release.wait(5)
+        return {"keys": [JWK_1]}
+
+    with patch.object(jwks_cache, "fetch", side_effect=fetch):
+        slow = threading.Thread(target=jwks_cache.get_signing_key, args=(GOOGLE_JWKS_URL, "key-1"))
+        slow.start()
+        assert fetching.wait(5)
+        try:
+            assert jwks_cache.get_signing_key(other_jwks_url, "key-1")
+            assert slow.is_alive()
+        finally:
+            release.set()
+            slow.join()
+    assert not jwks_cache._refresh_locks
+
+
+def test_jwks_fetch_error(provider, mock_get):
+    mock_get.side_effect = RequestException
+    with pytest.raises(JWKSFetchError):
+        provider.decode_id_token(make_id_token())
+
+
+def test_failed_fetch_is_retried(provider, mock_get):
+    mock_get.side_effect = [RequestException, mock_get.return_value]
+    with pytest.raises(JWKSFetchError):
+        provider.decode_id_token(make_id_token())
+
+    # Neither this process nor the shared lock hold the failed refresh
+    assert cache.get(jwks_cache._lock_key(GOOGLE_JWKS_URL)) is None
+    assert provider.decode_id_token(make_id_token())["sub"] == "subject"
+    assert mock_get.call_count == 2
+
+
+def test_async_failed_fetch_is_retried(provider):
+    with patch.object(jwks_cache, "afetch", side_effect=[JWKSFetchError, {"keys": [JWK_1]}]):
+        with pytest.raises(JWKSFetchError):
+            async_to_sync(provider.adecode_id_token)(make_id_token())
+        assert async_to_sync(provider.adecode_id_token)(make_id_token())["sub"] == "subject"
+
+
+def test_worker_fails_when_the_refresh_of_another_fails(provider, mock_get):
+    # Another worker holds the refresh lock, and releases it when its fetch fails
+    lock_key = jwks_cache._lock_key(GOOGLE_JWKS_URL)
+    cache.add(lock_key, "pending")
+    release = threading.Timer(0.1, lambda: cache.delete(lock_key))
+    release.start()
+
+    with pytest.raises(JWKSFetchError):
+        provider.decode_id_token(make_id_token())
+    release.join()
+    mock_get.assert_not_called()
+    # The next login fetches the key set itself
+    assert provider.decode_id_token(make_id_token())["sub"] == "subject"
+
+
+def test_verification_can_be_disabled(provider, mock_get, settings):
+    settings.NEXUS_AUTH = {"ID_TOKEN_VERIFICATION": {"ENABLED": False}}
+    assert provider.decode_id_token(make_id_token(aud="other-client"))["aud"] == "other-client"
+    mock_get.assert_not_called()
+
+
+def test_microsoft_multi_tenant_issuer(mock_get):
+    provider = MicrosoftEntraTenantOAuth2Provider(client_id="client", client_secret="secret", tenant_id="organizations")
+    tid = "9188040d-6c67-4c5b-b112-36a304b66dad"
+    claims = provider.decode_id_token(
+        make_id_token(iss=f"https://login.microsoftonline.com/{tid}/v2.0", tid=tid)
+    )
+    assert claims["tid"] == tid
+
+    with pytest.raises(InvalidIDTokenError):
+        provider.decode_id_token(make_id_token(iss="https://login.microsoftonline.com/other/v2.0", tid=tid))
+
+
+def test_microsoft_single_tenant_issuer(mock_get):
+    tid = "9188040d-6c67-4c5b-b112-36a304b66dad"
+    provider = MicrosoftEntraTenantOAuth2Provider(client_id="client", client_secret="secret", tenant_id=tid)
+    assert provider.decode_id_token(make_id_token(iss=f"https://login.microsoftonline.com/{tid}/v2.0", tid=tid))
+
+    other = "72f988bf-86f1-41af-91ab-2d7cd011db47"
+    with pytest.raises(InvalidIDTokenError):
+        provider.decode_id_token(make_id_token(iss=f"https://login.microsoftonline.com/{other}/v2.0", tid=other))
+
+
+def test_microsoft_tenant_configured_by_domain_name(mock_get):
+    # Entra issues the tokens with the GUID of the tenant, not its domain name
+    provider = MicrosoftEntraTenantOAuth2Provider(
+        client_id="client", client_secret="secret", tenant_id="contoso.onmicrosoft.com"
+    )
+    tid = "9188040d-6c67-4c5b-b112-36a304b66dad"
+    claims = provider.decode_id_token(
+        make_id_token(iss=f"https://login.microsoftonline.com/{tid}/v2.0", tid=tid)
+    )
+    assert claims["tid"] == tid
+
+    with pytest.raises(InvalidIDTokenError):
+        provider.decode_id_token(
+            make_id_token(iss="https://login.microsoftonline.com/contoso.onmicrosoft.com/v2.0", tid=tid)
+        )
+
+
+def test_async_verified_email_extraction(provider):
+    with patch.object(jwks_cache, "afetch", return_value={"keys": [JWK_1]}) as mock_afetch:
+        email = async_to_sync(provider.aextract_email_from_id_token)(make_id_token())
+        email = async_to_sync(provider.aextract_email_from_id_token)(make_id_token())
+    assert email == "user@example.com"
+    mock_afetch.assert_called_once_with(GOOGLE_JWKS_URL)
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.utils import timezone
+
+from nexus_auth import last_login
+from nexus_auth.last_login import (
+    CacheLastLoginBuffer,
+    MemoryLastLoginBuffer,
+    write_last_logins,
+)
+
+User = get_user_model()
+
+
+@pytest.fixture
+def users(db):
+    return [
+        User.objects.create_user(email=f"user{i}@example.com", username=f"user{i}")
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def write_behind(settings):
+    cache.clear()
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "LAST_LOGIN": {"WRITE_BEHIND": True, "FLUSH_INTERVAL": 3600, "FLUSH_SIZE": 2},
+    }
+    last_login.install()
+    yield
+    last_login.uninstall()
+    cache.clear()
+
+
+def last_logins():
+    return dict(User.objects.order_by("pk").values_list("pk", "last_login"))
+
+
+def test_write_last_logins_keeps_most_recent(users):
+    now = timezone.now()
+    write_last_logins({users[0].pk: now, users[1].pk: now})
+    write_last_logins(
+        {
+            users[0].pk: now - timedelta(minutes=1),
+            users[1].pk: now + timedelta(minutes=1),
+        }
+    )
+    assert last_logins() == {
+        users[0].pk: now,
+        users[1].pk: now + timedelta(minutes=1),
+        users[2].pk: None,
+    }
+
+
+def test_logins_are_buffered(users, write_behind, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        user_logged_in.send(sender=None, request=None, user=users[0])
+    assert users[0].last_login is not None
+    assert last_logins()[users[0].pk] is None
+
+    last_login.flush()
+    assert last_logins()[users[0].pk] == users[0].last_login
+
+
+def test_buffer_deduplicates_users(users):
+    buffer = MemoryLastLoginBuffer(flush_interval=3600, flush_size=10)
+    now = timezone.now()
+    buffer.add(users[0].pk, now - timedelta(minutes=1))
+    buffer.add(users[0].pk, now)
+    buffer.add(users[1].pk, now)
+    assert len(buffer) == 2
+    buffer.stop()
+    assert last_logins() == {users[0].pk: now, users[1].pk: now, users[2].pk: None}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_size_threshold_wakes_up_flush_thread(users):
+    buffer = MemoryLastLoginBuffer(flush_interval=3600, flush_size=2)
+    now = timezone.now()
+    buffer.add(users[0].pk, now)
+    buffer.add(users[1].pk, now)
+    for _ in range(100):
+        if len(buffer) == 0:
+            break
+        buffer._stopped.wait(0.05)
+    buffer.stop()
+    assert last_logins()[users[1].pk] == now
+
+
+def test_cache_buffer_flushes_full_slices_and_tails(users):
+    cache.clear()
+    buffer = CacheLastLoginBuffer(flush_interval=3600, flush_size=2)
+    now = timezone.now()
+    for user in users:
+        buffer.add(user.pk, now)
+
+    # The first two logins form a full slice, the last one waits for the end of the interval
+    buffer.flush()
+    assert last_logins() == {users[0].pk: now, users[1].pk: now, users[2].pk: None}
+
+    # Another worker stopping flushes the rest of the log
+    other_worker = CacheLastLoginBuffer(flush_interval=3600, flush_size=2)
+    other_worker.flush(final=True)
+    assert last_logins()[users[2].pk] == now
+    buffer.stop()
+    cache.clear()
+
+
+def test_cache_buffer_flushes_full_slices_of_stopped_workers(
+    users, django_assert_num_queries
+):
+    cache.clear()
+    crashed_worker = CacheLastLoginBuffer(flush_interval=3600, flush_size=2)
+    # The worker that appends the full slice dies before flushing it
+    crashed_worker.start = lambda: None
+    now = timezone.now()
+    for user in users:
+        crashed_worker.add(user.pk, now)
+
+    other_worker = CacheLastLoginBuffer(flush_interval=3600, flush_size=2)
+    other_worker.flush(final=True)
+    assert last_logins() == {user.pk: now for user in users}
+
+    # Slices already flushed are skipped
+    cache.clear()
+    worker = CacheLastLoginBuffer(flush_interval=3600, flush_size=2)
+    for user in users:
+        worker.add(user.pk, now)
+    worker.flush()
+    with django_assert_num_queries(1):
+        CacheLastLoginBuffer(flush_interval=3600, flush_size=2).flush(final=True)
+    worker.stop()
+    cache.clear()
+
+
+def test_uninstall_restores_django_receiver(users, write_behind):
+    last_login.uninstall()
+    user_logged_in.send(sender=None, request=None, user=users[0])
+    assert last_logins()[users[0].pk] is not None
+    last_login.install()
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.testing.load import get_synthetic_tenant, synthetic_tenants_handler
+from nexus_auth.testing.stub_idp import StubIdP
+
+User = get_user_model()
+
+LOADTEST_SETTINGS = {
+    "PROVIDERS_HANDLER": "nexus_auth.testing.load.synthetic_tenants_handler",
+    "TENANT_KEY_FUNC": "nexus_auth.testing.load.get_synthetic_tenant",
+}
+
+
+@pytest.fixture(scope="module")
+def idp():
+    with StubIdP() as idp:
+        yield idp
+
+
+@pytest.fixture
+def loadtest_settings(idp, settings):
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        **LOADTEST_SETTINGS,
+        "LOADTEST": {"STUB_URL": idp.base_url},
+    }
+    return settings
+
+
+def test_synthetic_tenant_from_header(settings):
+    request = RequestFactory().get("/", HTTP_X_NEXUS_TENANT="acme")
+    assert get_synthetic_tenant(request) == "acme"
+
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "LOADTEST": {"TENANT_HEADER": "X-Tenant"}}
+    assert get_synthetic_tenant(request) is None
+
+
+def test_synthetic_tenants_handler(idp, loadtest_settings):
+    request = RequestFactory().get("/", HTTP_X_NEXUS_TENANT="acme")
+
+    providers = synthetic_tenants_handler(request)
+
+    assert providers["oidc"]["issuer"] == f"{idp.base_url}/tenants/acme"
+    assert providers["oidc"]["client_id"] == "client-acme"
+    assert providers["microsoft_tenant"]["tenant_id"] == "acme"
+    assert providers["microsoft_tenant"]["authority"] == idp.base_url
+    assert synthetic_tenants_handler(RequestFactory().get("/")) is None
+
+
+def test_synthetic_tenants_handler_requires_stub_url(settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, **LOADTEST_SETTINGS}
+    with pytest.raises(ImproperlyConfigured):
+        synthetic_tenants_handler(RequestFactory().get("/", HTTP_X_NEXUS_TENANT="acme"))
+
+
+@pytest.mark.parametrize("provider_type", ["oidc", "microsoft_tenant"])
+def test_exchange_with_synthetic_tenant(idp, loadtest_settings, db, provider_type):
+    User.objects.create_user(email="active@example.com", password="password", username="active")
+
+    response = APIClient().post(
+        reverse("oauth-exchange", args=[provider_type]),
+        data={"code": "active@example.com", "code_verifier": "verifier", "redirect_uri": "http://localhost/callback"},
+        HTTP_X_NEXUS_TENANT="acme",
+    )
+
+    assert response.status_code == 200
+
+
+def test_loadtest_command(idp, loadtest_settings, live_server, tmp_path):
+    output = tmp_path / "report.json"
+
+    call_command(
+        "nexus_auth_loadtest",
+        live_server.url,
+        "--requests=12",
+        "--concurrency=3",
+        "--tenants=2",
+        "--users=3",
+        "--create-users",
+        f"--output={output}",
+    )
+
+    report = json.loads(output.read_text())
+    assert report["requests"] == 12
+    assert report["errors"] == 0
+    assert report["histogram_ms"][-1] == {"le": "+Inf", "count": 12}
+    assert User.objects.filter(email__startswith="loadtest-").count() == 3
+
+
+def test_loadtest_command_error_breakdown(idp, loadtest_settings, live_server, tmp_path):
+    output = tmp_path / "report.json"
+
+    call_command(
+        "nexus_auth_loadtest", live_server.url, "--requests=4", "--concurrency=2", f"--output={output}"
+    )
+
+    report = json.loads(output.read_text())
+    assert report["errors"] == 4
+    assert [error.split()[0] for error in report["error_breakdown"]] == ["404"]
+
+
+def test_loadtest_command_requires_url():
+    with pytest.raises(CommandError):
+        call_command("nexus_auth_loadtest")
@@ -0,0 +1,187 @@
+import gc
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.urls import path, reverse
+from rest_framework.test import APIClient
+
+from nexus_auth import metrics
+from nexus_auth.cache import LRUCache
+from nexus_auth.metrics import Counter, Histogram, MetricsRegistry
+from nexus_auth.providers import http
+from nexus_auth.views import MetricsView
+
+User = get_user_model()
+
+urlpatterns = [
+    path("metrics", MetricsView.as_view(), name="metrics"),
+]
+
+EXCHANGE_DATA = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://app.com/callback"}
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+
+def test_counter_is_summed_across_threads():
+    counter = Counter("test_total", "Test.", ("label",))
+
+    def increment():
+        for _ in range(1000):
+            counter.inc(label="a")
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(2, label="b")
+
+    assert counter.collect() == {("a",): 4000, ("b",): 2}
+    assert counter.get(label="a") == 4000
+    assert counter.get(label="c") == 0
+
+
+def test_shards_of_ended_threads_are_folded():
+    counter = Counter("test_total", "Test.", ("label",))
+    histogram = Histogram("test_seconds", "Test.", buckets=(1,))
+
+    def record():
+        counter.inc(label="a")
+        histogram.observe(0.5)
+
+    for _ in range(50):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    assert len(counter._shards) == 0
+    assert len(histogram._shards) == 0
+    assert counter.collect() == {("a",): 50}
+    assert histogram.collect() == {(): [50, 0, 25.0]}
+
+    counter.reset()
+    assert counter.collect() == {}
+
+
+def test_series_are_bounded():
+    counter = Counter("test_total", "Test.", ("tenant", "outcome"), max_series=2)
+    for tenant in ("t1", "t2", "t3", "t4"):
+        counter.inc(tenant=tenant, outcome="success")
+    counter.inc(tenant="t1", outcome="success")
+
+    assert counter.collect() == {("t1", "success"): 2, ("t2", "success"): 1, ("other", "other"): 2}
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test.", ("endpoint",), buckets=(0.1, 1))
+    histogram.observe(0.05, endpoint="a")
+    histogram.observe(0.1, endpoint="a")
+    histogram.observe(3, endpoint="a")
+
+    assert histogram.render() == [
+        'test_seconds_bucket{endpoint="a",le="0.1"} 2',
+        'test_seconds_bucket{endpoint="a",le="1"} 2',
+        'test_seconds_bucket{endpoint="a",le="+Inf"} 3',
+        'test_seconds_sum{endpoint="a"} 3.15',
+        'test_seconds_count{endpoint="a"} 3',
+    ]
+
+
+def test_registry_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test\ncounter.", ("tenant",))
+    counter.inc(tenant='say "hi"\\')
+
+    assert registry.counter("test_total", "Test.") is counter
+    assert registry.render() == (
+        "# HELP test_total Test\\ncounter.\n"
+        "# TYPE test_total counter\n"
+        'test_total{tenant="say \\"hi\\"\\\\"} 1\n'
+    )
+    with pytest.raises(ValueError):
+        registry.histogram("test_total", "Test.")
+
+
+def test_cache_lookups_are_counted():
+    cache = LRUCache(max_entries=10, name="test")
+    cache.get("key")
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+    LRUCache(max_entries=10).get("key")
+
+    assert metrics.cache_requests.collect() == {("test", "hit"): 1, ("test", "miss"): 1}
+
+
+@patch("requests.Session.get")
+def test_idp_requests_are_observed(mock_get):
+    mock_get.return_value = MagicMock(status_code=200)
+    http.request("get", "https://idp.example.com/keys?tenant=1")
+    mock_get.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http.request("get", "https://idp.example.com/keys")
+
+    observed = metrics.idp_request_duration.collect()
+    assert set(observed) == {
+        ("https://idp.example.com", "GET", "200"),
+        ("https://idp.example.com", "GET", "error"),
+    }
+
+
+@patch("requests.Session.get")
+def test_idp_requests_of_all_tenants_share_a_series(mock_get):
+    mock_get.return_value = MagicMock(status_code=200)
+    for tenant_id in ("tenant1", "tenant2", "tenant3"):
+        http.request("get", f"https://login.microsoftonline.com/{tenant_id}/discovery/v2.0/keys")
+
+    counts = metrics.idp_request_duration.collect()[("https://login.microsoftonline.com", "GET", "200")]
+    assert sum(counts[:-1]) == 3
+
+
+@pytest.fixture
+def mock_exchange():
+    with patch("nexus_auth.providers.google.GoogleOAuth2Provider.exchange_code_for_email") as mock_exchange:
+        mock_exchange.return_value = "active@example.com"
+        yield mock_exchange
+
+
+def test_exchanges_are_counted(db, mock_exchange):
+    client = APIClient()
+    client.post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+    User.objects.create_user(email="active@example.com", password="password", username="active")
+    client.post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+    client.post(reverse("oauth-exchange", args=["google"]), data={})
+
+    assert metrics.exchanges.collect() == {
+        ("google", "", "no_associated_user"): 1,
+        ("google", "", "success"): 1,
+        ("google", "", "invalid"): 1,
+    }
+    assert set(metrics.exchange_duration.collect()) == {
+        ("google", "no_associated_user"),
+        ("google", "success"),
+        ("google", "invalid"),
+    }
+
+
+def test_metrics_view(db, settings, mock_exchange):
+    User.objects.create_user(email="active@example.com", password="password", username="active")
+    APIClient().post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+    settings.ROOT_URLCONF = __name__
+
+    response = APIClient().get(reverse("metrics"))
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == metrics.CONTENT_TYPE
+    content = response.content.decode()
+    assert "# TYPE nexus_auth_exchanges_total counter" in content
+    assert 'nexus_auth_exchanges_total{provider="google",tenant="",outcome="success"} 1' in content
+    assert 'nexus_auth_cache_requests_total{cache="providers",' in content
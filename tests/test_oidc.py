@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from requests import RequestException
+
+from nexus_auth.exceptions import DiscoveryDocumentError
+from nexus_auth.providers.oidc import OpenIDConnectProvider, discovery_cache
+from nexus_auth.utils import build_oauth_provider
+
+DISCOVERY_DOCUMENT = {
+    "issuer": "https://idp.example.com",
+    "authorization_endpoint": "https://idp.example.com/oauth2/authorize",
+    "token_endpoint": "https://idp.example.com/oauth2/token",
+    "jwks_uri": "https://idp.example.com/oauth2/keys",
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    discovery_cache.clear()
+    yield
+    cache.clear()
+    discovery_cache.clear()
+
+
+@pytest.fixture
+def mock_get():
+    with patch("requests.Session.get") as mock_get:
+        mock_get.return_value.json.return_value = DISCOVERY_DOCUMENT
+        yield mock_get
+
+
+def test_endpoints_are_read_from_discovery_document(mock_get):
+    provider = OpenIDConnectProvider(client_id="client", client_secret="secret", issuer="https://idp.example.com/")
+
+    assert provider.get_authorization_url() == "https://idp.example.com/oauth2/authorize"
+    assert provider.get_token_url() == "https://idp.example.com/oauth2/token"
+    assert provider.build_auth_url().startswith("https://idp.example.com/oauth2/authorize?client_id=client")
+    mock_get.assert_called_once()
+    assert mock_get.call_args.args[0] == "https://idp.example.com/.well-known/openid-configuration"
+
+
+def test_discovery_document_is_shared_between_tenants_and_workers(mock_get):
+    tenant1 = OpenIDConnectProvider(client_id="tenant1", client_secret="secret", issuer="https://idp.example.com")
+    tenant2 = OpenIDConnectProvider(client_id="tenant2", client_secret="secret", issuer="https://idp.example.com")
+    tenant1.get_token_url()
+    tenant2.get_token_url()
+
+    # Another worker starts with an empty in-process cache and reads the shared cache
+    discovery_cache.clear()
+    tenant1.get_token_url()
+
+    assert mock_get.call_count == 1
+
+
+def test_custom_discovery_url(mock_get):
+    provider = OpenIDConnectProvider(
+        client_id="client",
+        client_secret="secret",
+        issuer="https://idp.example.com",
+        discovery_url="https://idp.example.com/custom/.well-known/openid-configuration",
+    )
+    provider.get_token_url()
+    assert mock_get.call_args.args[0] == "https://idp.example.com/custom/.well-known/openid-configuration"
+
+
+def test_discovery_request_error(mock_get):
+    mock_get.side_effect = RequestException
+    provider = OpenIDConnectProvider(client_id="client", client_secret="secret", issuer="https://idp.example.com")
+    with pytest.raises(DiscoveryDocumentError):
+        provider.get_token_url()
+
+
+def test_invalid_discovery_document(mock_get):
+    mock_get.return_value.json.return_value = {"issuer": "https://idp.example.com"}
+    provider = OpenIDConnectProvider(client_id="client", client_secret="secret", issuer="https://idp.example.com")
+    with pytest.raises(DiscoveryDocumentError):
+        provider.get_token_url()
+    # Invalid documents are not cached
+    mock_get.return_value.json.return_value = DISCOVERY_DOCUMENT
+    assert provider.get_token_url() == "https://idp.example.com/oauth2/token"
+
+
+def test_build_oidc_provider():
+    providers_config = {
+        "oidc": {
+            "CLIENT_ID": "client",
+            "CLIENT_SECRET": "secret",
+            "ISSUER": "https://idp.example.com",
+        },
+    }
+    provider = build_oauth_provider("oidc", providers_config)
+    assert isinstance(provider, OpenIDConnectProvider)
+    assert provider.discovery_url == "https://idp.example.com/.well-known/openid-configuration"
@@ -0,0 +1,135 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+import requests
+from asgiref.sync import async_to_sync
+
+from nexus_auth.exceptions import MicrosoftGraphAPIError
+from nexus_auth.providers import http
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+from nexus_auth.providers.policy import ExchangePolicy, build_policy, exchange_policy, parse_retry_after
+from nexus_auth.settings import nexus_settings
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0/me"
+
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+@pytest.fixture
+def provider():
+    return MicrosoftEntraTenantOAuth2Provider(client_id="test_client", client_secret="test_secret", tenant_id="test_tenant")
+
+
+def test_policy_settings_are_merged_per_provider(settings):
+    settings.NEXUS_AUTH = {
+        "EXCHANGE_POLICIES": {
+            "DEFAULT": {"DEADLINE": 8},
+            "microsoft_tenant": {"RETRIES": 0},
+        },
+    }
+    assert nexus_settings.get_exchange_policy_settings("microsoft_tenant") == {
+        "DEADLINE": 8, "RETRIES": 0, "BACKOFF_BASE": 0.2, "BACKOFF_MAX": 2, "RETRY_STATUSES": [429, 503],
+    }
+    assert nexus_settings.get_exchange_policy_settings("google")["RETRIES"] == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_is_jittered_and_bounded():
+    policy = ExchangePolicy(deadline=None, retries=10, backoff_base=0.2, backoff_max=1, retry_statuses=frozenset({503}))
+    delays = [policy.get_retry_delay("GET", 503, {}, attempt) for attempt in range(6)]
+    assert all(0 <= delay <= 1 for delay in delays)
+    assert policy.get_retry_delay("GET", 503, {"Retry-After": "1.5"}, 0) == 1.5
+    assert policy.get_retry_delay("GET", 500, {}, 0) is None
+    assert policy.get_retry_delay("GET", 503, {}, 10) is None
+
+
+def test_non_idempotent_requests_are_not_retried():
+    policy = ExchangePolicy(deadline=None, retries=2, backoff_base=0.2, backoff_max=1, retry_statuses=frozenset({503}))
+    assert policy.get_retry_delay("POST", 503, {}, 0) is None
+
+
+def test_retry_must_end_before_deadline():
+    policy = ExchangePolicy(
+        deadline=time.monotonic() + 1, retries=2, backoff_base=0.2, backoff_max=1, retry_statuses=frozenset({429})
+    )
+    assert policy.get_retry_delay("GET", 429, {"Retry-After": "5"}, 0) is None
+
+
+@patch("nexus_auth.providers.http.time.sleep")
+@patch("requests.Session.get")
+def test_graph_request_is_retried(mock_get, mock_sleep, provider):
+    success = make_response(200)
+    success.json.return_value = {"userPrincipalName": "user@example.com"}
+    mock_get.side_effect = [make_response(429, {"Retry-After": "1"}), make_response(503), success]
+
+    with exchange_policy("microsoft_tenant"):
+        assert provider.fetch_user_email("access_token") == "user@example.com"
+
+    assert mock_get.call_count == 3
+    assert mock_sleep.call_args_list[0].args == (1.0,)
+
+
+@patch("requests.Session.post")
+def test_token_request_is_not_retried(mock_post, provider):
+    mock_post.return_value = make_response(503)
+    mock_post.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError
+    with exchange_policy("microsoft_tenant"), pytest.raises(Exception):
+        provider.fetch_access_token("auth_code", "verifier", "https://redirect.url")
+    assert mock_post.call_count == 1
+
+
+@patch("requests.Session.get")
+def test_requests_share_the_deadline(mock_get, provider, settings):
+    settings.NEXUS_AUTH = {"EXCHANGE_POLICIES": {"microsoft_tenant": {"DEADLINE": 4}}}
+    mock_get.return_value.json.return_value = {"userPrincipalName": "user@example.com"}
+
+    with exchange_policy("microsoft_tenant") as policy:
+        provider.fetch_user_email("access_token")
+        connect_timeout, read_timeout = mock_get.call_args.kwargs["timeout"]
+        assert connect_timeout <= 3.05
+        assert read_timeout <= 4
+
+        # The budget is spent, e.g. by a slow token request
+        with patch("nexus_auth.providers.policy.time.monotonic", return_value=policy.deadline):
+            with pytest.raises(MicrosoftGraphAPIError):
+                provider.fetch_user_email("access_token")
+    assert mock_get.call_count == 1
+
+
+def test_no_policy_outside_of_exchange():
+    with patch("requests.Session.get", return_value=make_response(503)) as mock_get:
+        assert http.request("get", GRAPH_URL).status_code == 503
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["timeout"] == http.get_timeout()
+
+
+def test_async_graph_request_is_retried(provider):
+    responses = iter([httpx.Response(503, headers={"Retry-After": "0"}), httpx.Response(200, json={"userPrincipalName": "user@example.com"})])
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: next(responses)))
+
+    async def fetch():
+        with exchange_policy("microsoft_tenant"):
+            return await provider.afetch_user_email("access_token")
+
+    with patch("nexus_auth.providers.http.get_async_client", return_value=client):
+        assert async_to_sync(fetch)() == "user@example.com"
+
+
+def test_build_policy_without_deadline(settings):
+    settings.NEXUS_AUTH = {"EXCHANGE_POLICIES": {"DEFAULT": {"DEADLINE": None}}}
+    policy = build_policy("google")
+    assert policy.remaining() is None
+    assert policy.cap_timeout((3.05, 10)) == (3.05, 10)
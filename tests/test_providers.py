@@ -6,7 +6,8 @@ from requests.exceptions import JSONDecodeError
 from requests import RequestException
 from nexus_auth.exceptions import MissingIDTokenError, IDTokenExchangeError, InvalidTokenResponseError, MicrosoftGraphAPIError, AccessTokenExchangeError, MissingAccessTokenError
 from nexus_auth.providers.base import OAuth2IdentityProvider
-from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider, email_resolution_stats
+from django.core.exceptions import ImproperlyConfigured
 
 class MockOAuth2Provider(OAuth2IdentityProvider):
     def get_authorization_url(self):
@@ -33,7 +34,7 @@ class TestMockOAuth2Provider:
         assert "response_type=code" in auth_url
         assert "scope=openid+email" in auth_url
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_id_token_success(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {"id_token": 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9'}
@@ -41,7 +42,7 @@ class TestMockOAuth2Provider:
         token = provider.fetch_id_token("auth_code", "verifier", "https://redirect.url")
         assert token == "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_id_token_missing(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {}
@@ -49,14 +50,14 @@ class TestMockOAuth2Provider:
         with pytest.raises(MissingIDTokenError):
             provider.fetch_id_token("auth_code", "verifier", "https://redirect.url")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_id_token_exchange_error(self, mock_post, provider):
         mock_post.side_effect = RequestException
 
         with pytest.raises(IDTokenExchangeError):
             provider.fetch_id_token("auth_code", "verifier", "https://redirect.url")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_id_token_invalid_json(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.side_effect = JSONDecodeError("Invalid JSON", "{", 0)
@@ -79,7 +80,7 @@ class TestMicrosoftEntraTenantOAuth2Provider:
     def provider(self):
         return MicrosoftEntraTenantOAuth2Provider(client_id="test_client", client_secret="test_secret", tenant_id="test_tenant")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_access_token(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {"access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"}
@@ -87,14 +88,14 @@ class TestMicrosoftEntraTenantOAuth2Provider:
         token = provider.fetch_access_token("auth_code", "verifier", "https://redirect.url")
         assert token == "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_access_token_exchange_error(self, mock_post, provider):
         mock_post.side_effect = RequestException
 
         with pytest.raises(AccessTokenExchangeError):
             provider.fetch_access_token("auth_code", "verifier", "https://redirect.url")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_access_token_invalid_json(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.side_effect = JSONDecodeError("Invalid JSON", "{", 0)
@@ -102,7 +103,7 @@ class TestMicrosoftEntraTenantOAuth2Provider:
         with pytest.raises(InvalidTokenResponseError):
             provider.fetch_access_token("auth_code", "verifier", "https://redirect.url")
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_fetch_access_token_missing(self, mock_post, provider):
         mock_post.return_value.status_code = 200
         mock_post.return_value.json.return_value = {}
@@ -110,7 +111,7 @@ class TestMicrosoftEntraTenantOAuth2Provider:
         with pytest.raises(MissingAccessTokenError):
             provider.fetch_access_token("auth_code", "verifier", "https://redirect.url")
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_user_email(self, mock_get, provider):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {"userPrincipalName": "test_user@example.com"}
@@ -118,7 +119,7 @@ class TestMicrosoftEntraTenantOAuth2Provider:
         email = provider.fetch_user_email("access_token")
         assert email == "test_user@example.com"
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_user_email_invalid_json(self, mock_get, provider):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.side_effect = JSONDecodeError("Invalid JSON", "{", 0)
@@ -126,17 +127,82 @@ class TestMicrosoftEntraTenantOAuth2Provider:
         with pytest.raises(InvalidTokenResponseError):
             provider.fetch_user_email("wrong_access_token")
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_user_email_exchange_error(self, mock_get, provider):
         mock_get.side_effect = RequestException
 
         with pytest.raises(MicrosoftGraphAPIError):
             provider.fetch_user_email("access_token")
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_user_email_missing(self, mock_get, provider):
         mock_get.return_value.status_code = 200
         mock_get.return_value.json.return_value = {}
 
         with pytest.raises(InvalidTokenResponseError):
-            provider.fetch_user_email("access_token")
\ No newline at end of file
+            provider.fetch_user_email("access_token")
+
+
+class TestMicrosoftEmailResolution:
+    """Test the email resolution strategies of the Microsoft Entra provider."""
+
+    @pytest.fixture(autouse=True)
+    def reset_stats(self):
+        email_resolution_stats.reset()
+
+    @pytest.fixture
+    def mock_requests(self):
+        with patch("requests.Session.post") as mock_post, patch("requests.Session.get") as mock_get:
+            mock_post.return_value.json.return_value = {"access_token": "access", "id_token": "id"}
+            mock_get.return_value.json.return_value = {"userPrincipalName": "graph_user@example.com"}
+            yield mock_post, mock_get
+
+    def build_provider(self, email_resolution, claims):
+        provider = MicrosoftEntraTenantOAuth2Provider(
+            client_id="test_client", client_secret="test_secret", tenant_id="test_tenant", email_resolution=email_resolution
+        )
+        provider.decode_id_token = lambda id_token: claims
+        return provider
+
+    def exchange(self, provider):
+        return provider.exchange_code_for_email("auth_code", "verifier", "https://redirect.url")
+
+    def test_graph_strategy_is_the_default(self, mock_requests):
+        provider = MicrosoftEntraTenantOAuth2Provider(client_id="test_client", client_secret="test_secret", tenant_id="test_tenant")
+        assert self.exchange(provider) == "graph_user@example.com"
+        assert email_resolution_stats.snapshot() == {"graph": {"graph": 1}}
+
+    @pytest.mark.parametrize(
+        "claims, expected_email",
+        [
+            ({"email": "email@example.com", "preferred_username": "upn@example.com"}, "email@example.com"),
+            ({"preferred_username": "upn@example.com"}, "upn@example.com"),
+            ({"preferred_username": "+15551234567", "upn": "upn@example.com"}, "upn@example.com"),
+        ],
+    )
+    def test_id_token_claims_skip_graph(self, mock_requests, claims, expected_email):
+        _, mock_get = mock_requests
+        provider = self.build_provider("id_token_then_graph", claims)
+        assert self.exchange(provider) == expected_email
+        mock_get.assert_not_called()
+        assert email_resolution_stats.snapshot() == {"id_token_then_graph": {"id_token": 1}}
+
+    def test_fallback_to_graph_when_claims_are_missing(self, mock_requests):
+        _, mock_get = mock_requests
+        provider = self.build_provider("id_token_then_graph", {"sub": "subject"})
+        assert self.exchange(provider) == "graph_user@example.com"
+        mock_get.assert_called_once()
+        assert email_resolution_stats.snapshot() == {"id_token_then_graph": {"graph": 1}}
+
+    def test_id_token_strategy_without_fallback(self, mock_requests):
+        _, mock_get = mock_requests
+        provider = self.build_provider("id_token", {"sub": "subject"})
+        assert self.exchange(provider) is None
+        mock_get.assert_not_called()
+        assert email_resolution_stats.snapshot() == {"id_token": {"miss": 1}}
+
+    def test_unknown_strategy(self):
+        with pytest.raises(ImproperlyConfigured):
+            MicrosoftEntraTenantOAuth2Provider(
+                client_id="test_client", client_secret="test_secret", tenant_id="test_tenant", email_resolution="unknown"
+            )
@@ -42,3 +42,87 @@ def test_identity_provider_factory():
     
     with pytest.raises(ValueError, match="unknown_provider"):
         factory.get("unknown_provider")
+
+
+def test_builder_reuses_instances_per_configuration():
+    """Test that providers are cached by provider type and configuration."""
+    factory = IdentityProviderFactory()
+    factory.register_builder("microsoft_tenant", MicrosoftEntraTenantOAuth2ProviderBuilder())
+
+    tenant1_config = {"client_id": "tenant1", "client_secret": "secret", "tenant_id": "tenant1"}
+    tenant2_config = {"client_id": "tenant2", "client_secret": "secret", "tenant_id": "tenant2"}
+
+    tenant1_provider = factory.get("microsoft_tenant", **tenant1_config)
+    assert factory.get("microsoft_tenant", **dict(reversed(tenant1_config.items()))) is tenant1_provider
+    assert factory.get("microsoft_tenant", **tenant2_config) is not tenant1_provider
+
+    # A configuration change yields a new instance with the new values
+    updated_provider = factory.get("microsoft_tenant", **{**tenant1_config, "client_secret": "rotated"})
+    assert updated_provider is not tenant1_provider
+    assert updated_provider.client_secret == "rotated"
+
+
+def test_builder_cache_is_bounded(settings):
+    settings.NEXUS_AUTH = {"PROVIDER_CACHE": {"MAX_ENTRIES": 2}}
+    builder = GoogleOAuth2ProviderBuilder()
+    first = builder.get_or_create("google", client_id="1", client_secret="secret")
+    builder.get_or_create("google", client_id="2", client_secret="secret")
+    builder.get_or_create("google", client_id="3", client_secret="secret")
+
+    assert len(builder.instances) == 2
+    assert builder.get_or_create("google", client_id="1", client_secret="secret") is not first
+
+
+def test_builder_invalidate():
+    builder = GoogleOAuth2ProviderBuilder()
+    provider = builder.get_or_create("google", client_id="1", client_secret="secret")
+    builder.invalidate("google", client_id="1", client_secret="secret")
+    assert builder.get_or_create("google", client_id="1", client_secret="secret") is not provider
+
+
+def test_builders_are_loaded_on_first_use():
+    """Test that builders from PROVIDER_BUILDERS are only imported when requested."""
+    factory = IdentityProviderFactory()
+    assert factory._builders == {}
+
+    provider = factory.get("google", client_id="1", client_secret="secret")
+
+    assert isinstance(provider, OAuth2IdentityProvider)
+    assert list(factory._builders) == ["google"]
+    assert factory.get("google", client_id="1", client_secret="secret") is provider
+
+
+def test_lazy_builders_follow_settings_changes(settings):
+    factory = IdentityProviderFactory()
+    factory.get("google", client_id="1", client_secret="secret")
+    settings.NEXUS_AUTH = {"PROVIDER_BUILDERS": {"custom": "tests.test_providers_factory.MockBuilder"}}
+    factory.clear()
+
+    assert factory._builders == {}
+    assert factory.get("custom", key1="value1") == {"key1": "value1"}
+
+
+def test_warm_up_loads_all_builders():
+    factory = IdentityProviderFactory()
+    factory.warm_up()
+    assert set(factory._builders) == {"google", "microsoft_tenant", "oidc"}
+
+
+def test_views_import_does_not_load_providers():
+    """Test that importing the views does not import the providers and their async HTTP client."""
+    import subprocess
+    import sys
+
+    code = (
+        "import django, sys; django.setup(); import nexus_auth.urls; "
+        "loaded = [m for m in ('nexus_auth.providers.base', 'nexus_auth.providers.http', 'httpx') if m in sys.modules]; "
+        "print(','.join(loaded))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**__import__("os").environ, "DJANGO_SETTINGS_MODULE": "tests.settings"},
+    )
+    assert result.stdout.strip() == ""
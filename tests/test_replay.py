@@ -0,0 +1,146 @@
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.exceptions import EmailExtractionError, ExchangeInProgressError
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.replay import ExchangeReplay, get_exchange_replay
+
+User = get_user_model()
+
+REDIRECT_URI = "https://app.com/callback"
+EXCHANGE_DATA = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": REDIRECT_URI}
+
+
+@pytest.fixture(autouse=True)
+def replay_settings(settings):
+    cache.clear()
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "EXCHANGE_REPLAY": {"ENABLED": True, "TTL": 60, "WAIT": 1}}
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def active_user(db):
+    return User.objects.create_user(email="active@example.com", password="password", username="active")
+
+
+@pytest.fixture
+def provider():
+    with patch("nexus_auth.views.build_oauth_provider") as mock_build_provider:
+        provider = GoogleOAuth2Provider(client_id="test_client_id", client_secret="test_client_secret")
+        provider.exchange_code_for_email = MagicMock(return_value="active@example.com")
+        provider.aexchange_code_for_email = AsyncMock(return_value="active@example.com")
+        mock_build_provider.return_value = provider
+        yield provider
+
+
+def post_exchange(**kwargs):
+    return APIClient().post(reverse("oauth-exchange", args=["google"]), data={**EXCHANGE_DATA, **kwargs})
+
+
+def test_disabled_by_default(settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "EXCHANGE_REPLAY": {}}
+    assert get_exchange_replay("google", "code", "verifier", REDIRECT_URI) is None
+
+
+def test_key_depends_on_code_verifier_and_redirect_uri():
+    assert ExchangeReplay("google", "code", "verifier", REDIRECT_URI).key != ExchangeReplay("google", "code", "other", REDIRECT_URI).key
+    assert ExchangeReplay("google", "code", "verifier", REDIRECT_URI).key != ExchangeReplay("oidc", "code", "verifier", REDIRECT_URI).key
+    assert ExchangeReplay("google", "code", "verifier", REDIRECT_URI).key != ExchangeReplay(
+        "google", "code", "verifier", "https://evil.com/callback"
+    ).key
+    assert "code" not in ExchangeReplay("google", "code", "verifier", REDIRECT_URI).key
+
+
+def test_duplicate_exchange_is_replayed(active_user, provider):
+    first = post_exchange()
+    second = post_exchange()
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.data["refresh"] != first.data["refresh"]
+    provider.exchange_code_for_email.assert_called_once()
+
+
+def test_other_code_verifier_is_not_replayed(active_user, provider):
+    post_exchange()
+    post_exchange(code_verifier="other")
+
+    assert provider.exchange_code_for_email.call_count == 2
+
+
+def test_other_redirect_uri_is_not_replayed(active_user, provider):
+    post_exchange()
+    post_exchange(redirect_uri="https://evil.com/callback")
+
+    assert provider.exchange_code_for_email.call_count == 2
+
+
+def test_failed_exchange_is_not_replayed(active_user, provider):
+    provider.exchange_code_for_email.side_effect = [EmailExtractionError(), "active@example.com"]
+
+    assert post_exchange().status_code == EmailExtractionError.status_code
+    assert post_exchange().status_code == 200
+    assert provider.exchange_code_for_email.call_count == 2
+
+
+def test_replayed_user_is_checked(active_user, provider):
+    post_exchange()
+    active_user.is_active = False
+    active_user.save()
+
+    response = post_exchange()
+
+    assert response.status_code == 400
+    assert response.data["detail"].code == "user_not_active"
+
+
+def test_concurrent_duplicates_wait_for_the_first_exchange():
+    first = ExchangeReplay("google", "code", "verifier", REDIRECT_URI)
+    assert first.claim() is None
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(ExchangeReplay("google", "code", "verifier", REDIRECT_URI).claim()))
+    thread.start()
+    first.complete(MagicMock(pk=42))
+    thread.join()
+
+    assert results == [42]
+
+
+def test_duplicate_gives_up_after_wait():
+    assert ExchangeReplay("google", "code", "verifier", REDIRECT_URI).claim() is None
+    with patch("nexus_auth.replay.time.monotonic", side_effect=[0, 2]):
+        with pytest.raises(ExchangeInProgressError):
+            ExchangeReplay("google", "code", "verifier", REDIRECT_URI).claim()
+
+
+def test_duplicate_claims_released_exchange():
+    first = ExchangeReplay("google", "code", "verifier", REDIRECT_URI)
+    first.claim()
+    first.release()
+
+    second = ExchangeReplay("google", "code", "verifier", REDIRECT_URI)
+    assert second.claim() is None
+    assert second.claimed
+
+
+def test_async_duplicate_exchange_is_replayed(active_user, provider, settings):
+    settings.ROOT_URLCONF = "nexus_auth.async_urls"
+
+    async def post():
+        return await AsyncClient().post(
+            reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA, content_type="application/json"
+        )
+
+    assert async_to_sync(post)().status_code == 200
+    assert async_to_sync(post)().status_code == 200
+    provider.aexchange_code_for_email.assert_awaited_once()
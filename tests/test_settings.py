@@ -1,4 +1,7 @@
+from unittest.mock import patch
+
 import pytest
+from django.utils.module_loading import import_string
 from django.test import SimpleTestCase, override_settings
 from nexus_auth.settings import NexusAuthSettings, DEFAULTS
 
@@ -54,6 +57,7 @@ class TestNexusAuthSettings(SimpleTestCase):
         self.assertEqual(providers, {
             "google": "nexus_auth.providers.google.GoogleOAuth2ProviderBuilder",
             "microsoft_tenant": "nexus_auth.providers.microsoft.MicrosoftEntraTenantOAuth2ProviderBuilder",
+            "oidc": "nexus_auth.providers.oidc.OpenIDConnectProviderBuilder",
             "custom": "path.to.CustomProviderBuilder",
         })
 
@@ -86,6 +90,7 @@ class TestNexusAuthSettings(SimpleTestCase):
         self.assertEqual(providers, {
             "google": "my.custom.GoogleProviderBuilder",  # Overwritten by method-level settings
             "microsoft_tenant": "my.custom.MicrosoftProviderBuilder",  # Overwritten by method-level settings
+            "oidc": "nexus_auth.providers.oidc.OpenIDConnectProviderBuilder",
             "custom": "path.to.CustomProviderBuilder",
         })
 
@@ -94,3 +99,44 @@ class TestNexusAuthSettings(SimpleTestCase):
         user_settings = self.nexus_auth_settings._get_user_settings()
         # Assert that the default handler is used
         self.assertEqual(user_settings['PROVIDERS_HANDLER'], 'nexus_auth.utils.load_providers_config')
+
+
+class TestCompiledSettings(SimpleTestCase):
+    def setUp(self):
+        self.nexus_auth_settings = NexusAuthSettings(defaults=DEFAULTS)
+
+    def test_user_settings_are_not_mutated(self):
+        user_settings = {"CONFIG": {"google": {"client_id": "id", "client_secret": "secret"}}}
+        with override_settings(NEXUS_AUTH=user_settings):
+            self.assertEqual(
+                self.nexus_auth_settings._get_user_settings()["PROVIDERS_HANDLER"],
+                "nexus_auth.utils.load_providers_config",
+            )
+        self.assertNotIn("PROVIDERS_HANDLER", user_settings)
+
+    def test_snapshot_is_reused_until_settings_change(self):
+        with override_settings(NEXUS_AUTH={"HTTP": {"READ_TIMEOUT": 5}}):
+            snapshot = self.nexus_auth_settings.snapshot
+            self.assertIs(self.nexus_auth_settings.snapshot, snapshot)
+            self.assertEqual(self.nexus_auth_settings.get_http_settings()["READ_TIMEOUT"], 5)
+            # Defaults are merged with the user values
+            self.assertEqual(self.nexus_auth_settings.get_http_settings()["POOL_MAXSIZE"], 10)
+
+            with override_settings(NEXUS_AUTH={"HTTP": {"READ_TIMEOUT": 7}}):
+                self.assertIsNot(self.nexus_auth_settings.snapshot, snapshot)
+                self.assertEqual(self.nexus_auth_settings.get_http_settings()["READ_TIMEOUT"], 7)
+
+    def test_snapshot_is_immutable(self):
+        with override_settings(NEXUS_AUTH={"CONFIG": {}}):
+            snapshot = self.nexus_auth_settings.snapshot
+            with self.assertRaises(TypeError):
+                snapshot.merged["HTTP"]["READ_TIMEOUT"] = 1
+            with self.assertRaises(AttributeError):
+                snapshot.builders = {}
+
+    def test_handler_is_imported_once(self):
+        with override_settings(NEXUS_AUTH={"CONFIG": {"google": {"client_id": "id", "client_secret": "secret"}}}):
+            with patch("nexus_auth.settings.import_string", wraps=import_string) as mock_import_string:
+                self.nexus_auth_settings.get_providers_config()
+                self.nexus_auth_settings.get_providers_config()
+            mock_import_string.assert_called_once_with("nexus_auth.utils.load_providers_config")
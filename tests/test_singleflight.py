@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+
+from nexus_auth.cache import make_key
+from nexus_auth.metrics import coalesced_requests
+from nexus_auth.providers import http
+from nexus_auth.providers.singleflight import SharedFlight, SingleFlight
+from nexus_auth.testing.stub_idp import EndpointProfile, StubIdP
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(scope="module")
+def idp():
+    with StubIdP(profiles={"token": EndpointProfile(latency=0.2)}) as idp:
+        yield idp
+
+
+@pytest.fixture
+def single_flight(settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "SINGLE_FLIGHT": {"ENABLED": True}}
+
+
+def run_concurrently(func, count=4):
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return [future.result() for future in [executor.submit(func) for _ in range(count)]]
+
+
+def slow_call(calls, result="result", delay=0.2):
+    def call():
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        return result
+
+    return call
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    results = run_concurrently(lambda: flights.do("key", slow_call(calls)))
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {result for result, _ in results} == {"result"}
+
+
+def test_sequential_calls_are_not_coalesced():
+    flights = SingleFlight()
+    calls = []
+
+    flights.do("key", slow_call(calls, delay=0))
+    flights.do("key", slow_call(calls, delay=0))
+
+    assert len(calls) == 2
+
+
+def test_error_is_shared():
+    flights = SingleFlight()
+    calls = []
+
+    def failing_call():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("IdP error")
+
+    def call():
+        try:
+            flights.do("key", failing_call)
+        except ValueError:
+            return "error"
+
+    assert run_concurrently(call) == ["error"] * 4
+    assert len(calls) == 1
+
+
+def test_waiter_times_out():
+    flights = SingleFlight()
+    started = threading.Event()
+    thread = threading.Thread(target=lambda: flights.do("key", lambda: started.set() or time.sleep(0.3)))
+    thread.start()
+    started.wait()
+
+    with pytest.raises(TimeoutError):
+        flights.do("key", lambda: "unused", timeout=0.01)
+    thread.join()
+
+
+def test_async_calls_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*[flights.ado("key", call) for _ in range(3)])
+
+    results = async_to_sync(main)()
+
+    assert len(calls) == 1
+    assert results == [("result", False), ("result", True), ("result", True)]
+
+
+def test_shared_flight_waits_for_other_worker():
+    cache.set(make_key(SharedFlight.namespace, "key"), "other-worker", 10)
+    cache.set(make_key(f"{SharedFlight.namespace}_result", "other-worker"), ("succeeded", "stored"), 10)
+
+    result = SharedFlight(wait=1, result_ttl=5).do("key", lambda: "unused", str, str.upper)
+
+    assert result == ("STORED", True)
+
+
+def test_shared_flight_runs_call_after_failed_worker():
+    lock_key = make_key(SharedFlight.namespace, "key")
+    cache.set(lock_key, "failed-worker", 10)
+    threading.Timer(0.1, cache.delete, [lock_key]).start()
+
+    result = SharedFlight(wait=1, result_ttl=5).do("key", lambda: "result", str, str)
+
+    assert result == ("result", False)
+    assert cache.get(lock_key) is None
+
+
+def test_shared_flight_fails_after_failed_worker():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.1)
+        raise ValueError("failed")
+
+    results = []
+
+    def call():
+        try:
+            results.append(SharedFlight(wait=5, result_ttl=5).do("key", fail, str, str))
+        except Exception as e:
+            results.append(type(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The call is not run again by the waiting workers
+    assert len(calls) == 1
+    assert sorted(result.__name__ for result in results) == ["SharedFlightError", "SharedFlightError", "ValueError"]
+
+
+def test_shared_flight_times_out():
+    cache.set(make_key(SharedFlight.namespace, "key"), "stuck-worker", 10)
+
+    with pytest.raises(TimeoutError):
+        SharedFlight(wait=0.1, result_ttl=5).do("key", lambda: "unused", str, str)
+
+
+def test_shared_flight_coalesces_workers():
+    calls = []
+
+    results = run_concurrently(lambda: SharedFlight(wait=5, result_ttl=5).do("key", slow_call(calls), str, str))
+
+    assert len(calls) == 1
+    assert {result for result, _ in results} == {"result"}
+
+
+def test_requests_are_not_coalesced_by_default(idp):
+    idp.requests.clear()
+
+    run_concurrently(lambda: http.request("post", f"{idp.base_url}/token", data={"code": "a@example.com"}), count=2)
+
+    assert idp.requests["token"] == 2
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_identical_requests_are_coalesced(idp, settings, shared):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "SINGLE_FLIGHT": {"ENABLED": True, "SHARED": shared}}
+    idp.requests.clear()
+    before = coalesced_requests.get(endpoint=idp.base_url, scope="process")
+
+    responses = run_concurrently(lambda: http.request("post", f"{idp.base_url}/token", data={"code": "a@example.com"}))
+
+    assert idp.requests["token"] == 1
+    assert {response.json()["id_token"] for response in responses} == {responses[0].json()["id_token"]}
+    assert coalesced_requests.get(endpoint=idp.base_url, scope="process") == before + 3
+
+
+def test_only_safe_requests_are_shared_with_other_workers(idp, settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "SINGLE_FLIGHT": {"ENABLED": True, "SHARED": True}}
+
+    with patch.object(SharedFlight, "do", autospec=True, side_effect=lambda self, key, func, *args: (func(), False)) as do:
+        http.request("post", f"{idp.base_url}/token", data={"code": "a@example.com"})
+        do.assert_not_called()
+        http.request("get", f"{idp.base_url}/.well-known/openid-configuration")
+        do.assert_called_once()
+
+
+def test_shared_response_round_trip(idp):
+    response = http.request("get", f"{idp.base_url}/.well-known/openid-configuration")
+
+    loaded = http._load_response(http._dump_response(response))
+
+    assert loaded.status_code == 200
+    assert loaded.json() == response.json()
+    assert loaded.headers["Content-Type"] == response.headers["Content-Type"]
+    loaded.raise_for_status()
+
+
+def test_different_requests_are_not_coalesced(idp, single_flight):
+    idp.requests.clear()
+
+    def send(code):
+        return http.request("post", f"{idp.base_url}/token", data={"code": code})
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(send, ["a@example.com", "b@example.com"]))
+
+    assert idp.requests["token"] == 2
+
+
+def test_identical_async_requests_are_coalesced(idp, single_flight):
+    idp.requests.clear()
+
+    async def main():
+        return await asyncio.gather(
+            *[http.arequest("post", f"{idp.base_url}/token", data={"code": "a@example.com"}) for _ in range(3)]
+        )
+
+    responses = async_to_sync(main)()
+
+    assert idp.requests["token"] == 1
+    assert all(response.status_code == 200 for response in responses)
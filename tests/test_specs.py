@@ -0,0 +1,142 @@
+import sys
+from unittest.mock import patch
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory
+
+from nexus_auth.handlers import CachedProvidersHandler
+from nexus_auth.providers.factory import providers
+from nexus_auth.providers.google import GoogleOAuth2Provider
+from nexus_auth.specs import ProviderSpec, compile_providers_config
+from nexus_auth.utils import build_oauth_provider, load_providers_config
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    providers.clear()
+    with patch("nexus_auth.utils._static_specs", None):
+        yield
+    providers.clear()
+
+
+def test_spec_normalizes_option_names():
+    spec = ProviderSpec.compile("google", {"CLIENT_ID": "id", "Client_Secret": "secret"})
+
+    assert spec.provider_type == "google"
+    assert spec.names == ("client_id", "client_secret")
+    assert spec["client_id"] == "id"
+    assert spec.get("CLIENT_ID") is None
+    assert spec.kwargs == {"client_id": "id", "client_secret": "secret"}
+    assert spec == {"client_id": "id", "client_secret": "secret"}
+    with pytest.raises(KeyError):
+        spec["tenant_id"]
+
+
+def test_specs_share_names_and_interned_values():
+    config = {"client_id": "id", "issuer": "".join(["https://idp.", "example.com"])}
+    first = ProviderSpec.compile("oidc", config)
+    second = ProviderSpec.compile("oidc", {**config, "issuer": "".join(["https://idp.", "example.com"])})
+
+    assert first.names is second.names
+    assert first["issuer"] is second["issuer"]
+    assert first.key == second.key
+    assert ProviderSpec.compile("oidc", {**config, "client_id": "other"}).key != first.key
+
+
+def test_spec_does_not_intern_secrets():
+    client_secret = "".join(["secret-", "value"])
+    spec = ProviderSpec.compile("google", {"client_id": "id", "client_secret": client_secret})
+
+    assert spec["client_secret"] is client_secret
+    assert sys.intern("".join(["secret-", "value"])) is not client_secret
+
+
+def test_spec_is_frozen_and_slotted():
+    spec = ProviderSpec.compile("google", {"client_id": "id", "client_secret": "secret"})
+
+    assert not hasattr(spec, "__dict__")
+    with pytest.raises(AttributeError):
+        spec.provider_type = "oidc"
+
+
+def test_spec_with_unhashable_option():
+    spec = ProviderSpec.compile("google", {"client_id": "id", "scopes": ["openid"]})
+    other = ProviderSpec.compile("google", {"client_id": "id", "scopes": ["openid"]})
+
+    assert spec.key == other.key
+    assert isinstance(spec.key, str)
+
+
+def test_compile_validates_required_options():
+    with pytest.raises(ImproperlyConfigured, match="microsoft_tenant.*tenant_id"):
+        compile_providers_config(
+            {"microsoft_tenant": {"client_id": "id", "client_secret": "secret"}}
+        )
+    with pytest.raises(ImproperlyConfigured, match="oidc.*client_secret, issuer"):
+        compile_providers_config({"oidc": {"CLIENT_ID": "id", "client_secret": ""}})
+
+
+def test_compile_skips_validation_of_unknown_builders(settings):
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "PROVIDER_BUILDERS": {"custom": "path.to.CustomProviderBuilder"},
+    }
+
+    specs = compile_providers_config({"custom": {"client_id": "id"}, "unknown": {}})
+
+    assert set(specs) == {"custom", "unknown"}
+
+
+def test_load_providers_config_compiles_the_setting_once():
+    config = load_providers_config()
+
+    assert isinstance(config["google"], ProviderSpec)
+    assert load_providers_config() is config
+
+
+def test_setting_change_clears_the_registry(settings):
+    config = load_providers_config()
+
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "CONFIG": {"google": {"client_id": "changed", "client_secret": "secret"}},
+    }
+
+    assert load_providers_config() is not config
+    assert load_providers_config()["google"]["client_id"] == "changed"
+
+
+def test_build_oauth_provider_reuses_the_provider_of_a_spec():
+    specs = load_providers_config()
+
+    provider = build_oauth_provider("google", specs)
+
+    assert isinstance(provider, GoogleOAuth2Provider)
+    assert build_oauth_provider("google", specs) is provider
+    # Plain dicts with the same options, in any case, get the same provider
+    assert build_oauth_provider(
+        "google", {"google": {"CLIENT_ID": "test_client_id", "client_secret": "test_client_secret"}}
+    ) is provider
+
+
+def test_build_oauth_provider_does_not_recompile_specs():
+    specs = load_providers_config()
+
+    with patch.object(ProviderSpec, "compile") as compile:
+        build_oauth_provider("google", specs)
+
+    compile.assert_not_called()
+
+
+def test_cached_handler_keeps_compiled_specs():
+    handler = CachedProvidersHandler(
+        lambda request: {"google": {"CLIENT_ID": "id", "CLIENT_SECRET": "secret"}},
+        tenant_key_func=lambda request: "tenant1",
+    )
+
+    config = handler(request=RequestFactory().get("/"))
+
+    assert isinstance(config["google"], ProviderSpec)
+    assert config["google"]["client_id"] == "id"
+    assert handler(request=RequestFactory().get("/")) is config
@@ -0,0 +1,72 @@
+import pytest
+import requests
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.testing.stats import LatencyRecorder, percentile
+from nexus_auth.testing.stub_idp import EndpointProfile, StubIdP
+
+User = get_user_model()
+
+EXCHANGE_DATA = {"code": "active@example.com", "code_verifier": "verifier", "redirect_uri": "http://localhost/callback"}
+
+
+@pytest.fixture(scope="module")
+def idp():
+    with StubIdP() as idp:
+        yield idp
+
+
+@pytest.fixture
+def active_user(db):
+    return User.objects.create_user(email="active@example.com", password="password", username="active")
+
+
+def test_exchange_with_oidc_provider(idp, active_user, settings):
+    settings.NEXUS_AUTH = {"CONFIG": {"oidc": idp.oidc_config()}}
+    idp.requests.clear()
+
+    response = APIClient().post(reverse("oauth-exchange", args=["oidc"]), data=EXCHANGE_DATA)
+
+    assert response.status_code == 200
+    assert set(response.data) == {"access", "refresh"}
+    assert idp.requests == {"discovery": 1, "token": 1, "jwks": 1}
+
+
+def test_exchange_with_microsoft_provider(idp, active_user, settings):
+    settings.NEXUS_AUTH = {"CONFIG": {"microsoft_tenant": idp.microsoft_config(tenant_id="contoso")}}
+    idp.requests.clear()
+
+    response = APIClient().post(reverse("oauth-exchange", args=["microsoft_tenant"]), data=EXCHANGE_DATA)
+
+    assert response.status_code == 200
+    assert idp.requests == {"token": 1, "graph": 1}
+
+
+def test_error_profile():
+    with StubIdP(profiles={"token": EndpointProfile(error_rate=1, error_status=429)}) as idp:
+        response = requests.post(f"{idp.base_url}/token", data={"code": "a@example.com"})
+        graph_response = requests.get(idp.graph_url, headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 429
+    assert graph_response.status_code == 401
+
+
+def test_unknown_endpoint_profile():
+    with pytest.raises(ValueError):
+        StubIdP(profiles={"userinfo": EndpointProfile()})
+
+
+def test_latency_summary():
+    recorder = LatencyRecorder()
+    for latency in range(1, 101):
+        recorder.record(latency / 1000, error="503" if latency > 98 else None)
+    summary = recorder.summary(duration=2)
+
+    assert summary["requests"] == 100
+    assert summary["errors"] == 2
+    assert summary["error_breakdown"] == {"503": 2}
+    assert summary["throughput_rps"] == 50
+    assert summary["latency_ms"]["p50"] == 50
+    assert summary["latency_ms"]["p99"] == 99
+    assert percentile([], 0.5) == 0
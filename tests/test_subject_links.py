@@ -0,0 +1,141 @@
+import io
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.models import ProviderSubjectLink
+from nexus_auth.providers.base import ProviderIdentity
+from nexus_auth.providers.microsoft import MicrosoftEntraTenantOAuth2Provider
+
+User = get_user_model()
+
+CLAIMS = {"oid": "object-id", "tid": "tenant-id", "sub": "pairwise-subject"}
+
+EXCHANGE_DATA = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://redirect.url"}
+
+
+@pytest.fixture(autouse=True)
+def enable_links(settings):
+    cache.clear()
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "SUBJECT_LINKS": {"ENABLED": True},
+    }
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(email="john.doe@example.com", password="password", username="john.doe")
+
+
+@pytest.fixture
+def mock_requests():
+    """Mock the token endpoint and the Graph API of Microsoft Entra."""
+    with patch("requests.Session.post") as mock_post, patch("requests.Session.get") as mock_get, \
+         patch.object(MicrosoftEntraTenantOAuth2Provider, "decode_id_token", return_value=CLAIMS):
+        mock_post.return_value.json.return_value = {"access_token": "access", "id_token": "id"}
+        mock_get.return_value.json.return_value = {"userPrincipalName": "John.Doe@example.com"}
+        yield mock_post, mock_get
+
+
+def exchange():
+    return APIClient().post(reverse("oauth-exchange", args=["microsoft_tenant"]), data=EXCHANGE_DATA)
+
+
+def test_microsoft_identity():
+    provider = MicrosoftEntraTenantOAuth2Provider(client_id="client", client_secret="secret", tenant_id="common")
+    identity = provider.build_identity(CLAIMS, email=None)
+    assert identity == ProviderIdentity(subject="object-id", tenant="tenant-id", email=None)
+
+
+def test_first_login_creates_link(user, mock_requests):
+    _, mock_get = mock_requests
+    response = exchange()
+
+    assert response.status_code == 200
+    mock_get.assert_called_once()
+    link = ProviderSubjectLink.objects.get()
+    assert (link.provider_type, link.tenant, link.subject, link.user) == ("microsoft_tenant", "tenant-id", "object-id", user)
+
+
+def test_linked_login_skips_email_resolution(user, mock_requests, django_assert_num_queries):
+    _, mock_get = mock_requests
+    exchange()
+    mock_get.reset_mock()
+
+    # The user is renamed at the IdP and in the application
+    User.objects.filter(pk=user.pk).update(email="john.smith@example.com")
+    mock_get.return_value.json.return_value = {"userPrincipalName": "john.smith@example.com"}
+
+    with patch("nexus_auth.views.get_user_by_email") as mock_get_user:
+        response = exchange()
+
+    assert response.status_code == 200
+    mock_get.assert_not_called()
+    mock_get_user.assert_not_called()
+    assert ProviderSubjectLink.objects.count() == 1
+
+
+def test_no_associated_user(db, mock_requests):
+    response = exchange()
+    assert response.status_code == 404
+    assert not ProviderSubjectLink.objects.exists()
+
+
+def test_links_are_disabled_by_default(settings, user, mock_requests):
+    settings.NEXUS_AUTH = {key: value for key, value in settings.NEXUS_AUTH.items() if key != "SUBJECT_LINKS"}
+    assert exchange().status_code == 200
+    assert not ProviderSubjectLink.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_exchange_uses_links(user, mock_requests, settings):
+    settings.ROOT_URLCONF = "nexus_auth.async_urls"
+    ProviderSubjectLink.objects.create(provider_type="microsoft_tenant", tenant="tenant-id", subject="object-id", user=user)
+
+    async def identity(*args, **kwargs):
+        return ProviderIdentity(subject="object-id", tenant="tenant-id")
+
+    async def post():
+        return await AsyncClient().post(
+            reverse("oauth-exchange", args=["microsoft_tenant"]), data=EXCHANGE_DATA, content_type="application/json"
+        )
+
+    with patch.object(MicrosoftEntraTenantOAuth2Provider, "aexchange_code_for_identity", side_effect=identity), \
+         patch.object(MicrosoftEntraTenantOAuth2Provider, "aresolve_identity_email") as mock_resolve:
+        response = async_to_sync(post)()
+
+    assert response.status_code == 200
+    mock_resolve.assert_not_called()
+
+
+def test_backfill_from_file(db, tmp_path):
+    john = User.objects.create_user(email="John.Doe@example.com", username="john")
+    jane = User.objects.create_user(email="jane.doe@example.com", username="jane")
+    ProviderSubjectLink.objects.create(provider_type="microsoft_tenant", tenant="tenant-id", subject="jane-oid", user=jane)
+    path = tmp_path / "users.csv"
+    path.write_text("email,subject\njohn.doe@example.com,john-oid\njane.doe@example.com,jane-oid\nunknown@example.com,unknown-oid\n")
+
+    out = io.StringIO()
+    call_command("nexus_auth_backfill_subject_links", "microsoft_tenant", file=str(path), tenant="tenant-id", chunk_size=1, stdout=out)
+
+    assert set(ProviderSubjectLink.objects.values_list("subject", "user")) == {("john-oid", john.pk), ("jane-oid", jane.pk)}
+    assert "1 emails did not match any user" in out.getvalue()
+
+
+def test_backfill_from_user_field(db):
+    User.objects.create_user(email="john.doe@example.com", username="john")
+    User.objects.create_user(email="jane.doe@example.com", username="jane")
+
+    call_command("nexus_auth_backfill_subject_links", "google", subject_field="username", stdout=io.StringIO())
+    assert set(ProviderSubjectLink.objects.values_list("tenant", "subject")) == {("", "john"), ("", "jane")}
+
+    with pytest.raises(CommandError):
+        call_command("nexus_auth_backfill_subject_links", "google", subject_field="unknown", stdout=io.StringIO())
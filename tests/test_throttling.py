@@ -0,0 +1,136 @@
+from unittest.mock import patch
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.throttling import TokenBucket, parse_rate
+
+EXCHANGE_DATA = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://app.com/callback"}
+
+
+def get_tenant(request):
+    return request.headers.get("X-Tenant")
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def throttle(settings, **throttle_settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "THROTTLE": throttle_settings}
+
+
+def post_exchange(**kwargs):
+    return APIClient().post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA, **kwargs)
+
+
+@pytest.mark.parametrize("rate,expected", [("10/s", (10, 1)), ("100/min", (100, 60)), ("5/hour", (5, 3600)), ("1/d", (1, 86400))])
+def test_parse_rate(rate, expected):
+    assert parse_rate(rate) == expected
+
+
+@pytest.mark.parametrize("rate", ["100", "x/min", "10/week", None])
+def test_parse_invalid_rate(rate):
+    with pytest.raises(ImproperlyConfigured):
+        parse_rate(rate)
+
+
+def test_token_bucket():
+    with patch("nexus_auth.throttling.time.time", return_value=1000):
+        bucket = TokenBucket("bucket", capacity=3, period=60)
+        assert [bucket.consume() for _ in range(3)] == [None, None, None]
+        assert bucket.consume() == 20
+
+    # A token is added every 20 seconds
+    with patch("nexus_auth.throttling.time.time", return_value=1015):
+        assert bucket.consume() == 5
+    with patch("nexus_auth.throttling.time.time", return_value=1020):
+        assert bucket.consume() is None
+        assert bucket.consume() == 20
+
+
+def test_token_bucket_does_not_exceed_its_capacity():
+    with patch("nexus_auth.throttling.time.time", return_value=1000):
+        bucket = TokenBucket("bucket", capacity=2, period=1)
+        assert [bucket.consume() for _ in range(2)] == [None, None]
+
+    # Full since 1001, while the entry is kept until 1002
+    with patch("nexus_auth.throttling.time.time", return_value=1001.875):
+        assert [bucket.consume() for _ in range(3)] == [None, None, 0.5]
+
+
+def test_no_limits_skip_the_cache(db):
+    with patch("nexus_auth.throttling.get_shared_cache") as mock_get_shared_cache:
+        post_exchange()
+    mock_get_shared_cache.assert_not_called()
+
+
+def test_ip_rate(settings, db):
+    throttle(settings, IP_RATE="2/min")
+
+    assert post_exchange().status_code != 429
+    assert post_exchange().status_code != 429
+    with patch("nexus_auth.views.build_oauth_provider") as mock_build_provider:
+        response = post_exchange()
+    assert response.status_code == 429
+    assert int(response["Retry-After"]) > 0
+    mock_build_provider.assert_not_called()
+
+    # Other clients are not affected
+    assert post_exchange(REMOTE_ADDR="10.0.0.2").status_code != 429
+
+
+def test_rejection_does_not_query_the_database(settings, db, django_assert_num_queries):
+    throttle(settings, IP_RATE="1/min")
+    post_exchange()
+
+    with django_assert_num_queries(0):
+        assert post_exchange().status_code == 429
+
+
+def test_tenant_rates(settings, db):
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "TENANT_KEY_FUNC": "tests.test_throttling.get_tenant",
+        "THROTTLE": {"TENANT_RATE": "2/min", "TENANT_RATES": {"acme": "1/min"}},
+    }
+
+    assert post_exchange(HTTP_X_TENANT="acme").status_code != 429
+    assert post_exchange(HTTP_X_TENANT="acme").status_code == 429
+    assert post_exchange(HTTP_X_TENANT="globex").status_code != 429
+    assert post_exchange(HTTP_X_TENANT="globex").status_code != 429
+    assert post_exchange(HTTP_X_TENANT="globex").status_code == 429
+    # Requests of an unknown tenant are not limited
+    assert all(post_exchange().status_code != 429 for _ in range(3))
+
+
+def test_views_have_separate_buckets(settings, db):
+    throttle(settings, IP_RATE="1/min")
+
+    assert post_exchange().status_code != 429
+    assert APIClient().get(reverse("oauth-provider")).status_code == 200
+    assert APIClient().get(reverse("oauth-provider")).status_code == 429
+
+
+def test_async_exchange_is_throttled(settings, db):
+    settings.ROOT_URLCONF = "nexus_auth.async_urls"
+    throttle(settings, IP_RATE="1/min")
+
+    async def post():
+        return await AsyncClient().post(
+            reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA, content_type="application/json"
+        )
+
+    assert async_to_sync(post)().status_code != 429
+    response = async_to_sync(post)()
+    assert response.status_code == 429
+    assert int(response["Retry-After"]) > 0
+    assert "throttled" in response.json()["detail"]
@@ -0,0 +1,133 @@
+from unittest.mock import MagicMock, patch
+
+import httpx
+import jwt
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from nexus_auth.signals import exchange_timed
+from nexus_auth.timing import ExchangeTimings, time_exchange, timed
+
+User = get_user_model()
+
+EXCHANGE_DATA = {"code": "auth_code", "code_verifier": "verifier", "redirect_uri": "https://app.com/callback"}
+ID_TOKEN = jwt.encode({"email": "active@example.com"}, "x" * 32, algorithm="HS256")
+
+
+@pytest.fixture(autouse=True)
+def timing_settings(settings):
+    settings.NEXUS_AUTH = {
+        **settings.NEXUS_AUTH,
+        "ID_TOKEN_VERIFICATION": {"ENABLED": False},
+        "TIMING": {"SERVER_TIMING": True},
+    }
+
+
+@pytest.fixture
+def received():
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(kwargs)
+
+    exchange_timed.connect(receiver)
+    yield received
+    exchange_timed.disconnect(receiver)
+
+
+@pytest.fixture
+def active_user(db):
+    return User.objects.create_user(email="active@example.com", password="password", username="active")
+
+
+def token_response():
+    response = MagicMock(status_code=200, headers={})
+    response.json.return_value = {"id_token": ID_TOKEN}
+    return response
+
+
+def test_timed_outside_of_exchange():
+    with timed("token"):
+        pass
+
+
+def test_phases_are_summed():
+    with time_exchange(None, None, "google") as timings:
+        with timed("user"):
+            pass
+        with timed("user"):
+            pass
+        with timed("token"):
+            pass
+    assert list(timings.phases) == ["user", "token"]
+    assert timings.total >= sum(timings.phases.values())
+
+
+def test_server_timing_header():
+    timings = ExchangeTimings()
+    timings.add("token", 0.1234)
+    timings.total = 0.2
+    assert timings.as_server_timing() == "token;dur=123.4, total;dur=200.0"
+
+
+def test_disabled_without_receivers(settings):
+    settings.NEXUS_AUTH = {"TIMING": {"SERVER_TIMING": False}}
+    with time_exchange(None, None, "google") as timings:
+        assert timings is None
+
+
+@patch("requests.Session.post")
+def test_exchange_is_timed(mock_post, active_user, received):
+    mock_post.return_value = token_response()
+    response = APIClient().post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+
+    assert response.status_code == 200
+    assert len(received) == 1
+    assert received[0]["provider_type"] == "google"
+    phases = received[0]["timings"].phases
+    assert list(phases) == ["validate", "config", "provider", "token", "id_token", "user", "jwt", "signal"]
+    server_timing = response["Server-Timing"]
+    assert server_timing.startswith("validate;dur=")
+    assert "total;dur=" in server_timing
+
+
+@patch("requests.Session.post")
+def test_failed_exchange_is_timed(mock_post, db, received):
+    mock_post.return_value = token_response()
+    response = APIClient().post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+
+    assert response.status_code == 404
+    assert "user" in received[0]["timings"].phases
+    assert "user;dur=" in response["Server-Timing"]
+
+
+def test_server_timing_is_optional(settings, active_user, received):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "TIMING": {"SERVER_TIMING": False}}
+    with patch("requests.Session.post", return_value=token_response()):
+        response = APIClient().post(reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA)
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response
+    assert "token" in received[0]["timings"].phases
+
+
+def test_async_exchange_is_timed(settings, active_user, received):
+    settings.ROOT_URLCONF = "nexus_auth.async_urls"
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"id_token": ID_TOKEN})))
+
+    async def post():
+        return await AsyncClient().post(
+            reverse("oauth-exchange", args=["google"]), data=EXCHANGE_DATA, content_type="application/json"
+        )
+
+    with patch("nexus_auth.providers.http.get_async_client", return_value=client):
+        response = async_to_sync(post)()
+
+    assert response.status_code == 200
+    phases = received[0]["timings"].phases
+    assert list(phases) == ["validate", "config", "provider", "token", "id_token", "user", "jwt", "signal"]
+    assert "jwt;dur=" in response["Server-Timing"]
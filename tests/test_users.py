@@ -0,0 +1,86 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.migrations.operations import AddIndex
+
+from nexus_auth.users import add_lower_email_index, get_user_by_email, get_user_queryset
+
+User = get_user_model()
+
+
+def lookup_by_username(queryset, email):
+    return queryset.filter(username=email.split("@")[0])
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(email="john.doe@example.com", password="password", username="john.doe")
+
+
+@pytest.mark.parametrize("strategy", ["iexact", "normalized", "lower"])
+def test_lookup_strategies(settings, user, strategy):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"STRATEGY": strategy}}
+    assert get_user_by_email("John.Doe@Example.com") == user
+    with pytest.raises(User.DoesNotExist):
+        get_user_by_email("jane.doe@example.com")
+
+
+def test_normalized_lookup_uses_exact_match(settings):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"STRATEGY": "normalized"}}
+    sql = str(get_user_queryset(" John.Doe@Example.com ").query)
+    assert "UPPER" not in sql
+    assert '"email" = john.doe@example.com' in sql
+
+
+def test_lower_lookup_matches_functional_index(settings):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"STRATEGY": "lower"}}
+    sql = str(get_user_queryset("John.Doe@Example.com").query)
+    assert 'LOWER("auth_user"."email") = john.doe@example.com' in sql
+
+
+def test_custom_lookup(settings, user):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"STRATEGY": f"{__name__}.lookup_by_username"}}
+    assert get_user_by_email("john.doe@other.com") == user
+
+
+def test_invalid_lookup(settings, db):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"STRATEGY": "unknown"}}
+    with pytest.raises(ImproperlyConfigured):
+        get_user_by_email("john.doe@example.com")
+
+
+def test_all_fields_are_loaded_by_default(user, django_assert_num_queries):
+    found = get_user_by_email("john.doe@example.com")
+    assert not found.get_deferred_fields()
+
+    # e.g. by the user_logged_in receivers
+    with django_assert_num_queries(0):
+        found.email, found.last_login, found.first_name
+
+
+def test_only_needed_fields_are_loaded(settings, user):
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"EXTRA_FIELDS": []}}
+    found = get_user_by_email("john.doe@example.com")
+    assert found.get_deferred_fields() >= {"email", "first_name", "last_name", "date_joined"}
+    assert "is_active" not in found.get_deferred_fields()
+
+    settings.NEXUS_AUTH = {"USER_LOOKUP": {"EXTRA_FIELDS": ["email"]}}
+    assert "email" not in get_user_by_email("john.doe@example.com").get_deferred_fields()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_add_lower_email_index():
+    operation = add_lower_email_index("user", name="user_email_lower_idx")
+    assert isinstance(operation, AddIndex)
+    assert operation.index.name == "user_email_lower_idx"
+
+    with connection.schema_editor() as editor:
+        editor.add_index(User, operation.index)
+    try:
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        assert "user_email_lower_idx" in constraints
+    finally:
+        with connection.schema_editor() as editor:
+            editor.remove_index(User, operation.index)
@@ -1,6 +1,7 @@
 from unittest.mock import MagicMock, patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 from jwt import DecodeError
@@ -21,6 +22,12 @@ from nexus_auth.providers.google import GoogleOAuth2Provider
 
 User = get_user_model()
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -33,7 +40,7 @@ def active_user(db):
 def mock_fetch_id_token():
     """Mock the fetch_id_token method of the OAuth provider."""
     with patch("nexus_auth.views.build_oauth_provider") as mock_build_provider, \
-         patch("jwt.decode", return_value={"email": "active@example.com"}) as mock_jwt_decode:
+         patch("nexus_auth.providers.base.OAuth2IdentityProvider.decode_id_token", return_value={"email": "active@example.com"}) as mock_jwt_decode:
         provider = GoogleOAuth2Provider(client_id="test_client_id", client_secret="test_client_secret")
         provider.fetch_id_token = MagicMock(return_value="fake_id_token")
         mock_build_provider.return_value = provider
@@ -55,6 +62,71 @@ def test_oauth_providers_no_active_provider(api_client):
     assert response.status_code == NoActiveProviderError.status_code
     assert response.data["detail"] == NoActiveProviderError.default_detail
 
+def test_oauth_providers_response_is_cached(api_client):
+    """Test that the providers are built once per tenant and TTL."""
+    response = api_client.get(reverse("oauth-provider"))
+    with patch("nexus_auth.views.build_oauth_provider") as mock_build_provider:
+        cached_response = api_client.get(reverse("oauth-provider"))
+
+    mock_build_provider.assert_not_called()
+    assert cached_response.data == response.data
+    assert cached_response["ETag"] == response["ETag"]
+    assert response["ETag"].startswith('"')
+    assert response["Cache-Control"] == "private, max-age=300"
+
+def test_oauth_providers_not_modified(api_client):
+    """Test that a request with the current ETag gets a 304 response."""
+    etag = api_client.get(reverse("oauth-provider"))["ETag"]
+    response = api_client.get(reverse("oauth-provider"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response["ETag"] == etag
+    assert response.content == b""
+
+    response = api_client.get(reverse("oauth-provider"), HTTP_IF_NONE_MATCH='"stale"')
+    assert response.status_code == status.HTTP_200_OK
+
+def test_oauth_providers_cache_follows_settings(api_client, settings):
+    """Test that a configuration change is served immediately."""
+    etag = api_client.get(reverse("oauth-provider"))["ETag"]
+    settings.NEXUS_AUTH = {"CONFIG": {"google": {"client_id": "new_client_id", "client_secret": "secret"}}}
+    response = api_client.get(reverse("oauth-provider"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert [provider["type"] for provider in response.data["providers"]] == ["google"]
+
+def select_tenant(request):
+    return request.headers.get("X-Tenant")
+
+def load_tenant_providers(request):
+    tenant = request.headers.get("X-Tenant")
+    return {"google": {"client_id": f"{tenant}_client_id", "client_secret": "secret"}}
+
+def test_oauth_providers_cache_is_per_tenant(api_client, settings):
+    """Test that the providers of a custom handler are cached by tenant key."""
+    settings.NEXUS_AUTH = {
+        "PROVIDERS_HANDLER": "tests.test_views.load_tenant_providers",
+        "TENANT_KEY_FUNC": "tests.test_views.select_tenant",
+        "PROVIDERS_RESPONSE": {"PUBLIC": True, "VARY": ["X-Tenant"]},
+    }
+    tenant1 = api_client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    tenant2 = api_client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant2")
+    assert "tenant1_client_id" in tenant1.data["providers"][0]["auth_url"]
+    assert "tenant2_client_id" in tenant2.data["providers"][0]["auth_url"]
+    assert tenant1["ETag"] != tenant2["ETag"]
+    assert tenant1["Cache-Control"] == "public, max-age=300"
+    assert "X-Tenant" in tenant1["Vary"]
+
+    with patch("tests.test_views.load_tenant_providers") as mock_handler:
+        assert api_client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1").data == tenant1.data
+    mock_handler.assert_not_called()
+
+def test_oauth_providers_custom_handler_without_tenant_key(api_client, settings):
+    """Test that the providers of a custom handler are not cached if the tenant is unknown."""
+    settings.NEXUS_AUTH = {"PROVIDERS_HANDLER": "tests.test_views.load_tenant_providers"}
+    api_client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant1")
+    response = api_client.get(reverse("oauth-provider"), HTTP_X_TENANT="tenant2")
+    assert "tenant2_client_id" in response.data["providers"][0]["auth_url"]
+    assert "ETag" in response
+
 def test_oauth_exchange_success(api_client, active_user, mock_fetch_id_token):
     """Test that the OAuth exchange endpoint returns a 200 response with access and refresh tokens."""
     response = api_client.post(reverse("oauth-exchange", args=["google"]), data={
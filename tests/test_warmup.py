@@ -0,0 +1,168 @@
+import json
+import logging
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+
+from nexus_auth.models import ProviderConfiguration
+from nexus_auth.providers.jwks import jwks_cache
+from nexus_auth.providers.oidc import discovery_cache
+from nexus_auth.testing.load import TENANT_ISSUER_PATH
+from nexus_auth.testing.stub_idp import StubIdP
+from nexus_auth.warmup import start_warm_up, warm_up
+
+
+@pytest.fixture(scope="module")
+def idp():
+    with StubIdP() as idp:
+        yield idp
+
+
+@pytest.fixture(autouse=True)
+def reset(idp):
+    cache.clear()
+    discovery_cache.clear()
+    jwks_cache.clear()
+    idp.requests.clear()
+    yield
+    cache.clear()
+    discovery_cache.clear()
+    jwks_cache.clear()
+
+
+@pytest.fixture
+def static_config(idp, settings):
+    settings.NEXUS_AUTH = {
+        "CONFIG": {
+            "oidc": idp.oidc_config(),
+            "microsoft_tenant": idp.microsoft_config(tenant_id="contoso"),
+        },
+    }
+
+
+@pytest.fixture
+def database_tenants(idp, settings, db):
+    settings.NEXUS_AUTH = {"PROVIDERS_HANDLER": "nexus_auth.handlers.database_providers_handler"}
+    for tenant in ("a", "b", "c"):
+        ProviderConfiguration.objects.create(
+            tenant=tenant,
+            provider_type="oidc",
+            client_id=f"client-{tenant}",
+            client_secret="secret",
+            options={"issuer": f"{idp.base_url}{TENANT_ISSUER_PATH.format(tenant=tenant)}"},
+        )
+
+
+def run_command(*args):
+    out = StringIO()
+    call_command("nexus_auth_warmup", *args, stdout=out, stderr=StringIO())
+    return json.loads(out.getvalue())
+
+
+def test_command_warms_up_static_config(idp, static_config):
+    report = run_command()
+
+    assert report["tenants"] == 1
+    assert report["providers"] == 2
+    assert report["failures"] == 0
+    assert report["results"][0]["tenant"] is None
+    assert set(report["results"][0]["providers"]) == {"oidc", "microsoft_tenant"}
+    assert idp.requests["discovery"] == 1
+    assert idp.requests["jwks"] == 2
+
+    # The caches are warm: nothing is fetched again
+    idp.requests.clear()
+    run_command()
+    assert "discovery" not in idp.requests
+    assert "jwks" not in idp.requests
+
+
+def test_command_warms_up_database_tenants(idp, database_tenants, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        report = run_command("--max-workers", "2")
+
+    assert sorted(result["tenant"] for result in report["results"]) == ["a", "b", "c"]
+    assert report["failures"] == 0
+    assert idp.requests["discovery"] == 3
+
+    # The configurations of the tenants are cached for the logins
+    from nexus_auth.handlers import database_providers_handler
+
+    database_providers_handler.cache.clear()
+    with django_assert_num_queries(0):
+        assert database_providers_handler.load("a")["oidc"]["client_id"] == "client-a"
+
+
+def test_command_filters_tenants(idp, database_tenants):
+    report = run_command("--tenant", "a", "--tenant", "c")
+
+    assert sorted(result["tenant"] for result in report["results"]) == ["a", "c"]
+
+
+def test_failures_are_reported_per_tenant(idp, database_tenants):
+    ProviderConfiguration.objects.create(
+        tenant="broken",
+        provider_type="oidc",
+        client_id="client",
+        client_secret="secret",
+        options={"issuer": "http://127.0.0.1:1"},
+    )
+
+    report = run_command("--no-preconnect")
+
+    assert report["failures"] == 1
+    broken = next(result for result in report["results"] if result["tenant"] == "broken")
+    assert set(broken["errors"]) == {"oidc"}
+    assert "DiscoveryDocumentError" in broken["errors"]["oidc"]
+    with pytest.raises(CommandError, match="1 tenants failed"):
+        run_command("--fail-on-error")
+
+
+def test_connections_are_opened_once_per_origin(idp, static_config, database_tenants):
+    with patch("nexus_auth.providers.http.preconnect") as preconnect:
+        results = warm_up()
+
+    assert all(result.ok for result in results)
+    assert preconnect.call_count == 1
+    assert preconnect.call_args.args[0].startswith(idp.base_url)
+
+    with patch("nexus_auth.providers.http.preconnect") as preconnect:
+        warm_up(preconnect=False)
+    preconnect.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_start_warm_up_logs_failures(idp, database_tenants, caplog, settings):
+    settings.NEXUS_AUTH = {**settings.NEXUS_AUTH, "WARMUP": {"PRECONNECT": False}}
+    ProviderConfiguration.objects.create(
+        tenant="broken", provider_type="google", client_id="", client_secret="secret"
+    )
+
+    with caplog.at_level(logging.INFO, logger="nexus_auth.warmup"):
+        start_warm_up().join()
+
+    assert "Warmed up the providers of 4 tenants, 1 failed" in caplog.text
+    assert "tenant 'broken': {'configuration': \"ImproperlyConfigured" in caplog.text
+
+
+def test_warm_up_on_startup_waits_for_the_first_request(idp, static_config):
+    from django.test import Client
+    from django.urls import reverse
+
+    from nexus_auth import warmup
+
+    warmup.install()
+    try:
+        with patch("nexus_auth.warmup.start_warm_up") as start:
+            # Management commands serve no requests
+            call_command("diffsettings", stdout=StringIO())
+            start.assert_not_called()
+
+            Client().get(reverse("oauth-provider"))
+            Client().get(reverse("oauth-provider"))
+            start.assert_called_once()
+    finally:
+        warmup.uninstall()